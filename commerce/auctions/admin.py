@@ -1,8 +1,134 @@
 from django.contrib import admin
-from .models import Listing, Bid, Comment, User
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Max
+from django.utils.functional import cached_property
+
+from .closing import close_listings, reopen_listings
+from .models import Category, Listing, Bid, Comment, User, Notification
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    A change list paginator that doesn't COUNT(*) huge tables. The whole
+    table is estimated, from the planner's statistics on PostgreSQL and
+    from the largest id elsewhere (which overcounts once rows have been
+    deleted); a filtered list is counted, but only up to `count_limit`
+    rows. Tables smaller than `estimate_above` rows are always counted
+    exactly. An inexact count says so in `count_qualifier`, which the
+    change list shows in front of it; see admin/auctions/pagination.html.
+    """
+
+    estimate_above = 100_000
+    count_limit = 100_000
+    count_qualifier = None
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model)
+            if estimate > self.estimate_above:
+                self.count_qualifier = "about"
+                return estimate
+            return queryset.count()
+        count = queryset.order_by()[:self.count_limit].count()
+        if count == self.count_limit:
+            self.count_qualifier = "at least"
+        return count
+
+
+def estimated_row_count(model):
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [model._meta.db_table])
+            row = cursor.fetchone()
+        # -1 until the table has been analyzed
+        if row and row[0] >= 0:
+            return row[0]
+    return model.objects.aggregate(largest=Max('pk'))['largest'] or 0
+
+
+class HugeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # The "N total" next to a filtered count is another full COUNT(*)
+    show_full_result_count = False
+
+
+class CategoryFilter(admin.SimpleListFilter):
+    title = "category"
+    parameter_name = "category"
+
+    def lookups(self, request, model_admin):
+        # From the category table, not a DISTINCT over every listing
+        return [(name, name) for name in Category.objects.order_by('name').values_list('name', flat=True)]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(category=self.value())
+        return queryset
+
+
+@admin.register(Listing)
+class ListingAdmin(HugeTableAdmin):
+    list_display = ('id', 'title', 'category', 'listed_by', 'highest_bid', 'bid_count', 'is_available', 'created_at', 'closed_at')
+    list_select_related = ('listed_by',)
+    list_filter = ('is_available', CategoryFilter)
+    search_fields = ('=id', '=listed_by__username')
+    raw_id_fields = ('listed_by', 'watched_by')
+    # Bidding and closing keep these in step with bids, notifications,
+    # category counts and the search index, so an auction is only closed
+    # or reopened through the actions below
+    readonly_fields = (
+        'is_available', 'highest_bid', 'highest_bid_user', 'winner',
+        'bid_count', 'watch_count', 'last_bid_at', 'closed_at', 'version', 'image_hash', 'image_attempts',
+    )
+    actions = ['close_selected', 'reopen_selected']
+
+    def get_readonly_fields(self, request, obj=None):
+        # Only a new listing picks its category
+        if obj is not None:
+            return self.readonly_fields + ('category',)
+        return self.readonly_fields
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.highest_bid = 0
+        super().save_model(request, obj, form, change)
+
+    @admin.action(description="Close selected auctions")
+    def close_selected(self, request, queryset):
+        closed = close_listings(queryset)
+        self.message_user(request, f"Closed {len(closed)} auction(s).")
+
+    @admin.action(description="Reopen selected auctions")
+    def reopen_selected(self, request, queryset):
+        reopened = reopen_listings(queryset)
+        self.message_user(request, f"Reopened {len(reopened)} auction(s).")
+
+
+@admin.register(Bid)
+class BidAdmin(HugeTableAdmin):
+    list_display = ('id', 'product', 'user_bid', 'bid_value', 'submited_at')
+    list_select_related = ('product__listed_by', 'user_bid')
+    list_filter = ('submited_at',)
+    search_fields = ('=product__id', '=user_bid__username')
+    raw_id_fields = ('product', 'user_bid')
+
+
+@admin.register(Comment)
+class CommentAdmin(HugeTableAdmin):
+    list_display = ('id', 'product', 'user_comment', 'created_at')
+    list_select_related = ('product__listed_by', 'user_comment')
+    search_fields = ('=product__id', '=user_comment__username')
+    raw_id_fields = ('product', 'user_comment')
+
+
+@admin.register(Notification)
+class NotificationAdmin(HugeTableAdmin):
+    list_display = ('id', 'user', 'kind', 'listing', 'amount', 'created_at', 'sent_at')
+    list_select_related = ('user', 'listing__listed_by')
+    raw_id_fields = ('user', 'listing')
+
 
-# Register your models here.
-admin.site.register(Listing)
-admin.site.register(Bid)
-admin.site.register(Comment)
 admin.site.register(User)
@@ -0,0 +1,195 @@
+import json
+from functools import wraps
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+
+from .catalog import category_counts
+from .models import Listing, Bid
+from .pagination import BID_VALUE_KEYS, LISTING_KEYS, PAGE_SIZE, encode_cursor, keyset_queryset
+from .watching import watchlist_page_ids
+
+
+MAX_PAGE_SIZE = 100
+MAX_IDS = 100
+
+# Public field name -> the column values() reads it from. Clients pick the
+# ones they need with ?fields=, and only those are selected
+LISTING_FIELDS = {
+    "id": "id",
+    "title": "title",
+    "description": "description",
+    "category": "category",
+    "image_url": "image_url",
+    "seller": "listed_by__username",
+    "created_at": "created_at",
+    "ends_at": "ends_at",
+    "min_price": "min_price",
+    "highest_bid": "highest_bid",
+    "highest_bidder": "highest_bid_user__username",
+    "bid_count": "bid_count",
+    "watch_count": "watch_count",
+    "is_available": "is_available",
+    "winner": "winner__username",
+}
+DEFAULT_LISTING_FIELDS = ["id", "title", "category", "highest_bid", "bid_count", "ends_at", "is_available"]
+
+BID_FIELDS = {
+    "id": "id",
+    "user": "user_bid__username",
+    "amount": "bid_value",
+    "submitted_at": "submited_at",
+}
+DEFAULT_BID_FIELDS = list(BID_FIELDS)
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def api_view(view):
+    """
+    Read-only JSON endpoint: GET only, errors as {"error": ...}.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != "GET":
+            return JsonResponse({"error": "Only GET is allowed."}, status=405, headers={"Allow": "GET"})
+        try:
+            return view(request, *args, **kwargs)
+        except ApiError as error:
+            return JsonResponse({"error": str(error)}, status=error.status)
+    return wrapper
+
+
+def _encode(value):
+    return json.dumps(value, cls=DjangoJSONEncoder, separators=(",", ":"))
+
+
+def _compact(data):
+    return JsonResponse(data, json_dumps_params={"separators": (",", ":")})
+
+
+def _fields(request, fields, default):
+    names = request.GET["fields"].split(",") if request.GET.get("fields") else default
+    unknown = [name for name in names if name not in fields]
+    if unknown:
+        raise ApiError(f"Unknown fields: {', '.join(unknown)}. Known: {', '.join(fields)}.")
+    return names
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get("limit", PAGE_SIZE))
+    except ValueError:
+        raise ApiError("limit must be a number.")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ApiError(f"limit must be between 1 and {MAX_PAGE_SIZE}.")
+    return limit
+
+
+def _ids(request):
+    try:
+        ids = [int(value) for value in request.GET["ids"].split(",") if value]
+    except ValueError:
+        raise ApiError("ids must be comma-separated numbers.")
+    if len(ids) > MAX_IDS:
+        raise ApiError(f"At most {MAX_IDS} ids at a time.")
+    return ids
+
+
+def _values(queryset, names, fields, keys=()):
+    # The cursor keys are read too, even when the client didn't ask for them
+    return queryset.values(*dict.fromkeys([*(fields[name] for name in names), *keys]))
+
+
+def _public(row, names, fields):
+    return {name: row[fields[name]] for name in names}
+
+
+def _values_in_bulk(queryset, ids, names, fields):
+    # in_bulk() refuses values() querysets; this is the same single query
+    rows = _values(queryset.filter(id__in=ids), names, fields, ("id",))
+    found = {row["id"]: row for row in rows}
+    return [_public(found[pk], names, fields) for pk in ids if pk in found]
+
+
+def _stream_page(queryset, names, fields, per_page, keys):
+    """
+    A page of rows encoded as they come off the database cursor, with the
+    cursor of the next page (or null) after them.
+    """
+    def chunks():
+        yield '{"results":['
+        last = next_cursor = None
+        for count, row in enumerate(_values(queryset, names, fields, keys).iterator(chunk_size=per_page + 1)):
+            if count == per_page:
+                next_cursor = encode_cursor(last, keys)
+                break
+            yield ("," if count else "") + _encode(_public(row, names, fields))
+            last = row
+        yield '],"next":' + _encode(next_cursor) + '}'
+
+    return StreamingHttpResponse(chunks(), content_type="application/json")
+
+
+@api_view
+def listings(request):
+    """
+    Active listings, newest first, optionally in one ?category=. With ?ids=
+    the listings with those ids instead, open or closed, in the order asked
+    for; ids that don't exist are left out.
+    """
+    names = _fields(request, LISTING_FIELDS, DEFAULT_LISTING_FIELDS)
+    if "ids" in request.GET:
+        return _compact({"results": _values_in_bulk(Listing.objects.all(), _ids(request), names, LISTING_FIELDS)})
+
+    limit = _limit(request)
+    queryset = Listing.objects.filter(is_available=True)
+    if request.GET.get("category"):
+        queryset = queryset.filter(category=request.GET["category"])
+    return _stream_page(
+        keyset_queryset(queryset, request.GET.get("after"), limit, LISTING_KEYS),
+        names, LISTING_FIELDS, limit, LISTING_KEYS,
+    )
+
+
+@api_view
+def listing_bids(request, listing_id):
+    """
+    A listing's bids, highest first.
+    """
+    if not Listing.objects.filter(id=listing_id).exists():
+        raise ApiError("Listing not found.", status=404)
+
+    names = _fields(request, BID_FIELDS, DEFAULT_BID_FIELDS)
+    limit = _limit(request)
+    return _stream_page(
+        keyset_queryset(Bid.objects.filter(product_id=listing_id), request.GET.get("after"), limit, BID_VALUE_KEYS),
+        names, BID_FIELDS, limit, BID_VALUE_KEYS,
+    )
+
+
+@api_view
+def categories(request):
+    return _compact({
+        "results": [{"name": name, "active_listings": count} for name, count in category_counts()],
+    })
+
+
+@api_view
+def watchlist(request):
+    """
+    The signed-in user's watchlist, newest listing first.
+    """
+    if not request.user.is_authenticated:
+        raise ApiError("Sign in to read your watchlist.", status=401)
+
+    names = _fields(request, LISTING_FIELDS, DEFAULT_LISTING_FIELDS)
+    page_ids, next_cursor = watchlist_page_ids(request.user.id, request.GET.get("after"), _limit(request))
+    return _compact({
+        "results": _values_in_bulk(Listing.objects.all(), page_ids, names, LISTING_FIELDS),
+        "next": next_cursor,
+    })
@@ -3,3 +3,13 @@ from django.apps import AppConfig
 
 class AuctionsConfig(AppConfig):
     name = 'auctions'
+
+    def ready(self):
+        # Hooks the query recorder into every database connection
+        from . import metrics  # noqa: F401
+        # Drops cached users when they change
+        from . import auth  # noqa: F401
+        # Keeps the search index in step with saved and deleted listings
+        from . import search  # noqa: F401
+        # Keeps the category counts in step with saved and deleted listings
+        from . import catalog  # noqa: F401
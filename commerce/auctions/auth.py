@@ -0,0 +1,59 @@
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .models import User
+
+
+USER_CACHE_TIMEOUT = 60
+
+
+def _user_key(user_id):
+    return f"user:{user_id}"
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend that keeps signed-in users in the cache, so that with
+    cached_db sessions a signed-in request reads neither the session nor
+    the user table. A cached user is dropped whenever its row is saved or
+    deleted, which covers password changes, last_login and admin edits.
+    Bulk update() calls bypass the signals: code making them should call
+    forget_users, and anything else is seen after USER_CACHE_TIMEOUT.
+    """
+
+    def get_user(self, user_id):
+        key = _user_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, USER_CACHE_TIMEOUT)
+        return user
+
+    async def aget_user(self, user_id):
+        key = _user_key(user_id)
+        user = await cache.aget(key)
+        if user is None:
+            user = await super().aget_user(user_id)
+            if user is not None:
+                await cache.aset(key, user, USER_CACHE_TIMEOUT)
+        return user
+
+
+def forget_users(user_ids):
+    """
+    Drop the cached copies of these users once the current transaction
+    commits, e.g. after deactivating them with a bulk update().
+    """
+    keys = [_user_key(user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def forget_user(sender, instance, **kwargs):
+    forget_users([instance.pk])
+
+
+post_save.connect(forget_user, sender=User)
+post_delete.connect(forget_user, sender=User)
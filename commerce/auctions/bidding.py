@@ -0,0 +1,98 @@
+import random
+import time
+from decimal import Decimal
+
+from django.db import OperationalError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Listing, Bid
+from .notifications import notify_outbid
+
+
+ACCEPTED = "accepted"
+OUTBID = "outbid"
+CLOSED = "closed"
+
+# Smallest step a new bid has to clear the current one by
+BID_INCREMENT = Decimal("0.01")
+
+# SQLite has a single writer, so under contention a write can fail straight
+# away with "database is locked" instead of waiting on a row lock the way
+# PostgreSQL does. Those attempts are retried with a short jittered backoff.
+LOCK_RETRIES = 100
+LOCK_BACKOFF = 0.002
+
+
+class BidResult:
+    def __init__(self, status, bid=None):
+        self.status = status
+        self.bid = bid
+
+    @property
+    def accepted(self):
+        return self.status == ACCEPTED
+
+    def __repr__(self):
+        return f"BidResult({self.status!r})"
+
+
+def minimum_bid(listing):
+    """
+    Lowest amount `submit_bid` would accept on `listing` right now.
+    """
+    return max(listing.min_price, listing.highest_bid + BID_INCREMENT)
+
+
+def submit_bid(listing_id, user, amount):
+    """
+    Try to make `amount` the highest bid on a listing.
+
+    The highest-bid check and the listing update are a single conditional
+    UPDATE, so two bidders racing on the same listing can never both win and
+    only the two bid columns are written. The Bid row is only inserted when
+    the UPDATE matched, inside the same transaction.
+    """
+    for attempt in range(LOCK_RETRIES):
+        try:
+            return _try_bid(listing_id, user, amount)
+        except OperationalError as error:
+            if "locked" not in str(error) or attempt == LOCK_RETRIES - 1:
+                raise
+            time.sleep(random.uniform(0, LOCK_BACKOFF * (attempt + 1)))
+
+
+def _try_bid(listing_id, user, amount):
+    with transaction.atomic():
+        updated = Listing.objects.filter(
+            Q(highest_bid__lt=amount) & Q(min_price__lte=amount),
+            id=listing_id,
+            is_available=True,
+        ).update(
+            highest_bid=amount,
+            highest_bid_user=user,
+            bid_count=F('bid_count') + 1,
+            last_bid_at=timezone.now(),
+            version=F('version') + 1,
+        )
+
+        if updated:
+            # Our UPDATE holds the listing's write lock, so the top bid on
+            # file is still the one we just displaced
+            previous = (
+                Bid.objects.filter(product_id=listing_id)
+                .order_by('-bid_value', '-id')
+                .values_list('user_bid_id', flat=True)
+                .first()
+            )
+            bid = Bid.objects.create(product_id=listing_id, bid_value=amount, user_bid=user)
+            if previous is not None and previous != user.id:
+                notify_outbid(previous, listing_id, amount)
+            return BidResult(ACCEPTED, bid)
+
+    is_available = Listing.objects.filter(id=listing_id).values_list("is_available", flat=True).first()
+    if is_available is None:
+        raise Listing.DoesNotExist(f"Listing {listing_id} does not exist")
+    if not is_available:
+        return BidResult(CLOSED)
+    return BidResult(OUTBID)
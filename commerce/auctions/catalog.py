@@ -0,0 +1,110 @@
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from .models import Category, Listing
+
+
+CATEGORY_CACHE_KEY = "auctions:categories"
+
+# What a listing's place in the counts depends on
+COUNTED_FIELDS = {"category", "is_available"}
+
+
+def category_counts():
+    """
+    Return (name, active listing count) pairs for every category that has
+    at least one active listing, served from the cache when possible.
+    """
+    return cache.get_or_set(CATEGORY_CACHE_KEY, _load_category_counts)
+
+
+async def acategory_counts():
+    """
+    Async version of `category_counts`, for async views.
+    """
+    counts = await cache.aget(CATEGORY_CACHE_KEY)
+    if counts is None:
+        counts = [row async for row in _category_counts_queryset()]
+        await cache.aset(CATEGORY_CACHE_KEY, counts)
+    return counts
+
+
+def _category_counts_queryset():
+    return (
+        Category.objects.filter(active_listings__gt=0)
+        .order_by('name')
+        .values_list('name', 'active_listings')
+    )
+
+
+def _load_category_counts():
+    return list(_category_counts_queryset())
+
+
+def invalidate_categories():
+    transaction.on_commit(lambda: cache.delete(CATEGORY_CACHE_KEY))
+
+
+def listings_opened(category_names):
+    opened = Counter(name for name in category_names if name)
+    if not opened:
+        return
+    Category.objects.bulk_create([Category(name=name) for name in opened], ignore_conflicts=True)
+    for name, count in opened.items():
+        Category.objects.filter(name=name).update(active_listings=F('active_listings') + count)
+    invalidate_categories()
+
+
+def listings_closed(category_names):
+    """
+    Take closed listings off their categories' counts, with one UPDATE per
+    distinct category however many listings were closed.
+    """
+    closed = Counter(name for name in category_names if name)
+    for name, count in closed.items():
+        Category.objects.filter(name=name).update(
+            active_listings=Greatest(F('active_listings') - count, 0)
+        )
+    if closed:
+        invalidate_categories()
+
+
+# Saving, moving or deleting a single listing keeps the counts right through
+# the receivers below. Bulk writes, such as closing and imports, bypass the
+# signals and call listings_opened / listings_closed themselves.
+
+def _counted(category, is_available):
+    return [category] if is_available else []
+
+
+def remember_counted_category(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not COUNTED_FIELDS & set(update_fields)):
+        return
+    before = None
+    if instance.pk is not None:
+        before = Listing.objects.filter(pk=instance.pk).values_list('category', 'is_available').first()
+    instance._counted_before = _counted(*before) if before else []
+
+
+def recount_saved_listing(sender, instance, **kwargs):
+    before = instance.__dict__.pop('_counted_before', None)
+    if before is None:
+        return
+    after = _counted(instance.category, instance.is_available)
+    if before != after:
+        listings_closed(before)
+        listings_opened(after)
+
+
+def recount_deleted_listing(sender, instance, **kwargs):
+    listings_closed(_counted(instance.category, instance.is_available))
+
+
+pre_save.connect(remember_counted_category, sender=Listing)
+post_save.connect(recount_saved_listing, sender=Listing)
+post_delete.connect(recount_deleted_listing, sender=Listing)
@@ -0,0 +1,100 @@
+from django.db import transaction
+from django.db.models import Case, F, When
+from django.utils import timezone
+
+from .catalog import listings_closed, listings_opened
+from .live import publish_listing_event
+from .models import Listing
+from .notifications import notify_winners, void_wins
+from .pagecache import FEED_SCOPE, invalidate_pages, listing_scope
+from .search import get_search_backend
+
+
+def close_listings(queryset, limit=None):
+    """
+    Close the open listings in `queryset` (at most `limit` of them), record
+    the highest bidder as the winner and return the ids that were closed.
+
+    Rows are claimed with SELECT ... FOR UPDATE SKIP LOCKED where the
+    database supports it, so several workers can run side by side without
+    waiting on or double-closing each other's batches. On SQLite, which has
+    a single writer, the update is stamped with its own closed_at instead,
+    and only rows carrying that stamp count as closed by this call.
+    """
+    with transaction.atomic():
+        candidates = (
+            queryset.filter(is_available=True)
+            .select_for_update(skip_locked=True)
+            .values_list('id', flat=True)
+        )
+        ids = list(candidates[:limit] if limit else candidates)
+        if not ids:
+            return []
+
+        stamp = timezone.now()
+        Listing.objects.filter(id__in=ids, is_available=True).update(
+            is_available=False,
+            closed_at=stamp,
+            winner=F('highest_bid_user'),
+            version=F('version') + 1,
+        )
+        closed = list(
+            Listing.objects.filter(id__in=ids, closed_at=stamp)
+            .values_list('id', 'category', 'highest_bid', 'winner_id', 'winner__username')
+        )
+
+        closed_ids = [listing_id for listing_id, *rest in closed]
+        listings_closed(category for _, category, *rest in closed)
+        get_search_backend().remove_listings(closed_ids)
+        invalidate_pages(FEED_SCOPE, *[listing_scope(listing_id) for listing_id in closed_ids])
+        notify_winners((listing_id, winner_id, final_bid) for listing_id, _, final_bid, winner_id, _ in closed)
+        for listing_id, category, final_bid, winner_id, winner in closed:
+            publish_listing_event(listing_id, "closed", winner=winner, amount=final_bid)
+
+    return closed_ids
+
+
+def reopen_listings(queryset):
+    """
+    Reopen the closed listings in `queryset` with one UPDATE and return the
+    ids that were reopened. The winner and closing time are cleared, and an
+    end time that has already passed is dropped so close_expired doesn't
+    close them again straight away. Auction-won notices still waiting in
+    the outbox are dropped, and open listing pages are told.
+    """
+    with transaction.atomic():
+        ids = list(
+            queryset.filter(is_available=False)
+            .select_for_update(skip_locked=True)
+            .values_list('id', flat=True)
+        )
+        if not ids:
+            return []
+
+        now = timezone.now()
+        Listing.objects.filter(id__in=ids, is_available=False).update(
+            is_available=True,
+            closed_at=None,
+            winner=None,
+            ends_at=Case(When(ends_at__lte=now, then=None), default=F('ends_at')),
+            version=F('version') + 1,
+        )
+        reopened = list(Listing.objects.filter(id__in=ids))
+
+        listings_opened(listing.category for listing in reopened)
+        get_search_backend().index_listings(reopened)
+        invalidate_pages(FEED_SCOPE, *[listing_scope(listing_id) for listing_id in ids])
+        void_wins(ids)
+        for listing_id in ids:
+            publish_listing_event(listing_id, "reopened")
+
+    return ids
+
+
+def close_expired(now=None, batch_size=500):
+    """
+    Close one batch of auctions whose ends_at has passed.
+    """
+    now = now or timezone.now()
+    expired = Listing.objects.filter(ends_at__lte=now).order_by('ends_at')
+    return close_listings(expired, limit=batch_size)
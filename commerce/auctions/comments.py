@@ -0,0 +1,192 @@
+import atexit
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, transaction
+
+from .bidding import LOCK_BACKOFF, LOCK_RETRIES
+
+from .live import publish_listing_event
+from .models import Comment
+from .pagecache import invalidate_pages, listing_scope
+
+
+logger = logging.getLogger(__name__)
+
+
+class CommentBuffer:
+    """
+    Comments waiting to be written. `add` returns at once and the buffer is
+    written with one bulk_create when it holds COMMENT_BATCH_SIZE comments,
+    or by a background thread every COMMENT_BATCH_SECONDS, so a burst of
+    comments on a hot listing takes the write lock once per batch instead
+    of once per comment. A batch size of 1 writes every comment in the
+    request that posted it.
+
+    Like the live event broker, the buffer belongs to one process. Until
+    its batch is written a comment is only shown to its author, through
+    `pending`, and only by the process that buffered it: with several
+    server processes, the author's next request may land on another one
+    and not see it yet. Comments still buffered when a process is killed
+    are lost; a clean exit writes them.
+
+    A batch that cannot be written because the database stays locked goes
+    back to the front of the queue for the next flush instead of being
+    dropped.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._queued = []
+        self._writing = []
+        self._flusher = None
+
+    def add(self, listing_id, user, text):
+        comment = Comment(product_id=listing_id, user_comment=user, comment=text)
+        with self._lock:
+            self._queued.append(comment)
+            full = len(self._queued) >= settings.COMMENT_BATCH_SIZE
+            if not full:
+                self._start_flusher()
+        if full:
+            try:
+                self.flush()
+            except OperationalError:
+                # The comment is still queued and shown to its author; leave
+                # it to the background flusher rather than fail the request
+                logger.warning("comment flush failed, retrying in the background", exc_info=True)
+                with self._lock:
+                    self._start_flusher()
+        return comment
+
+    def _start_flusher(self):
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_periodically, name="comment-flusher", daemon=True)
+            self._flusher.start()
+
+    def pending(self, listing_id, user_id):
+        """
+        The author's comments on a listing that may not be written yet,
+        newest first.
+        """
+        with self._lock:
+            comments = self._writing + self._queued
+        return [
+            comment for comment in reversed(comments)
+            if comment.product_id == listing_id and comment.user_comment_id == user_id
+        ]
+
+    def flush(self):
+        """
+        Write every buffered comment. Returns how many were written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                self._writing, self._queued = self._queued, []
+            try:
+                return _write(self._writing)
+            except OperationalError:
+                # `_write` leaves only the comments it could not write
+                with self._lock:
+                    self._queued[:0] = self._writing
+                raise
+            finally:
+                with self._lock:
+                    self._writing = []
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(settings.COMMENT_BATCH_SECONDS)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("comment flush failed")
+
+
+def _write(comments):
+    """
+    Write `comments` and return how many were written. Comments that cannot
+    be written on their own are dropped. If the database stays locked, the
+    OperationalError is raised with `comments` cut down to the ones not yet
+    written.
+    """
+    if not comments:
+        return 0
+    try:
+        _retrying(_write_batch, comments)
+        written = len(comments)
+        del comments[:]
+        return written
+    except IntegrityError:
+        pass
+
+    # Usually a listing deleted while its comments were buffered; write the
+    # rest one by one rather than lose the whole batch
+    written = []
+    try:
+        while comments:
+            comment = comments[0]
+            try:
+                _retrying(_write_one, comment)
+            except IntegrityError as error:
+                logger.warning("comment dropped", extra={"listing": comment.product_id, "error": str(error)})
+            else:
+                written.append(comment)
+            del comments[0]
+    finally:
+        if written:
+            with transaction.atomic():
+                _published(written)
+    return len(written)
+
+
+def _retrying(write, *args):
+    # Same backoff as bidding.submit_bid: SQLite fails a write with
+    # "database is locked" instead of waiting for the writer ahead of it
+    for attempt in range(LOCK_RETRIES):
+        try:
+            return write(*args)
+        except OperationalError as error:
+            if "locked" not in str(error) or attempt == LOCK_RETRIES - 1:
+                raise
+            time.sleep(random.uniform(0, LOCK_BACKOFF * (attempt + 1)))
+
+
+def _write_batch(comments):
+    # A rolled back bulk_create can leave primary keys behind
+    for comment in comments:
+        comment.pk = None
+    with transaction.atomic():
+        Comment.objects.bulk_create(comments)
+        _published(comments)
+
+
+def _write_one(comment):
+    comment.pk = None
+    with transaction.atomic():
+        comment.save()
+
+
+def _published(comments):
+    invalidate_pages(*{listing_scope(comment.product_id) for comment in comments})
+    for comment in comments:
+        publish_listing_event(comment.product_id, "comment",
+                              comment=comment.comment,
+                              user=comment.user_comment.username)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def comment_buffer():
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = CommentBuffer()
+            atexit.register(_buffer.flush)
+        return _buffer
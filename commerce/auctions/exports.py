@@ -0,0 +1,118 @@
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Listing
+
+
+EXPORT_CHUNK_SIZE = 2000
+# Lines are sent in pieces of about this size rather than one write each
+RESPONSE_CHUNK_BYTES = 64 * 1024
+
+# Column -> the value it is read from
+RESULT_COLUMNS = {
+    "id": "id",
+    "title": "title",
+    "category": "category",
+    "seller": "listed_by__username",
+    "created_at": "created_at",
+    "closed_at": "closed_at",
+    "min_price": "min_price",
+    "bid_count": "bid_count",
+    "winner": "winner__username",
+    "final_price": "highest_bid",
+}
+
+
+_WINNER = list(RESULT_COLUMNS).index("winner")
+_FINAL_PRICE = list(RESULT_COLUMNS).index("final_price")
+
+
+def _closed_auctions(seller_id):
+    queryset = Listing.objects.filter(is_available=False)
+    if seller_id is not None:
+        queryset = queryset.filter(listed_by_id=seller_id)
+    # Named rows: a plain values_list() starts its query as soon as
+    # aiterator() is called, on the event loop, which Django refuses
+    return queryset.order_by('closed_at', 'id').values_list(*RESULT_COLUMNS.values(), named=True)
+
+
+def _result(row):
+    # An auction that closed without bids has no winner and no final price
+    if row[_WINNER] is None:
+        return row[:_FINAL_PRICE] + (None,) + row[_FINAL_PRICE + 1:]
+    return row
+
+
+def closed_auction_rows(seller_id=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Every closed auction, or one seller's, oldest closing first, as tuples
+    in RESULT_COLUMNS order. Rows are read `chunk_size` at a time (through a
+    server-side cursor where the database has them), so memory stays flat
+    however many there are.
+    """
+    for row in _closed_auctions(seller_id).iterator(chunk_size=chunk_size):
+        yield _result(row)
+
+
+async def aclosed_auction_rows(seller_id=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    The same rows as an async iterator. ASGI servers read a sync iterator
+    into memory whole before sending any of it, so this is what streams there.
+    """
+    async for row in _closed_auctions(seller_id).aiterator(chunk_size=chunk_size):
+        yield _result(row)
+
+
+class _Echo:
+    # csv.writer writes to a file; this hands each line back instead
+    def write(self, value):
+        return value
+
+
+def csv_format():
+    writer = csv.writer(_Echo())
+
+    def line(row):
+        return writer.writerow(value.isoformat() if hasattr(value, "isoformat") else value for value in row)
+    return writer.writerow(RESULT_COLUMNS), line
+
+
+def jsonl_format():
+    encoder = DjangoJSONEncoder(separators=(",", ":"))
+
+    def line(row):
+        return encoder.encode(dict(zip(RESULT_COLUMNS, row))) + "\n"
+    return "", line
+
+
+EXPORT_FORMATS = {
+    "csv": (csv_format, "text/csv; charset=utf-8"),
+    "jsonl": (jsonl_format, "application/x-ndjson"),
+}
+
+
+def export_chunks(fmt, rows, size=RESPONSE_CHUNK_BYTES):
+    header, line = EXPORT_FORMATS[fmt][0]()
+    buffer, buffered = [header], len(header)
+    for row in rows:
+        buffer.append(line(row))
+        buffered += len(buffer[-1])
+        if buffered >= size:
+            yield "".join(buffer)
+            buffer, buffered = [], 0
+    if buffered:
+        yield "".join(buffer)
+
+
+async def aexport_chunks(fmt, rows, size=RESPONSE_CHUNK_BYTES):
+    header, line = EXPORT_FORMATS[fmt][0]()
+    buffer, buffered = [header], len(header)
+    async for row in rows:
+        buffer.append(line(row))
+        buffered += len(buffer[-1])
+        if buffered >= size:
+            yield "".join(buffer)
+            buffer, buffered = [], 0
+    if buffered:
+        yield "".join(buffer)
@@ -0,0 +1,63 @@
+import threading
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+
+CARD_TEMPLATE = "auctions/listing_card.html"
+CARD_TIMEOUT = 60 * 60 * 24
+
+
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hits, misses):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def snapshot(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+card_stats = CacheStats()
+
+
+def card_cache_key(listing):
+    # The version is part of the key, so a changed listing simply stops
+    # matching its old fragment and nothing has to be deleted
+    return f"listing-card:{listing.id}:{listing.version}"
+
+
+def render_listing_cards(listings):
+    """
+    Render the card for every listing, reusing cached fragments. All the
+    cache lookups for a page are a single get_many, and the misses are
+    written back with a single set_many.
+    """
+    keys = [card_cache_key(listing) for listing in listings]
+    cached = cache.get_many(keys)
+
+    missing = {}
+    fragments = []
+    for key, listing in zip(keys, listings):
+        html = cached.get(key)
+        if html is None:
+            html = render_to_string(CARD_TEMPLATE, {"listing": listing})
+            missing[key] = html
+        fragments.append(html)
+
+    if missing:
+        cache.set_many(missing, CARD_TIMEOUT)
+    card_stats.record(len(keys) - len(missing), len(missing))
+
+    return "".join(fragments)
@@ -0,0 +1,201 @@
+import hashlib
+import ipaddress
+import logging
+import os
+import socket
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from io import BytesIO
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import F, Q
+from django.urls import reverse
+
+from .models import Listing
+from .pagecache import FEED_SCOPE, invalidate_pages, listing_scope
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+logger = logging.getLogger(__name__)
+
+
+# Largest box each thumbnail is fitted into, at twice the size it is shown
+# at (cards are 150px high, the listing page image 500px wide)
+THUMBNAIL_SIZES = {
+    "card": (600, 300),
+    "page": (1000, 1000),
+}
+MAX_ATTEMPTS = 3
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+FETCH_TIMEOUT = 10
+MAX_REDIRECTS = 3
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+
+# Names are content hashes, so a file never changes once written
+CACHE_SECONDS = 60 * 60 * 24 * 365
+
+PENDING = Q(image_attempts__lt=MAX_ATTEMPTS) & Listing.IMAGE_PENDING
+
+
+class ImageFetchError(Exception):
+    pass
+
+
+def thumbnail_root():
+    return settings.THUMBNAIL_ROOT
+
+
+def thumbnail_name(content_hash, size):
+    return f"{content_hash}-{size}.jpg"
+
+
+def thumbnail_url(content_hash, size):
+    return reverse("auctions:thumbnail", args=[thumbnail_name(content_hash, size)])
+
+
+def _is_public(address):
+    return ipaddress.ip_address(address.split("%")[0]).is_global
+
+
+def _resolve(url):
+    """
+    Check that `url` is http(s) on a public host and return its parts,
+    port and the address to connect to.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ImageFetchError(f"Not an http(s) URL: {url}")
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    try:
+        addresses = [info[4][0] for info in socket.getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)]
+    except socket.gaierror as error:
+        raise ImageFetchError(f"Can't resolve {parts.hostname}: {error}")
+    # The URL comes from a user, so don't let it point the server at itself
+    # or at anything else on the private network
+    if not settings.THUMBNAIL_ALLOW_PRIVATE_HOSTS and not all(map(_is_public, addresses)):
+        raise ImageFetchError(f"{parts.hostname} is not a public address")
+    return parts, port, addresses[0]
+
+
+class _PinnedConnection:
+    # Connects to the address that was checked rather than resolving the
+    # name again, which could give another one. The name is still used for
+    # the Host header and the TLS certificate.
+    def __init__(self, host, port, address, **kwargs):
+        super().__init__(host, port, **kwargs)
+        self._create_connection = lambda _, *args: socket.create_connection((address, port), *args)
+
+
+class _PinnedHTTPConnection(_PinnedConnection, HTTPConnection):
+    pass
+
+
+class _PinnedHTTPSConnection(_PinnedConnection, HTTPSConnection):
+    pass
+
+
+def fetch_image(url):
+    """
+    Download an image. Redirects are followed up to MAX_REDIRECTS times and
+    every hop is checked like the first URL, so a public URL can't redirect
+    the fetch to a private address.
+    """
+    for _ in range(MAX_REDIRECTS + 1):
+        parts, port, address = _resolve(url)
+        connection_class = _PinnedHTTPSConnection if parts.scheme == "https" else _PinnedHTTPConnection
+        connection = connection_class(parts.hostname, port, address, timeout=FETCH_TIMEOUT)
+        try:
+            connection.request("GET", urlunsplit(("", "", parts.path or "/", parts.query, "")),
+                               headers={"User-Agent": "auctions-thumbnailer"})
+            response = connection.getresponse()
+            location = response.getheader("Location")
+            if response.status in REDIRECT_STATUSES and location:
+                url = urljoin(url, location)
+                continue
+            if response.status != 200:
+                raise ImageFetchError(f"{url} answered {response.status}")
+            content_type = response.headers.get_content_type()
+            if not content_type.startswith("image/"):
+                raise ImageFetchError(f"{url} is {content_type}, not an image")
+            data = response.read(MAX_IMAGE_BYTES + 1)
+        except (OSError, HTTPException) as error:
+            raise ImageFetchError(f"Fetching {url} failed: {error}")
+        finally:
+            connection.close()
+
+        if len(data) > MAX_IMAGE_BYTES:
+            raise ImageFetchError(f"{url} is larger than {MAX_IMAGE_BYTES} bytes")
+        return data
+    raise ImageFetchError(f"More than {MAX_REDIRECTS} redirects fetching {url}")
+
+
+def make_thumbnails(data):
+    """
+    Write every thumbnail size for an image under its content hash and
+    return the hash. An image already on disk, from this or any other
+    listing, is not resized again.
+    """
+    if Image is None:
+        raise ImproperlyConfigured("Thumbnails need Pillow (pip install Pillow).")
+
+    content_hash = hashlib.sha256(data).hexdigest()
+    root = thumbnail_root()
+    os.makedirs(root, exist_ok=True)
+
+    missing = [size for size in THUMBNAIL_SIZES if not os.path.exists(os.path.join(root, thumbnail_name(content_hash, size)))]
+    if missing:
+        try:
+            original = Image.open(BytesIO(data))
+            original.load()
+        except (OSError, Image.DecompressionBombError) as error:
+            raise ImageFetchError(f"Not a readable image: {error}")
+        original = original.convert("RGB")
+
+        for size in missing:
+            thumbnail = original.copy()
+            thumbnail.thumbnail(THUMBNAIL_SIZES[size])
+            path = os.path.join(root, thumbnail_name(content_hash, size))
+            # Written aside and renamed, so a reader never sees half a file
+            temp = f"{path}.{os.getpid()}.tmp"
+            thumbnail.save(temp, "JPEG", quality=85, optimize=True)
+            os.replace(temp, path)
+
+    return content_hash
+
+
+def process_pending_images(batch_size=20):
+    """
+    Fetch and thumbnail the images of up to `batch_size` listings that don't
+    have thumbnails yet. Returns (attempted, succeeded).
+
+    Each listing is claimed by bumping its attempt count with a conditional
+    UPDATE before the fetch, so several workers never fetch the same image
+    and nothing stays locked while the network is slow. A listing gives up
+    after MAX_ATTEMPTS and keeps linking to the original.
+    """
+    candidates = list(
+        Listing.objects.filter(PENDING).order_by('id').values_list('id', 'image_url', 'image_attempts')[:batch_size]
+    )
+    attempted = done = 0
+    for listing_id, url, attempts in candidates:
+        claimed = Listing.objects.filter(PENDING, id=listing_id, image_attempts=attempts).update(
+            image_attempts=attempts + 1,
+        )
+        if not claimed:
+            continue
+        attempted += 1
+        try:
+            content_hash = make_thumbnails(fetch_image(url))
+        except ImageFetchError as error:
+            logger.warning("thumbnail failed", extra={"listing": listing_id, "attempt": attempts + 1, "error": str(error)})
+            continue
+
+        Listing.objects.filter(id=listing_id).update(image_hash=content_hash, version=F('version') + 1)
+        invalidate_pages(FEED_SCOPE, listing_scope(listing_id))
+        done += 1
+    return attempted, done
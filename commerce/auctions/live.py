@@ -0,0 +1,107 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+QUEUE_SIZE = 100
+
+
+class Subscription:
+    """
+    One listener on a channel. Events can be delivered from any thread (the
+    sync views run in a thread pool under ASGI); they are handed to the
+    subscriber's event loop, and the oldest event is dropped if a slow
+    client falls QUEUE_SIZE events behind.
+    """
+
+    def __init__(self, broker, channel, maxsize=QUEUE_SIZE):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+
+    def deliver(self, event):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """
+    Fans events out to the subscribers of this process only. Running more
+    than one server process needs a broker-backed implementation with the
+    same subscribe/unsubscribe/publish methods, set in AUCTIONS_LIVE_BROKER.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def subscriber_count(self, channel):
+        with self._lock:
+            return len(self._subscribers.get(channel, ()))
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.deliver(event)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            path = getattr(settings, "AUCTIONS_LIVE_BROKER", "auctions.live.InProcessBroker")
+            _broker = import_string(path)()
+        return _broker
+
+
+def listing_channel(listing_id):
+    return f"listing:{listing_id}"
+
+
+def publish_listing_event(listing_id, event_type, **data):
+    """
+    Broadcast an event to a listing's subscribers once the current
+    transaction commits, so nobody hears about a bid that was rolled back.
+    """
+    event = {"type": event_type, **data}
+    transaction.on_commit(lambda: get_broker().publish(listing_channel(listing_id), event))
+
+
+def format_sse(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event, cls=DjangoJSONEncoder)}\n\n"
@@ -0,0 +1,55 @@
+import json
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.test import override_settings
+
+
+@contextmanager
+def scratch_database(test_name=None):
+    """
+    Run a benchmark against a freshly migrated throwaway database (the same
+    one the test runner would build) so the real data is never touched.
+
+    `test_name` overrides the database name, e.g. to put a SQLite benchmark
+    in a file instead of a shared in-memory database. Passwords are hashed
+    with FAST_PASSWORD_HASHERS, as in the test suite.
+    """
+    old_name = connection.settings_dict["NAME"]
+    old_test_name = connection.settings_dict["TEST"]["NAME"]
+    if test_name:
+        connection.settings_dict["TEST"]["NAME"] = test_name
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        with override_settings(PASSWORD_HASHERS=settings.FAST_PASSWORD_HASHERS):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        connection.settings_dict["TEST"]["NAME"] = old_test_name
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def percentiles(samples):
+    if len(samples) < 2:
+        return {"p50": samples[0], "p90": samples[0], "p99": samples[0]} if samples else {}
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {"p50": cuts[49], "p90": cuts[89], "p99": cuts[98]}
+
+
+def in_ms(values):
+    return {key: round(value * 1000, 2) for key, value in values.items()}
+
+
+def write_results(stdout, results, path=None):
+    if path:
+        with open(path, "w") as output:
+            json.dump(results, output, indent=2)
+    stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,138 @@
+import random
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from auctions.catalog import listings_opened
+from auctions.models import User, Listing, Bid, Comment
+from auctions.search import get_search_backend
+
+from .import_listings import carried_over_timestamps
+
+
+CATEGORIES = [
+    "Electronics", "Books", "Fashion", "Home", "Toys", "Sports", "Music", "Art",
+    "Collectibles", "Garden", "Tools", "Jewelry", "Games", "Photography", "Cars",
+]
+WORDS = (
+    "vintage rare new used mint boxed signed classic limited antique handmade "
+    "lamp camera guitar watch bicycle chair poster vinyl jacket console lens"
+).split()
+
+# Zipf exponent for every skewed choice: a few listings draw most of the
+# bids, a few users place most of them and a few categories hold most of
+# the listings, as on a real auction site
+SKEW = 1.1
+CLOSED_SHARE = 0.2
+BATCH_SIZE = 2000
+
+
+def zipf_weights(n, s=SKEW):
+    return list(accumulate(1 / (rank + 1) ** s for rank in range(n)))
+
+
+def generate_data(users, listings, bids, comments, watches=None, seed=0):
+    """
+    Fill the database with `users` users and `listings` listings carrying
+    `bids` bids and `comments` comments between them, skewed the way real
+    traffic is. Denormalised counts, the category table and the search index
+    are kept consistent. The same seed gives the same data.
+
+    Returns the ids and names the benchmarks need to build URLs.
+    """
+    rng = random.Random(seed)
+    watches = listings if watches is None else watches
+    now = timezone.now()
+
+    with transaction.atomic(), carried_over_timestamps():
+        unusable = make_password(None)
+        people = User.objects.bulk_create(
+            [User(username=f"user{i}", email=f"user{i}@example.com", password=unusable) for i in range(users)],
+            batch_size=BATCH_SIZE,
+        )
+        user_weights = zipf_weights(len(people))
+        category_weights = zipf_weights(len(CATEGORIES))
+
+        listing_weights = zipf_weights(listings)
+        bids_per_listing = Counter(rng.choices(range(listings), cum_weights=listing_weights, k=bids))
+        watched = {
+            (user, index)
+            for user, index in zip(
+                rng.choices(people, cum_weights=user_weights, k=watches),
+                rng.choices(range(listings), cum_weights=listing_weights, k=watches),
+            )
+        }
+        watch_counts = Counter(index for _, index in watched)
+
+        items = []
+        pending_bids = []
+        for i in range(listings):
+            created_at = now - timedelta(minutes=rng.randint(60, 60 * 24 * 30))
+            min_price = Decimal(rng.randint(100, 50000)) / 100
+            bidders = rng.choices(people, cum_weights=user_weights, k=bids_per_listing[i])
+            amounts = list(accumulate(
+                [min_price] + [Decimal(rng.randint(1, 500)) / 100 for _ in bidders[1:]]
+            ))
+            times = sorted(min(created_at + timedelta(seconds=rng.randint(1, 3600 * 24)), now) for _ in bidders)
+            is_available = rng.random() >= CLOSED_SHARE
+            winner = bidders[-1] if bidders else None
+
+            items.append(Listing(
+                title=" ".join(rng.choices(WORDS, k=3)).capitalize(),
+                description=" ".join(rng.choices(WORDS, k=rng.randint(10, 60))),
+                min_price=min_price,
+                category=rng.choices(CATEGORIES, cum_weights=category_weights)[0],
+                listed_by=rng.choices(people, cum_weights=user_weights)[0],
+                created_at=created_at,
+                highest_bid=amounts[-1] if bidders else 0,
+                highest_bid_user=winner,
+                bid_count=len(bidders),
+                watch_count=watch_counts[i],
+                last_bid_at=times[-1] if times else None,
+                is_available=is_available,
+                closed_at=None if is_available else max([created_at, *times]),
+                winner=None if is_available else winner,
+            ))
+            pending_bids.append(list(zip(bidders, amounts, times)))
+
+        Listing.objects.bulk_create(items, batch_size=BATCH_SIZE)
+        Bid.objects.bulk_create(
+            (
+                Bid(product=listing, user_bid=user, bid_value=amount, submited_at=when)
+                for listing, listing_bids in zip(items, pending_bids)
+                for user, amount, when in listing_bids
+            ),
+            batch_size=BATCH_SIZE,
+        )
+
+        Comment.objects.bulk_create(
+            (
+                Comment(product=listing, user_comment=user, comment=" ".join(rng.choices(WORDS, k=12)),
+                        created_at=min(listing.created_at + timedelta(minutes=rng.randint(1, 60 * 24)), now))
+                for listing, user in zip(
+                    rng.choices(items, cum_weights=listing_weights, k=comments),
+                    rng.choices(people, cum_weights=user_weights, k=comments),
+                )
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        Listing.watched_by.through.objects.bulk_create(
+            [Listing.watched_by.through(user_id=user.id, listing_id=items[index].id) for user, index in watched],
+            batch_size=BATCH_SIZE,
+        )
+
+        active = [listing for listing in items if listing.is_available]
+        listings_opened(listing.category for listing in active)
+        get_search_backend().index_listings(active)
+
+    return {
+        "users": [user.id for user in people],
+        "active_listings": [listing.id for listing in active],
+        "hot_listing": max(active, key=lambda listing: listing.bid_count).id,
+        "top_category": Counter(listing.category for listing in active).most_common(1)[0][0],
+    }
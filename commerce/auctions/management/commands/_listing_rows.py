@@ -0,0 +1,47 @@
+import csv
+import json
+import sys
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+# Columns shared by import_listings and export_listings. Bids travel with
+# their listing as a JSON list of {"user", "value", "submited_at"} objects.
+FIELDS = [
+    "title", "description", "min_price", "image_url", "category", "listed_by",
+    "created_at", "is_available", "ends_at", "highest_bid", "highest_bid_user", "bids",
+]
+
+
+def detect_format(path, fmt):
+    if fmt:
+        return fmt
+    return "jsonl" if path.endswith((".jsonl", ".json")) else "csv"
+
+
+def read_rows(stream, fmt):
+    if fmt == "jsonl":
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        csv.field_size_limit(sys.maxsize)
+        for row in csv.DictReader(stream):
+            if row.get("bids"):
+                row["bids"] = json.loads(row["bids"])
+            yield row
+
+
+class RowWriter:
+    def __init__(self, stream, fmt):
+        self.stream = stream
+        self.fmt = fmt
+        if fmt == "csv":
+            self.writer = csv.DictWriter(stream, fieldnames=FIELDS)
+            self.writer.writeheader()
+
+    def write(self, row):
+        if self.fmt == "jsonl":
+            self.stream.write(json.dumps(row, cls=DjangoJSONEncoder) + "\n")
+        else:
+            self.writer.writerow({**row, "bids": json.dumps(row["bids"], cls=DjangoJSONEncoder) if row["bids"] else ""})
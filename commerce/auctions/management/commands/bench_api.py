@@ -0,0 +1,94 @@
+import os
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from auctions.models import User
+from auctions.watching import watch
+
+from ._bench import in_ms, percentiles, scratch_database, write_results
+from ._datagen import generate_data
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare reading the same data through the JSON API and through the "
+        "HTML pages it replaces for scrapers: time, queries and bytes per read."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=30)
+        parser.add_argument("--batch", type=int, default=50, help="Listings fetched by id per read.")
+        parser.add_argument("--output", help="Also write the results to this JSON file.")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                test_name = os.path.join(tmp, "bench.sqlite3") if connection.vendor == "sqlite" else None
+                with scratch_database(test_name):
+                    results = self.run_all(options["iterations"], options["batch"])
+        finally:
+            teardown_test_environment()
+
+        write_results(self.stdout, results, options["output"])
+
+    def run_all(self, iterations, batch):
+        ctx = generate_data(users=200, listings=2000, bids=20000, comments=5000)
+        user = User.objects.get(id=ctx["users"][0])
+        for listing_id in ctx["active_listings"][:batch]:
+            watch(user.id, listing_id)
+        # Signed in, so the HTML pages are rendered rather than served from
+        # the anonymous page cache
+        client = Client()
+        client.force_login(user)
+
+        ids = ctx["active_listings"][:batch]
+        pairs = [
+            ("feed page", [reverse("auctions:index")], [reverse("auctions:api_listings")]),
+            (f"{batch} listings by id",
+             [reverse("auctions:listing", args=[listing_id]) for listing_id in ids],
+             [reverse("auctions:api_listings") + "?ids=" + ",".join(map(str, ids))]),
+            ("bid history", [reverse("auctions:listing_bids", args=[ctx["hot_listing"]])],
+             [reverse("auctions:api_listing_bids", args=[ctx["hot_listing"]])]),
+            ("categories", [reverse("auctions:categories")], [reverse("auctions:api_categories")]),
+            ("watchlist", [reverse("auctions:watchlist")], [reverse("auctions:api_watchlist")]),
+        ]
+
+        results = []
+        for name, html_urls, api_urls in pairs:
+            html = self.measure(client, html_urls, iterations)
+            api = self.measure(client, api_urls, iterations)
+            results.append({
+                "read": name,
+                "html": html,
+                "api": api,
+                "speedup": round(html["latency_ms"]["p50"] / api["latency_ms"]["p50"], 1),
+            })
+        return results
+
+    def measure(self, client, urls, iterations):
+        latencies, queries, sizes = [], [], []
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                size = 0
+                for url in urls:
+                    response = client.get(url)
+                    # Streamed bodies are read to the end, like a client would
+                    size += len(b"".join(response.streaming_content) if response.streaming else response.content)
+                latencies.append(time.perf_counter() - start)
+            queries.append(len(captured))
+            sizes.append(size)
+        return {
+            "requests": len(urls),
+            "latency_ms": in_ms(percentiles(latencies)),
+            "queries": round(statistics.fmean(queries), 1),
+            "bytes": round(statistics.fmean(sizes)),
+        }
@@ -0,0 +1,101 @@
+import asyncio
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from auctions.models import User
+
+from ._bench import scratch_database, write_results
+from ._datagen import generate_data
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare requests per second for the async read views served through "
+        "the ASGI handler against the same views through the WSGI handler "
+        "with one thread per concurrent client."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, nargs="+", default=[8, 64])
+        parser.add_argument("--requests", type=int, default=2000, help="Requests per run.")
+        parser.add_argument("--output", help="Also write the results to this JSON file.")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                test_name = os.path.join(tmp, "bench.sqlite3") if connection.vendor == "sqlite" else None
+                with scratch_database(test_name):
+                    results = self.run_all(options["concurrency"], options["requests"])
+        finally:
+            teardown_test_environment()
+
+        write_results(self.stdout, results, options["output"])
+
+    def run_all(self, concurrency_levels, requests):
+        ctx = generate_data(users=max(concurrency_levels), listings=2000, bids=20000, comments=5000)
+        urls = [
+            reverse("auctions:index"),
+            reverse("auctions:listing", args=[ctx["hot_listing"]]),
+            reverse("auctions:categories"),
+            reverse("auctions:categories_items", args=[ctx["top_category"]]),
+            reverse("auctions:watchlist"),
+        ]
+        # Signed in, so every request goes past the anonymous page cache to
+        # the database
+        users = list(User.objects.filter(id__in=ctx["users"]))
+
+        results = []
+        for concurrency in concurrency_levels:
+            clients = [Client() for _ in range(concurrency)]
+            for client, user in zip(clients, users):
+                client.force_login(user)
+            wsgi = self.run_wsgi(clients, urls, requests)
+
+            async_clients = [AsyncClient() for _ in range(concurrency)]
+            for client, sync_client in zip(async_clients, clients):
+                client.cookies = sync_client.cookies
+            asgi = asyncio.run(self.run_asgi(async_clients, urls, requests))
+
+            results.append({
+                "concurrency": concurrency,
+                "requests": requests,
+                "wsgi_requests_per_second": wsgi,
+                "asgi_requests_per_second": asgi,
+                "asgi_vs_wsgi": round(asgi / wsgi, 2) if wsgi else None,
+            })
+        return results
+
+    def run_wsgi(self, clients, urls, requests):
+        per_client = requests // len(clients)
+
+        def work(client):
+            try:
+                for i in range(per_client):
+                    client.get(urls[i % len(urls)])
+            finally:
+                connection.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(clients)) as pool:
+            list(pool.map(work, clients))
+        return round(per_client * len(clients) / (time.perf_counter() - start))
+
+    async def run_asgi(self, clients, urls, requests):
+        per_client = requests // len(clients)
+
+        async def work(client):
+            for i in range(per_client):
+                await client.get(urls[i % len(urls)])
+
+        start = time.perf_counter()
+        await asyncio.gather(*[work(client) for client in clients])
+        return round(per_client * len(clients) / (time.perf_counter() - start))
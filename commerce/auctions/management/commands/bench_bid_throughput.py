@@ -0,0 +1,111 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from auctions.bidding import submit_bid
+from auctions.models import User, Listing
+
+from ._bench import scratch_database, write_results
+
+
+SQLITE_CONFIGS = {
+    "sqlite-rollback-journal": {"SQLITE_WAL": "0", "SQLITE_BUSY_TIMEOUT": "5"},
+    "sqlite-wal": {"SQLITE_WAL": "1", "SQLITE_BUSY_TIMEOUT": "20"},
+}
+
+POSTGRES_CONFIGS = {
+    "postgresql-new-connections": {"DATABASE_ENGINE": "postgresql", "DATABASE_CONN_MAX_AGE": "0"},
+    "postgresql-persistent": {"DATABASE_ENGINE": "postgresql", "DATABASE_CONN_MAX_AGE": "60"},
+    "postgresql-pool": {"DATABASE_ENGINE": "postgresql", "DATABASE_POOL": "1"},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare concurrent bid throughput across database configurations. Each "
+        "configuration runs in its own process against a throwaway local database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bids", type=int, default=2000)
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--postgres", action="store_true",
+                            help="Also run the PostgreSQL configurations, using the DATABASE_* "
+                                 "variables (default host: localhost).")
+        parser.add_argument("--output", help="Also write the results to this JSON file.")
+        parser.add_argument("--worker", action="store_true", help="Run a single configuration in this process.")
+
+    def handle(self, *args, **options):
+        if options["worker"]:
+            return self.run_worker(options["bids"], options["threads"])
+
+        configs = dict(SQLITE_CONFIGS)
+        if options["postgres"]:
+            configs.update(POSTGRES_CONFIGS)
+
+        results = []
+        for name, env in configs.items():
+            with tempfile.TemporaryDirectory() as tmp:
+                child_env = {**os.environ, **env}
+                if not env.get("DATABASE_ENGINE"):
+                    child_env["DATABASE_ENGINE"] = "sqlite"
+                    child_env["DATABASE_NAME"] = os.path.join(tmp, "bench.sqlite3")
+                else:
+                    child_env.setdefault("DATABASE_HOST", "localhost")
+
+                completed = subprocess.run(
+                    [sys.executable, sys.argv[0], "bench_bid_throughput", "--worker",
+                     "--bids", str(options["bids"]), "--threads", str(options["threads"])],
+                    env=child_env, capture_output=True, text=True,
+                )
+            if completed.returncode != 0:
+                results.append({"config": name, "error": completed.stderr.strip().splitlines()[-1:]})
+                continue
+            results.append({"config": name, **json.loads(completed.stdout.strip().splitlines()[-1])})
+
+        write_results(self.stdout, results, options["output"])
+
+    def run_worker(self, bids, threads):
+        is_sqlite = connection.vendor == "sqlite"
+        with nullcontext() if is_sqlite else scratch_database():
+            if is_sqlite:
+                call_command("migrate", verbosity=0)
+
+            seller = User.objects.create_user("bench-seller")
+            bidders = [User.objects.create_user(f"bench-bidder-{i}") for i in range(threads)]
+            listing = Listing.objects.create(title="Hot item", description="Benchmark", min_price=1,
+                                             highest_bid=0, listed_by=seller)
+            connection.close()
+
+            def bid(n):
+                try:
+                    return submit_bid(listing.id, bidders[n % threads], 1 + (n * 7919) % bids).status
+                except Exception as error:
+                    return type(error).__name__
+                finally:
+                    if settings.DATABASES["default"].get("CONN_MAX_AGE", 0) == 0:
+                        connection.close()
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                statuses = list(pool.map(bid, range(bids)))
+            elapsed = time.perf_counter() - start
+
+        counts = {status: statuses.count(status) for status in set(statuses)}
+        self.stdout.write(json.dumps({
+            "bids": bids,
+            "threads": threads,
+            "seconds": round(elapsed, 3),
+            "bids_per_second": round(bids / elapsed),
+            "results": counts,
+        }))
@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from auctions.closing import close_expired
+from auctions.models import User, Listing, Category
+
+from ._bench import scratch_database, timed, write_results
+
+
+class Command(BaseCommand):
+    help = "Time the expiry worker closing a large number of expired auctions."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--listings", type=int, default=100000)
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--output", help="Also write the results to this JSON file.")
+
+    def handle(self, *args, **options):
+        size = options["listings"]
+        batch_size = options["batch_size"]
+
+        with scratch_database():
+            seller = User.objects.create_user("bench-seller")
+            bidder = User.objects.create_user("bench-bidder")
+            categories = [f"Category {i}" for i in range(20)]
+            Category.objects.bulk_create([Category(name=name, active_listings=size // 20) for name in categories])
+
+            ended = timezone.now() - timedelta(minutes=1)
+            Listing.objects.bulk_create([
+                Listing(title=f"Listing {i}", description="Benchmark listing", min_price=10,
+                        highest_bid=12 if i % 3 else 0, highest_bid_user=bidder if i % 3 else None,
+                        category=categories[i % 20], listed_by=seller, ends_at=ended)
+                for i in range(size)
+            ], batch_size=1000)
+
+            def drain():
+                batches = 0
+                while close_expired(batch_size=batch_size):
+                    batches += 1
+                return batches
+
+            seconds, batches = timed(drain)
+
+            results = {
+                "listings": size,
+                "batch_size": batch_size,
+                "batches": batches,
+                "seconds": round(seconds, 3),
+                "listings_per_second": round(size / seconds) if seconds else None,
+                "still_open": Listing.objects.filter(is_available=True).count(),
+                "winners_set": Listing.objects.filter(winner=bidder).count(),
+            }
+
+        write_results(self.stdout, results, options["output"])
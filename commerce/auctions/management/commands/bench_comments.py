@@ -0,0 +1,100 @@
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from auctions.comments import comment_buffer
+from auctions.models import User, Comment
+
+from ._bench import in_ms, percentiles, scratch_database, write_results
+from ._datagen import generate_data
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure sustained comment throughput on one hot listing from concurrent "
+        "clients, writing each comment in its request against writing them in "
+        "batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--comments", type=int, default=3000, help="Comments per run.")
+        parser.add_argument("--batch-size", type=int, default=settings.COMMENT_BATCH_SIZE)
+        parser.add_argument("--batch-seconds", type=float, default=settings.COMMENT_BATCH_SECONDS)
+        parser.add_argument("--output", help="Also write the results to this JSON file.")
+
+    def handle(self, *args, **options):
+        runs = {
+            "write-through": {"COMMENT_BATCH_SIZE": 1},
+            "batched": {"COMMENT_BATCH_SIZE": options["batch_size"], "COMMENT_BATCH_SECONDS": options["batch_seconds"]},
+        }
+        setup_test_environment()
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                # A file, so concurrent writers contend for SQLite's write lock
+                # the way they do in a real server
+                test_name = os.path.join(tmp, "bench.sqlite3") if connection.vendor == "sqlite" else None
+                # Unlimited: these measure the views, not the rate limiter
+                with scratch_database(test_name), override_settings(RATE_LIMITS={}):
+                    ctx = generate_data(users=options["threads"], listings=100, bids=1000, comments=0)
+                    results = []
+                    for name, overrides in runs.items():
+                        with override_settings(**overrides):
+                            results.append({"mode": name, **overrides,
+                                            **self.run(ctx, options["threads"], options["comments"])})
+        finally:
+            teardown_test_environment()
+
+        write_results(self.stdout, results, options["output"])
+
+    def run(self, ctx, threads, comments):
+        url = reverse("auctions:add_comment", args=[ctx["hot_listing"]])
+        authors = list(User.objects.filter(id__in=ctx["users"][:threads]))
+        before = Comment.objects.count()
+        counter = iter(range(comments))
+        lock = threading.Lock()
+        latencies = []
+
+        def worker(user):
+            client = Client()
+            client.force_login(user)
+            try:
+                while True:
+                    with lock:
+                        n = next(counter, None)
+                    if n is None:
+                        return
+                    start = time.perf_counter()
+                    client.post(url, {"comment": f"Comment {n} from {user.username}"})
+                    elapsed = time.perf_counter() - start
+                    with lock:
+                        latencies.append(elapsed)
+            finally:
+                connection.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(worker, authors))
+        accepted = time.perf_counter() - start
+        # Throughput counts until the last comment is on disk, not just queued
+        comment_buffer().flush()
+        written = time.perf_counter() - start
+
+        return {
+            "threads": len(authors),
+            "comments": comments,
+            "comments_written": Comment.objects.count() - before,
+            "seconds": round(written, 3),
+            "comments_per_second": round(comments / written) if written else None,
+            "accept_seconds": round(accepted, 3),
+            "latency_ms": in_ms(percentiles(latencies)),
+        }
@@ -0,0 +1,146 @@
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from auctions.models import User, Listing
+
+from ._bench import scratch_database, write_results
+
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream the closed-auction export at growing sizes, under WSGI and through "
+        "the ASGI handler, and report peak Python memory, against loading the "
+        "same rows as model instances."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+        parser.add_argument("--output", help="Also write the results to this JSON file.")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                test_name = os.path.join(tmp, "bench.sqlite3") if connection.vendor == "sqlite" else None
+                with scratch_database(test_name):
+                    results = self.run_all(sorted(options["rows"]))
+        finally:
+            teardown_test_environment()
+
+        write_results(self.stdout, results, options["output"])
+
+    def run_all(self, sizes):
+        staff = User.objects.create_user("bench-staff", is_staff=True)
+        winner = User.objects.create_user("bench-winner")
+        client = Client()
+        client.force_login(staff)
+
+        results = []
+        existing = 0
+        for size in sizes:
+            self.add_closed_listings(staff, winner, existing, size)
+            existing = size
+
+            tracemalloc.start()
+            start = time.perf_counter()
+            response = client.get(reverse("auctions:export_results"), {"seller": "all"})
+            size_bytes = sum(len(chunk) for chunk in response.streaming_content)
+            elapsed = time.perf_counter() - start
+            _, streamed_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            tracemalloc.start()
+            start = time.perf_counter()
+            asgi_bytes = async_to_sync(asgi_get)(reverse("auctions:export_results"), "seller=all",
+                                                 client.cookies[settings.SESSION_COOKIE_NAME].value)
+            asgi_elapsed = time.perf_counter() - start
+            _, asgi_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            assert asgi_bytes == size_bytes, (asgi_bytes, size_bytes)
+
+            tracemalloc.start()
+            loaded = len(list(Listing.objects.filter(is_available=False).select_related('listed_by', 'winner')))
+            _, loaded_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            results.append({
+                "rows": loaded,
+                "export_bytes": size_bytes,
+                "export_seconds": round(elapsed, 3),
+                "rows_per_second": round(loaded / elapsed),
+                "asgi_export_seconds": round(asgi_elapsed, 3),
+                "streamed_peak_mb": round(streamed_peak / 2 ** 20, 1),
+                "asgi_streamed_peak_mb": round(asgi_peak / 2 ** 20, 1),
+                "model_instances_peak_mb": round(loaded_peak / 2 ** 20, 1),
+            })
+        return results
+
+    def add_closed_listings(self, seller, winner, start, end):
+        now = timezone.now()
+        for first in range(start, end, BATCH_SIZE):
+            Listing.objects.bulk_create([
+                Listing(title=f"Closed listing {i}", description="Exported by the benchmark", min_price=1,
+                        category="Bench", listed_by=seller, highest_bid=10 + i % 100,
+                        highest_bid_user=winner, winner=winner, bid_count=1 + i % 20, is_available=False,
+                        closed_at=now - timedelta(seconds=end - i))
+                for i in range(first, min(first + BATCH_SIZE, end))
+            ])
+
+
+async def asgi_get(path, query_string, session_id):
+    """
+    GET `path` through Django's ASGI handler, the way an ASGI server would,
+    and return the size of the body sent. Unlike the test client, the
+    handler applies ASGI's own rules for streaming responses.
+    """
+    sent = 0
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # The client stays connected until the response is done
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal sent
+        if message["type"] == "http.response.body":
+            sent += len(message.get("body", b""))
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": query_string.encode(), "root_path": "",
+        "headers": [(b"host", b"testserver"), (b"cookie", f"{settings.SESSION_COOKIE_NAME}={session_id}".encode())],
+        "server": ("testserver", 80), "client": ("127.0.0.1", 0),
+    }
+    # As the test client does, so the handler doesn't close the scratch
+    # database's connection at the end of the request
+    request_started.disconnect(close_old_connections)
+    request_finished.disconnect(close_old_connections)
+    try:
+        await get_asgi_application()(scope, receive, send)
+    finally:
+        request_started.connect(close_old_connections)
+        request_finished.connect(close_old_connections)
+    return sent
@@ -0,0 +1,46 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+
+from auctions.fragments import CARD_TEMPLATE, card_stats, render_listing_cards
+from auctions.models import User, Listing
+
+from ._bench import scratch_database, timed, write_results
+
+
+class Command(BaseCommand):
+    help = "Compare listing card render time with and without the fragment cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000])
+        parser.add_argument("--output", help="Also write the results to this JSON file.")
+
+    def handle(self, *args, **options):
+        results = []
+        with scratch_database():
+            seller = User.objects.create_user("bench-seller")
+            for size in options["sizes"]:
+                Listing.objects.all().delete()
+                Listing.objects.bulk_create([
+                    Listing(title=f"Listing {i}", description="Benchmark listing " * 10,
+                            min_price=10, highest_bid=0, listed_by=seller)
+                    for i in range(size)
+                ], batch_size=1000)
+                listings = list(Listing.objects.all())
+
+                cache.clear()
+                card_stats.reset()
+                uncached, _ = timed(lambda: [render_to_string(CARD_TEMPLATE, {"listing": l}) for l in listings])
+                cold, _ = timed(render_listing_cards, listings)
+                warm, _ = timed(render_listing_cards, listings)
+
+                results.append({
+                    "listings": size,
+                    "uncached_seconds": round(uncached, 4),
+                    "cold_cache_seconds": round(cold, 4),
+                    "warm_cache_seconds": round(warm, 4),
+                    "speedup": round(uncached / warm, 1) if warm else None,
+                    **card_stats.snapshot(),
+                })
+
+        write_results(self.stdout, results, options["output"])
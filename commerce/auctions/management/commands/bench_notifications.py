@@ -0,0 +1,70 @@
+from django.core import mail
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from auctions.bidding import submit_bid
+from auctions.models import User, Listing, Notification
+from auctions.notifications import deliver_pending
+
+from ._bench import scratch_database, timed, write_results
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a bidding war through the notification outbox and time how fast "
+        "the worker turns it into digests, using the in-memory email backend."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bids", type=int, default=20000)
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--listings", type=int, default=50)
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--output", help="Also write the results to this JSON file.")
+
+    def handle(self, *args, **options):
+        bids, users, listings = options["bids"], options["users"], options["listings"]
+
+        with scratch_database(), override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend"):
+            seller = User.objects.create_user("bench-seller")
+            bidders = User.objects.bulk_create([
+                User(username=f"bench-bidder-{i}", email=f"bidder{i}@example.com") for i in range(users)
+            ])
+            lots = Listing.objects.bulk_create([
+                Listing(title=f"Listing {i}", description="Benchmark listing", min_price=1,
+                        highest_bid=0, listed_by=seller)
+                for i in range(listings)
+            ])
+
+            # Every bid tops the last one on its listing and comes from a
+            # different user, so each one after the first queues a notice
+            def bidding_war():
+                for n in range(bids):
+                    submit_bid(lots[n % listings].id, bidders[n % users], 1 + n // listings)
+
+            bid_seconds, _ = timed(bidding_war)
+            queued = Notification.objects.count()
+
+            def drain():
+                batches = 0
+                while deliver_pending(options["batch_size"])[0]:
+                    batches += 1
+                return batches
+
+            mail.outbox = []
+            deliver_seconds, batches = timed(drain)
+
+            results = {
+                "bids": bids,
+                "users": users,
+                "listings": listings,
+                "batch_size": options["batch_size"],
+                "bids_per_second": round(bids / bid_seconds) if bid_seconds else None,
+                "notifications": queued,
+                "emails": len(mail.outbox),
+                "batches": batches,
+                "deliver_seconds": round(deliver_seconds, 3),
+                "notifications_per_second": round(queued / deliver_seconds) if deliver_seconds else None,
+            }
+
+        write_results(self.stdout, results, options["output"])
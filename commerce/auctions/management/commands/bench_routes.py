@@ -0,0 +1,276 @@
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import django
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from auctions.models import User, Listing, Bid
+from auctions.urls import urlpatterns
+
+from ._bench import in_ms, percentiles, scratch_database, write_results
+from ._datagen import generate_data
+
+
+METRICS_TOKEN = "bench-metrics"
+
+SERVER_TIMING_DB = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+# Routes that can't be timed request by request, and why
+SKIPPED = {
+    "listing_events": "server-sent event stream, stays open",
+    "thumbnail": "serves files written by process_images, which fetches from the network",
+}
+
+
+class Scenario:
+    def __init__(self, route, method="get", user=False, kwargs=None, data=None, query=None, label=None, headers=None):
+        self.route = route
+        self.label = label
+        self.method = method
+        self.user = user
+        self.kwargs = kwargs or (lambda ctx, i: {})
+        self.data = data or (lambda ctx, i: {})
+        self.query = query or {}
+        self.headers = headers or {}
+
+    @property
+    def name(self):
+        name = f"{self.route} {self.method.upper()} {'user' if self.user else 'anonymous'}"
+        return f"{name} ({self.label})" if self.label else name
+
+
+def listing(ctx, i):
+    return {"listing_id": ctx["hot_listing"]}
+
+
+def other_listing(ctx, i):
+    return {"listing_id": ctx["active_listings"][i % len(ctx["active_listings"])]}
+
+
+SCENARIOS = [
+    Scenario("index"),
+    Scenario("index", user=True),
+    Scenario("login"),
+    Scenario("login", method="post", data=lambda ctx, i: {"username": "bench-user", "password": "bench-password"}),
+    Scenario("logout"),
+    Scenario("register"),
+    Scenario("listing", kwargs=listing),
+    Scenario("listing", user=True, kwargs=listing),
+    Scenario("listing_bids", kwargs=listing),
+    Scenario("my_bids", user=True),
+    Scenario("new_listing", user=True),
+    Scenario("new_listing", method="post", user=True, data=lambda ctx, i: {
+        "title": f"Bench listing {i}", "description": "Created by the benchmark", "min_price": "10",
+        "image_url": "", "category": ctx["top_category"], "ends_at": "",
+    }),
+    Scenario("add_to_watchlist", method="post", user=True, kwargs=other_listing),
+    Scenario("remove_from_watchlist", method="post", user=True, kwargs=other_listing),
+    Scenario("place_bid", method="post", user=True, kwargs=listing,
+             data=lambda ctx, i: {"bid_value": str(ctx["bid_base"] + i)}),
+    Scenario("close_auction", method="post", user=True, kwargs=lambda ctx, i: {"listing_id": ctx["own_listings"][i]}),
+    Scenario("add_comment", method="post", user=True, kwargs=listing, data=lambda ctx, i: {"comment": f"Comment {i}"}),
+    Scenario("watchlist", user=True),
+    Scenario("export_results", user=True),
+    Scenario("search", query={"q": "vintage lamp"}),
+    Scenario("categories"),
+    Scenario("categories_items", kwargs=lambda ctx, i: {"category_name": ctx["top_category"]}),
+    Scenario("metrics", headers={"Authorization": f"Bearer {METRICS_TOKEN}"}),
+    Scenario("api_listings"),
+    Scenario("api_listings", label="50 ids",
+             query={"ids": ",".join(map(str, range(1, 51))), "fields": "id,title,highest_bid"}),
+    Scenario("api_listing_bids", kwargs=listing),
+    Scenario("api_categories"),
+    Scenario("api_watchlist", user=True),
+]
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every route through the test client against generated data "
+        "(latency percentiles and query counts), then load place_bid from "
+        "concurrent clients. Results are JSON, so runs can be compared."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=500)
+        parser.add_argument("--listings", type=int, default=2000)
+        parser.add_argument("--bids", type=int, default=20000)
+        parser.add_argument("--comments", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--iterations", type=int, default=50, help="Requests per route.")
+        parser.add_argument("--threads", type=int, default=8, help="Concurrent clients in the place_bid load.")
+        parser.add_argument("--load-requests", type=int, default=1000, help="Bids in the place_bid load.")
+        parser.add_argument("--output", help="Also write the results to this JSON file.")
+        parser.add_argument("--compare", help="An earlier results file to report p50 changes against.")
+
+    def handle(self, *args, **options):
+        # What the test runner sets up for the test client: the testserver
+        # host is allowed and email goes to memory
+        setup_test_environment()
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                # A file rather than SQLite's shared in-memory database, so the
+                # concurrent load sees the same WAL locking a real server does
+                test_name = os.path.join(tmp, "bench.sqlite3") if connection.vendor == "sqlite" else None
+                # Unlimited: these measure the views, not the rate limiter
+                with scratch_database(test_name), override_settings(RATE_LIMITS={}, METRICS_TOKEN=METRICS_TOKEN):
+                    ctx = self.prepare(options)
+                    routes = self.bench_routes(ctx, options["iterations"])
+                    load = self.bench_place_bid_load(ctx, options["threads"], options["load_requests"])
+        finally:
+            teardown_test_environment()
+
+        results = {
+            "meta": {
+                "timestamp": timezone.now().isoformat(),
+                "git_revision": git_revision(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+                "data": {key: options[key] for key in ("users", "listings", "bids", "comments", "seed")},
+                "iterations": options["iterations"],
+            },
+            "routes": routes,
+            "skipped": SKIPPED,
+            "place_bid_load": load,
+        }
+        if options["compare"]:
+            results["compare"] = self.compare(routes, options["compare"])
+
+        write_results(self.stdout, results, options["output"])
+
+    def prepare(self, options):
+        ctx = generate_data(options["users"], options["listings"], options["bids"], options["comments"],
+                            seed=options["seed"])
+        user = User.objects.create_user("bench-user", "bench@example.com", "bench-password")
+        ctx["user"] = user
+        ctx["own_listings"] = [
+            listing.id for listing in Listing.objects.bulk_create([
+                Listing(title=f"Own listing {i}", description="Closed by the benchmark", min_price=1,
+                        highest_bid=0, listed_by=user)
+                for i in range(options["iterations"])
+            ])
+        ]
+        hot = Listing.objects.get(id=ctx["hot_listing"])
+        ctx["bid_base"] = int(max(hot.highest_bid, hot.min_price)) + 1
+        return ctx
+
+    def bench_routes(self, ctx, iterations):
+        covered = {scenario.route for scenario in SCENARIOS} | set(SKIPPED)
+        missing = [pattern.name for pattern in urlpatterns if pattern.name not in covered]
+        if missing:
+            self.stderr.write(f"No benchmark scenario for: {', '.join(missing)}")
+
+        results = []
+        for scenario in SCENARIOS:
+            cache.clear()
+            client = Client(headers=scenario.headers)
+            if scenario.user:
+                client.force_login(ctx["user"])
+
+            latencies, queries, db_times, statuses = [], [], [], {}
+            for i in range(iterations):
+                url = reverse(f"auctions:{scenario.route}", kwargs=scenario.kwargs(ctx, i))
+                send = getattr(client, scenario.method)
+                payload = scenario.data(ctx, i) if scenario.method == "post" else scenario.query
+
+                start = time.perf_counter()
+                response = send(url, payload)
+                latencies.append(time.perf_counter() - start)
+
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                timing = SERVER_TIMING_DB.search(response.get("Server-Timing", ""))
+                if timing:
+                    db_times.append(float(timing.group(1)) / 1000)
+                    queries.append(int(timing.group(2)))
+
+            results.append({
+                "name": scenario.name,
+                "route": scenario.route,
+                "requests": iterations,
+                "statuses": statuses,
+                "latency_ms": in_ms({"mean": statistics.fmean(latencies), **percentiles(latencies)}),
+                "db_ms": in_ms(percentiles(db_times)),
+                "queries": {"mean": round(statistics.fmean(queries), 2), "max": max(queries)} if queries else None,
+            })
+        return results
+
+    def bench_place_bid_load(self, ctx, threads, requests):
+        bidders = list(User.objects.filter(id__in=ctx["users"][:threads]))
+        hot = ctx["active_listings"][:10]
+        bids_before = Bid.objects.count()
+        counter = iter(range(requests))
+        lock = threading.Lock()
+        latencies, statuses = [], {}
+
+        def worker(user):
+            client = Client()
+            client.force_login(user)
+            rng = random.Random(user.id)
+            try:
+                while True:
+                    with lock:
+                        n = next(counter, None)
+                    if n is None:
+                        return
+                    # Bids mostly climb, with enough jitter that some lose
+                    amount = Decimal(ctx["bid_base"] + n) + Decimal(rng.randint(-500, 500)) / 100
+                    url = reverse("auctions:place_bid", kwargs={"listing_id": rng.choice(hot)})
+                    start = time.perf_counter()
+                    response = client.post(url, {"bid_value": str(amount)})
+                    elapsed = time.perf_counter() - start
+                    with lock:
+                        latencies.append(elapsed)
+                        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            finally:
+                connection.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(worker, bidders))
+        elapsed = time.perf_counter() - start
+
+        return {
+            "threads": len(bidders),
+            "requests": requests,
+            "seconds": round(elapsed, 3),
+            "requests_per_second": round(requests / elapsed) if elapsed else None,
+            "latency_ms": in_ms(percentiles(latencies)),
+            "statuses": statuses,
+            "bids_accepted": Bid.objects.count() - bids_before,
+        }
+
+    def compare(self, routes, path):
+        with open(path) as f:
+            baseline = {route["name"]: route for route in json.load(f)["routes"]}
+        changes = {}
+        for route in routes:
+            before = baseline.get(route["name"])
+            if before and before["latency_ms"].get("p50"):
+                changes[route["name"]] = {
+                    "p50_ms_before": before["latency_ms"]["p50"],
+                    "p50_ms_after": route["latency_ms"]["p50"],
+                    "ratio": round(route["latency_ms"]["p50"] / before["latency_ms"]["p50"], 2),
+                }
+        return changes
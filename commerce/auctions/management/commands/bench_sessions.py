@@ -0,0 +1,124 @@
+import os
+import statistics
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from auctions.models import User
+
+from ._bench import in_ms, percentiles, scratch_database, write_results
+from ._datagen import generate_data
+
+
+SESSION_CONFIGS = {
+    "db sessions, uncached users": {
+        "SESSION_ENGINE": "django.contrib.sessions.backends.db",
+        "AUTHENTICATION_BACKENDS": ["django.contrib.auth.backends.ModelBackend"],
+    },
+    "cached_db sessions, cached users": {
+        "SESSION_ENGINE": "django.contrib.sessions.backends.cached_db",
+        "AUTHENTICATION_BACKENDS": ["auctions.auth.CachedModelBackend"],
+    },
+}
+
+HASHER_CONFIGS = {
+    "default hashers": {"PASSWORD_HASHERS": ["django.contrib.auth.hashers.PBKDF2PasswordHasher"]},
+    "fast hashers": {"PASSWORD_HASHERS": settings.FAST_PASSWORD_HASHERS},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure what sessions and authentication cost a signed-in request, "
+        "with database sessions against cached sessions and users, and what "
+        "password hashing costs register and login."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=200)
+        parser.add_argument("--output", help="Also write the results to this JSON file.")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                test_name = os.path.join(tmp, "bench.sqlite3") if connection.vendor == "sqlite" else None
+                with scratch_database(test_name):
+                    ctx = generate_data(users=100, listings=500, bids=5000, comments=1000)
+                    results = {
+                        "signed_in_requests": self.bench_requests(ctx, options["iterations"]),
+                        "password_hashing": self.bench_hashing(max(options["iterations"] // 10, 5)),
+                    }
+        finally:
+            teardown_test_environment()
+
+        write_results(self.stdout, results, options["output"])
+
+    def bench_requests(self, ctx, iterations):
+        user = User.objects.get(id=ctx["users"][0])
+        urls = {
+            "index": reverse("auctions:index"),
+            "my_bids": reverse("auctions:my_bids"),
+            "metrics": reverse("auctions:metrics"),
+        }
+
+        results = []
+        for name, overrides in SESSION_CONFIGS.items():
+            with override_settings(**overrides, METRICS_TOKEN="bench-metrics"):
+                cache.clear()
+                client = Client(headers={"Authorization": "Bearer bench-metrics"})
+                client.force_login(user)
+                for url in urls.values():
+                    client.get(url)
+
+                for route, url in urls.items():
+                    latencies, queries = [], []
+                    for _ in range(iterations):
+                        with CaptureQueriesContext(connection) as captured:
+                            start = time.perf_counter()
+                            client.get(url)
+                            latencies.append(time.perf_counter() - start)
+                        queries.append(sum(
+                            query["sql"].startswith(('SELECT "django_session"', 'SELECT "auctions_user"'))
+                            for query in captured
+                        ))
+                    results.append({
+                        "config": name,
+                        "route": route,
+                        "latency_ms": in_ms(percentiles(latencies)),
+                        "session_and_user_queries": statistics.fmean(queries),
+                    })
+        return results
+
+    def bench_hashing(self, iterations):
+        results = []
+        for name, overrides in HASHER_CONFIGS.items():
+            with override_settings(**overrides):
+                register, login = [], []
+                for i in range(iterations):
+                    username = f"bench-{name.split()[0]}-{i}"
+                    client = Client()
+                    start = time.perf_counter()
+                    client.post(reverse("auctions:register"), {
+                        "username": username, "email": f"{username}@example.com",
+                        "password": "bench-password", "confirmation": "bench-password",
+                    })
+                    register.append(time.perf_counter() - start)
+
+                    client = Client()
+                    start = time.perf_counter()
+                    client.post(reverse("auctions:login"), {"username": username, "password": "bench-password"})
+                    login.append(time.perf_counter() - start)
+                results.append({
+                    "config": name,
+                    "register_ms": in_ms(percentiles(register)),
+                    "login_ms": in_ms(percentiles(login)),
+                })
+        return results
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from auctions.closing import close_expired
+
+
+class Command(BaseCommand):
+    help = "Close auctions whose ends_at has passed, in batches. Safe to run as several workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--loop", action="store_true", help="Keep polling instead of exiting once nothing is left.")
+        parser.add_argument("--interval", type=float, default=30, help="Seconds to sleep between polls with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            total = 0
+            while True:
+                closed = close_expired(timezone.now(), options["batch_size"])
+                total += len(closed)
+                if len(closed) < options["batch_size"]:
+                    break
+
+            if total or options["verbosity"] > 1:
+                self.stdout.write(f"Closed {total} expired auctions.")
+
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
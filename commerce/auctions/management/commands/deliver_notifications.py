@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from auctions.notifications import deliver_pending
+
+
+class Command(BaseCommand):
+    help = "Email pending outbid and auction-won notifications as one digest per user. Safe to run as several workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100, help="Users per batch.")
+        parser.add_argument("--loop", action="store_true", help="Keep polling instead of exiting once nothing is left.")
+        parser.add_argument("--interval", type=float, default=10, help="Seconds to sleep between polls with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            delivered = emails = 0
+            while True:
+                notifications, sent = deliver_pending(options["batch_size"])
+                delivered += notifications
+                emails += sent
+                if not notifications:
+                    break
+
+            if delivered or options["verbosity"] > 1:
+                self.stdout.write(f"Delivered {delivered} notifications in {emails} emails.")
+
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,74 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from auctions.models import Listing, Bid
+
+from ._listing_rows import RowWriter, detect_format
+
+
+def isoformat(value):
+    return value.isoformat() if value else None
+
+
+class Command(BaseCommand):
+    help = "Stream every listing and its bids to a CSV or JSONL file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Output file, or - for stdout.")
+        parser.add_argument("--format", choices=["csv", "jsonl"])
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = detect_format(path, options["format"])
+        chunk_size = options["chunk_size"]
+
+        # Listings and bids are both read in listing id order and merged as
+        # they stream past, so neither table is ever held in memory
+        listings = Listing.objects.order_by("id").values(
+            "id", "title", "description", "min_price", "image_url", "category",
+            "listed_by__username", "created_at", "is_available", "ends_at",
+            "highest_bid", "highest_bid_user__username",
+        ).iterator(chunk_size=chunk_size)
+        bids = Bid.objects.order_by("product_id", "id").values_list(
+            "product_id", "user_bid__username", "bid_value", "submited_at"
+        ).iterator(chunk_size=chunk_size)
+        next_bid = next(bids, None)
+
+        output = sys.stdout if path == "-" else open(path, "w", newline="")
+        start = time.perf_counter()
+        count = 0
+        try:
+            writer = RowWriter(output, fmt)
+            for listing in listings:
+                while next_bid is not None and next_bid[0] < listing["id"]:
+                    next_bid = next(bids, None)
+                listing_bids = []
+                while next_bid is not None and next_bid[0] == listing["id"]:
+                    _, user, value, submited_at = next_bid
+                    listing_bids.append({"user": user, "value": value, "submited_at": isoformat(submited_at)})
+                    next_bid = next(bids, None)
+
+                writer.write({
+                    "title": listing["title"],
+                    "description": listing["description"],
+                    "min_price": listing["min_price"],
+                    "image_url": listing["image_url"],
+                    "category": listing["category"],
+                    "listed_by": listing["listed_by__username"],
+                    "created_at": isoformat(listing["created_at"]),
+                    "is_available": listing["is_available"],
+                    "ends_at": isoformat(listing["ends_at"]),
+                    "highest_bid": listing["highest_bid"],
+                    "highest_bid_user": listing["highest_bid_user__username"],
+                    "bids": listing_bids,
+                })
+                count += 1
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        elapsed = time.perf_counter() - start
+        self.stderr.write(f"Exported {count} listings in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.0f} rows/s).")
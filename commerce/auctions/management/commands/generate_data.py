@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from ._datagen import generate_data
+
+
+class Command(BaseCommand):
+    help = "Fill the database with skewed fake users, listings, bids, comments and watches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--listings", type=int, default=5000)
+        parser.add_argument("--bids", type=int, default=50000)
+        parser.add_argument("--comments", type=int, default=10000)
+        parser.add_argument("--watches", type=int, help="Defaults to one per listing.")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        generate_data(options["users"], options["listings"], options["bids"], options["comments"],
+                      options["watches"], options["seed"])
+        self.stdout.write(
+            f"Generated {options['users']} users, {options['listings']} listings, "
+            f"{options['bids']} bids and {options['comments']} comments."
+        )
@@ -0,0 +1,203 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from auctions.catalog import listings_opened
+from auctions.models import User, Listing, Bid
+from auctions.pagecache import FEED_SCOPE, invalidate_pages
+from auctions.search import get_search_backend
+
+from ._listing_rows import detect_format, read_rows
+
+
+class UserCache:
+    """
+    Bounded username -> id map. Misses for a whole batch are resolved with
+    one query, and users that don't exist yet are created without a usable
+    password.
+    """
+
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self.ids = OrderedDict()
+
+    def resolve(self, usernames):
+        missing = {name for name in usernames if name and name not in self.ids}
+        if missing:
+            found = dict(User.objects.filter(username__in=missing).values_list("username", "id"))
+            new = missing - found.keys()
+            if new:
+                User.objects.bulk_create(
+                    [User(username=name, password=make_password(None)) for name in new],
+                    ignore_conflicts=True,
+                )
+                found.update(User.objects.filter(username__in=new).values_list("username", "id"))
+            self.ids.update(found)
+
+        resolved = {}
+        for name in usernames:
+            if name:
+                self.ids.move_to_end(name)
+                resolved[name] = self.ids[name]
+        while len(self.ids) > self.max_size:
+            self.ids.popitem(last=False)
+        return resolved
+
+
+@contextmanager
+def carried_over_timestamps():
+    """
+    auto_now_add would stamp every imported row with the import time, so it
+    is switched off on the two timestamp fields while the import runs and
+    the values from the file are inserted as they are.
+    """
+    fields = [Listing._meta.get_field("created_at"), Bid._meta.get_field("submited_at")]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def parse_bool(value, default=True):
+    if value in (None, ""):
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes")
+
+
+def parse_money(value):
+    # str() first so a JSON float like 10.1 becomes 10.10, not the binary
+    # expansion of 10.1
+    try:
+        return Decimal(str(value)).quantize(Decimal("0.01"))
+    except InvalidOperation:
+        raise CommandError(f"Not an amount of money: {value!r}")
+
+
+def parse_when(value, default=None):
+    return parse_datetime(value) if value else default
+
+
+class Command(BaseCommand):
+    help = "Bulk load listings and their bids from a CSV or JSONL file, resumably."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "jsonl"])
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--checkpoint", help="Checkpoint file, defaults to <path>.checkpoint.")
+        parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint.")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = detect_format(path, options["format"])
+        batch_size = options["batch_size"]
+        checkpoint = options["checkpoint"] or f"{path}.checkpoint"
+
+        done = 0 if options["restart"] else self.read_checkpoint(checkpoint, path)
+        if done:
+            self.stderr.write(f"Resuming after row {done}.")
+
+        users = UserCache()
+        start = time.perf_counter()
+        imported = 0
+
+        with open(path, newline="") as source, carried_over_timestamps():
+            rows = islice(read_rows(source, fmt), done, None)
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+
+                with transaction.atomic():
+                    self.import_batch(batch, users)
+                done += len(batch)
+                imported += len(batch)
+                self.write_checkpoint(checkpoint, path, done)
+
+                elapsed = time.perf_counter() - start
+                if options["verbosity"] > 1:
+                    self.stderr.write(f"{done} rows ({imported / elapsed:.0f} rows/s)")
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"Imported {imported} listings in {elapsed:.1f}s "
+            f"({imported / elapsed if elapsed else 0:.0f} rows/s)."
+        )
+
+    def import_batch(self, batch, users):
+        now = timezone.now()
+        usernames = set()
+        for row in batch:
+            usernames.update([row.get("listed_by"), row.get("highest_bid_user")])
+            usernames.update(bid.get("user") for bid in row.get("bids") or [])
+        user_ids = users.resolve(usernames)
+
+        listings = []
+        for row in batch:
+            if not row.get("listed_by"):
+                raise CommandError(f"Row without listed_by: {row!r}")
+            is_available = parse_bool(row.get("is_available"))
+            highest_bid_user_id = user_ids.get(row.get("highest_bid_user"))
+            bid_times = [parse_when(bid.get("submited_at"), now) for bid in row.get("bids") or []]
+            listings.append(Listing(
+                title=row["title"],
+                description=row["description"],
+                min_price=parse_money(row["min_price"]),
+                image_url=row.get("image_url") or "",
+                category=row.get("category") or "",
+                listed_by_id=user_ids[row["listed_by"]],
+                is_available=is_available,
+                created_at=parse_when(row.get("created_at"), now),
+                ends_at=parse_when(row.get("ends_at")),
+                highest_bid=parse_money(row.get("highest_bid") or 0),
+                highest_bid_user_id=highest_bid_user_id,
+                bid_count=len(bid_times),
+                last_bid_at=max(bid_times, default=None),
+                winner_id=None if is_available else highest_bid_user_id,
+            ))
+        Listing.objects.bulk_create(listings)
+
+        bids = []
+        for listing, row in zip(listings, batch):
+            for bid in row.get("bids") or []:
+                bids.append(Bid(product_id=listing.id, bid_value=parse_money(bid["value"]),
+                                user_bid_id=user_ids[bid["user"]],
+                                submited_at=parse_when(bid.get("submited_at"), now)))
+        Bid.objects.bulk_create(bids)
+
+        active = [listing for listing in listings if listing.is_available]
+        listings_opened(listing.category for listing in active)
+        get_search_backend().index_listings(active)
+        invalidate_pages(FEED_SCOPE)
+
+    def read_checkpoint(self, checkpoint, path):
+        if not os.path.exists(checkpoint):
+            return 0
+        with open(checkpoint) as f:
+            state = json.load(f)
+        if state.get("source") != os.path.abspath(path):
+            raise CommandError(f"{checkpoint} belongs to {state.get('source')}; use --restart or --checkpoint.")
+        return state["rows"]
+
+    def write_checkpoint(self, checkpoint, path, rows):
+        # Written after each batch commits and swapped in atomically, so a
+        # crash at worst imports the last committed batch a second time
+        temp = f"{checkpoint}.tmp"
+        with open(temp, "w") as f:
+            json.dump({"source": os.path.abspath(path), "rows": rows}, f)
+        os.replace(temp, checkpoint)
@@ -0,0 +1,31 @@
+import json
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions.reports import CHUNK_SIZE, PERCENTILES, price_statistics
+
+
+class Command(BaseCommand):
+    help = "Per-category listing price and bid increment statistics. Needs NumPy."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        try:
+            report = price_statistics(options["chunk_size"])
+        except ImproperlyConfigured as error:
+            raise CommandError(error)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        columns = ["count", "min", *[f"p{p}" for p in PERCENTILES], "max", "mean"]
+        self.stdout.write("\t".join(["category", "measure", *columns]))
+        for category, measures in report.items():
+            for measure, summary in measures.items():
+                if summary is not None:
+                    self.stdout.write("\t".join([category or "-", measure, *[str(summary[c]) for c in columns]]))
@@ -0,0 +1,35 @@
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions.images import process_pending_images
+
+
+class Command(BaseCommand):
+    help = "Fetch listing images and write their thumbnails. Needs Pillow. Safe to run as several workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=20)
+        parser.add_argument("--loop", action="store_true", help="Keep polling instead of exiting once nothing is left.")
+        parser.add_argument("--interval", type=float, default=5, help="Seconds to sleep between polls with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            total = succeeded = 0
+            while True:
+                try:
+                    attempted, done = process_pending_images(options["batch_size"])
+                except ImproperlyConfigured as error:
+                    raise CommandError(error)
+                total += attempted
+                succeeded += done
+                if not attempted:
+                    break
+
+            if total or options["verbosity"] > 1:
+                self.stdout.write(f"Made thumbnails for {succeeded} of {total} listing images.")
+
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
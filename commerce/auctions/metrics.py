@@ -0,0 +1,163 @@
+import bisect
+import contextvars
+import hmac
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates, Template
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Anything else is counted as "other", so clients can't mint label values
+HTTP_METHODS = frozenset(["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"])
+
+
+class Histogram:
+    """
+    A labelled Prometheus histogram kept in process memory. Each worker
+    process exposes its own, the way prometheus_client does without
+    multiprocess mode.
+    """
+
+    def __init__(self, name, documentation, labels, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            counts, total = self._series.get(label_values, ([0] * (len(self.buckets) + 1), 0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._series[label_values] = (counts, total + value)
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, list(counts), total) for labels, (counts, total) in self._series.items())
+        for label_values, counts, total in series:
+            labels = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip([*self.buckets, "+Inf"], counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return "\n".join(lines)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+request_duration = Histogram(
+    "auctions_request_duration_seconds", "Time spent handling a request, by view.", ("view", "method"),
+)
+db_queries = Histogram(
+    "auctions_request_db_queries", "Database queries made per request, by view.", ("view",), QUERY_COUNT_BUCKETS,
+)
+db_duration = Histogram(
+    "auctions_request_db_duration_seconds", "Time spent in database queries per request, by view.", ("view",),
+)
+template_duration = Histogram(
+    "auctions_request_template_duration_seconds", "Time spent rendering templates per request, by view.", ("view",),
+)
+
+REGISTRY = [request_duration, db_queries, db_duration, template_duration]
+
+
+def method_label(method):
+    return method if method in HTTP_METHODS else "other"
+
+
+def may_read_metrics(request):
+    token = settings.METRICS_TOKEN
+    if token and hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return True
+    return request.user.is_staff
+
+
+def expose_metrics():
+    return "\n".join(histogram.expose() for histogram in REGISTRY) + "\n"
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.rendering = 0
+
+
+# The stats of the request being handled. A context variable rather than a
+# thread local, so ORM calls an async view makes through sync_to_async are
+# counted against the request too.
+current_stats = contextvars.ContextVar("auctions_request_stats", default=None)
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - start
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+connection_created.connect(install_query_recorder)
+
+
+@contextmanager
+def _rendering():
+    stats = current_stats.get()
+    if stats is None:
+        yield
+        return
+    # Only the outermost render is timed; cards rendered from inside a page
+    # are already part of the page's time
+    stats.rendering += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.rendering -= 1
+        if not stats.rendering:
+            stats.template_seconds += time.perf_counter() - start
+
+
+class InstrumentedTemplate(Template):
+    def render(self, context=None, request=None):
+        with _rendering():
+            return super().render(context, request)
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """
+    The Django template backend, timing renders for the metrics middleware.
+    """
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return InstrumentedTemplate(template.template, self)
@@ -0,0 +1,77 @@
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .metrics import (
+    RequestStats, current_stats, db_duration, db_queries, method_label, request_duration, template_duration,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+class InstrumentationMiddleware:
+    """
+    Record latency, database queries and template render time for every
+    request, as histograms labelled by view for /metrics and as a
+    Server-Timing header on the response.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token, start = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        return self.finish(request, response, stats, start)
+
+    async def __acall__(self, request):
+        stats, token, start = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        return self.finish(request, response, stats, start)
+
+    def start(self):
+        stats = RequestStats()
+        return stats, current_stats.set(stats), time.perf_counter()
+
+    def finish(self, request, response, stats, start):
+        elapsed = time.perf_counter() - start
+        match = request.resolver_match
+        view = match.view_name if match else "unmatched"
+
+        request_duration.observe(elapsed, view, method_label(request.method))
+        db_queries.observe(stats.queries, view)
+        db_duration.observe(stats.db_seconds, view)
+        template_duration.observe(stats.template_seconds, view)
+
+        response["Server-Timing"] = ", ".join([
+            f"app;dur={elapsed * 1000:.1f}",
+            f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries"',
+            f"tpl;dur={stats.template_seconds * 1000:.1f}",
+        ])
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("request", extra={
+                "view": view,
+                "method": request.method,
+                "status": response.status_code,
+                "duration_ms": round(elapsed * 1000, 1),
+                "db_queries": stats.queries,
+                "db_ms": round(stats.db_seconds * 1000, 1),
+                "template_ms": round(stats.template_seconds * 1000, 1),
+            })
+        return response
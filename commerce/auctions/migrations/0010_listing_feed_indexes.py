@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0009_listing_highest_bid_user'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['is_available', '-created_at', '-id'], name='listing_active_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['category', 'is_available', '-created_at', '-id'], name='listing_category_feed_idx'),
+        ),
+    ]
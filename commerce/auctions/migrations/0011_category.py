@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0010_listing_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True)),
+                ('active_listings', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations
+from django.db.models import Count, Q
+
+
+def backfill_categories(apps, schema_editor):
+    Listing = apps.get_model('auctions', 'Listing')
+    Category = apps.get_model('auctions', 'Category')
+
+    counts = (
+        Listing.objects.exclude(category='')
+        .values('category')
+        .annotate(active=Count('id', filter=Q(is_available=True)))
+        .order_by()
+    )
+    Category.objects.bulk_create(
+        [Category(name=row['category'], active_listings=row['active']) for row in counts],
+        batch_size=500,
+    )
+
+
+def remove_categories(apps, schema_editor):
+    Category = apps.get_model('auctions', 'Category')
+    Category.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0011_category'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_categories, remove_categories),
+    ]
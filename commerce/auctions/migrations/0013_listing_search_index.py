@@ -0,0 +1,26 @@
+from django.db import migrations
+
+from auctions.search import BACKENDS
+
+
+def create_search_index(apps, schema_editor):
+    backend = BACKENDS.get(schema_editor.connection.vendor)
+    if backend is not None:
+        backend().create_index(schema_editor)
+
+
+def drop_search_index(apps, schema_editor):
+    backend = BACKENDS.get(schema_editor.connection.vendor)
+    if backend is not None:
+        backend().drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0012_backfill_categories'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0013_listing_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
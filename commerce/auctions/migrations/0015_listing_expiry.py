@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_winners(apps, schema_editor):
+    Listing = apps.get_model('auctions', 'Listing')
+    Listing.objects.filter(is_available=False).update(winner=models.F('highest_bid_user'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0014_listing_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='closed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='ends_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='winner',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='won_listings', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('is_available', True)), fields=['ends_at'], name='listing_open_ends_at_idx'),
+        ),
+        migrations.RunPython(backfill_winners, migrations.RunPython.noop),
+    ]
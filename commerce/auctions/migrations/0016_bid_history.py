@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:38
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_bid_summaries(apps, schema_editor):
+    Listing = apps.get_model('auctions', 'Listing')
+    Bid = apps.get_model('auctions', 'Bid')
+
+    bids = Bid.objects.filter(product=OuterRef('pk')).order_by().values('product')
+    Listing.objects.update(
+        bid_count=Coalesce(Subquery(bids.annotate(count=Count('id')).values('count')), 0),
+        last_bid_at=Subquery(bids.annotate(last=Max('submited_at')).values('last')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0015_listing_expiry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='bid_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='last_bid_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['product', '-bid_value', '-id'], name='bid_listing_history_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['user_bid', '-submited_at', '-id'], name='bid_user_history_idx'),
+        ),
+        migrations.RunPython(backfill_bid_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,140 @@
+from django.db import migrations, models, transaction
+from django.db.models import F
+from django.db.models.functions import Cast, Round
+
+
+CHUNK_SIZE = 5000
+
+MONEY = models.DecimalField(max_digits=12, decimal_places=2)
+
+
+def to_money(connection, field):
+    # PostgreSQL rounds when casting to numeric(12, 2); SQLite stores
+    # whatever it is given, so round there first
+    if connection.vendor == 'sqlite':
+        return Round(F(field), 2)
+    return Cast(F(field), MONEY)
+
+
+def convert_in_chunks(model, fields, connection):
+    """
+    Copy float columns into their decimal replacements one id range at a
+    time, committing each, so bids and comments can take the write lock
+    between chunks instead of waiting for the whole table.
+    """
+    last = model.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    for start in range(0, last + 1, CHUNK_SIZE):
+        with transaction.atomic():
+            model.objects.filter(id__gte=start, id__lt=start + CHUNK_SIZE).update(
+                **{f'{field}_decimal': to_money(connection, field) for field in fields}
+            )
+
+
+def copy_to_decimal(apps, schema_editor):
+    connection = schema_editor.connection
+    convert_in_chunks(apps.get_model('auctions', 'Listing'), ['min_price', 'highest_bid'], connection)
+    convert_in_chunks(apps.get_model('auctions', 'Bid'), ['bid_value'], connection)
+
+
+def copy_to_float(apps, schema_editor):
+    for model_name, fields in [('Listing', ['min_price', 'highest_bid']), ('Bid', ['bid_value'])]:
+        model = apps.get_model('auctions', model_name)
+        model.objects.update(**{field: F(f'{field}_decimal') for field in fields})
+
+
+class Migration(migrations.Migration):
+
+    # So the copy can commit chunk by chunk. Each schema step below commits
+    # on its own too: a run that fails part way has to be finished by hand
+    # (or the new columns dropped) before migrating again.
+    atomic = False
+
+    dependencies = [
+        ('auctions', '0016_bid_history'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='bid',
+            name='bid_listing_history_idx',
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='min_price_decimal',
+            field=models.DecimalField(max_digits=12, decimal_places=2, null=True),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='highest_bid_decimal',
+            field=models.DecimalField(max_digits=12, decimal_places=2, null=True),
+        ),
+        migrations.AddField(
+            model_name='bid',
+            name='bid_value_decimal',
+            field=models.DecimalField(max_digits=12, decimal_places=2, null=True),
+        ),
+        # Nullable before they go, so that migrating backwards can re-add
+        # the float columns and copy the values back into them
+        migrations.AlterField(
+            model_name='listing',
+            name='min_price',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='listing',
+            name='highest_bid',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='bid',
+            name='bid_value',
+            field=models.FloatField(null=True),
+        ),
+        migrations.RunPython(copy_to_decimal, copy_to_float),
+        migrations.RemoveField(
+            model_name='listing',
+            name='min_price',
+        ),
+        migrations.RemoveField(
+            model_name='listing',
+            name='highest_bid',
+        ),
+        migrations.RemoveField(
+            model_name='bid',
+            name='bid_value',
+        ),
+        migrations.RenameField(
+            model_name='listing',
+            old_name='min_price_decimal',
+            new_name='min_price',
+        ),
+        migrations.RenameField(
+            model_name='listing',
+            old_name='highest_bid_decimal',
+            new_name='highest_bid',
+        ),
+        migrations.RenameField(
+            model_name='bid',
+            old_name='bid_value_decimal',
+            new_name='bid_value',
+        ),
+        migrations.AlterField(
+            model_name='listing',
+            name='min_price',
+            field=models.DecimalField(max_digits=12, decimal_places=2),
+        ),
+        migrations.AlterField(
+            model_name='listing',
+            name='highest_bid',
+            field=models.DecimalField(max_digits=12, decimal_places=2, blank=True),
+        ),
+        migrations.AlterField(
+            model_name='bid',
+            name='bid_value',
+            field=models.DecimalField(max_digits=12, decimal_places=2),
+        ),
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['product', '-bid_value', '-id'], name='bid_listing_history_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_watch_counts(apps, schema_editor):
+    Listing = apps.get_model('auctions', 'Listing')
+    watches = (
+        Listing.watched_by.through.objects.filter(listing=OuterRef('pk'))
+        .order_by().values('listing').annotate(count=Count('id')).values('count')
+    )
+    Listing.objects.update(watch_count=Coalesce(Subquery(watches), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0017_decimal_money'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='watch_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_watch_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0019_notification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='image_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='image_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('image_hash', ''), models.Q(('image_url', ''), _negated=True)), fields=['id'], name='listing_image_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0020_listing_thumbnails'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['product', '-created_at', '-id'], name='comment_listing_recent_idx'),
+        ),
+    ]
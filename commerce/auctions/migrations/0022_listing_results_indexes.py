@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0021_comment_created_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('is_available', False)), fields=['listed_by', 'closed_at', 'id'], name='listing_seller_results_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('is_available', False)), fields=['closed_at', 'id'], name='listing_results_idx'),
+        ),
+    ]
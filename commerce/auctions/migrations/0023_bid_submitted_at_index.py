@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0022_listing_results_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['-submited_at'], name='bid_submitted_at_idx'),
+        ),
+    ]
@@ -1,33 +1,80 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 import datetime
 
 
 class User(AbstractUser):
     pass
 
+class Category(models.Model):
+    name = models.CharField(max_length=64, unique=True)
+    active_listings = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} - Active listings: {self.active_listings}"
+
 class Listing(models.Model):
     title = models.CharField(max_length=64, blank=False)
     description = models.CharField(max_length=5000, blank=False)
-    min_price = models.FloatField(blank=False)
+    min_price = models.DecimalField(max_digits=12, decimal_places=2, blank=False)
     image_url = models.CharField(max_length=500, blank=True)
+    # Content hash of the fetched image_url, naming its thumbnails; see images.py
+    image_hash = models.CharField(max_length=64, blank=True, default='')
+    image_attempts = models.PositiveSmallIntegerField(default=0)
     category = models.CharField(max_length=64, blank=True)
     listed_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='listings')
     created_at = models.DateTimeField(auto_now_add=True) 
-    highest_bid = models.FloatField(blank=True)
+    highest_bid = models.DecimalField(max_digits=12, decimal_places=2, blank=True)
     highest_bid_user = models.ForeignKey(User, blank=True, on_delete=models.CASCADE, related_name='listing_highest_products', null=True)
+    # Rolled up from Bid by the bid engine so listing pages never scan the Bid table
+    bid_count = models.PositiveIntegerField(default=0)
+    last_bid_at = models.DateTimeField(blank=True, null=True)
     watched_by = models.ManyToManyField(User, blank=True, related_name="watchlist")
+    # Kept by watching.py alongside watched_by, for the listing cards
+    watch_count = models.PositiveIntegerField(default=0)
     is_available = models.BooleanField(default=True)
+    ends_at = models.DateTimeField(blank=True, null=True)
+    closed_at = models.DateTimeField(blank=True, null=True)
+    winner = models.ForeignKey(User, blank=True, null=True, on_delete=models.SET_NULL, related_name='won_listings')
+    # Bumped on every change that shows on a listing card, see fragments.py
+    version = models.PositiveIntegerField(default=1)
+
+    IMAGE_PENDING = models.Q(image_hash='') & ~models.Q(image_url='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_available', '-created_at', '-id'], name='listing_active_feed_idx'),
+            models.Index(fields=['category', 'is_available', '-created_at', '-id'], name='listing_category_feed_idx'),
+            models.Index(fields=['ends_at'], condition=models.Q(is_available=True), name='listing_open_ends_at_idx'),
+            models.Index(fields=['id'], condition=models.Q(image_hash='') & ~models.Q(image_url=''), name='listing_image_pending_idx'),
+            # Result exports, in closing order, per seller and for everyone
+            models.Index(fields=['listed_by', 'closed_at', 'id'], condition=models.Q(is_available=False), name='listing_seller_results_idx'),
+            models.Index(fields=['closed_at', 'id'], condition=models.Q(is_available=False), name='listing_results_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None and not kwargs.get('force_insert'):
+            self.version += 1
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.title} - Price: {self.min_price} - Listed by: {self.listed_by}"
     
 class Bid(models.Model):
     product = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name="bids_on_product")
-    bid_value = models.FloatField(blank=False)
+    bid_value = models.DecimalField(max_digits=12, decimal_places=2, blank=False)
     user_bid = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bids_by_user')
     submited_at = models.DateTimeField(auto_now_add=True) 
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', '-bid_value', '-id'], name='bid_listing_history_idx'),
+            models.Index(fields=['user_bid', '-submited_at', '-id'], name='bid_user_history_idx'),
+            # The admin's date filter
+            models.Index(fields=['-submited_at'], name='bid_submitted_at_idx'),
+        ]
+
     def __str__(self):
         return f"{self.product} - Bid: {self.bid_value} - Bid from: {self.user_bid}"
 
@@ -35,6 +82,40 @@ class Comment(models.Model):
     product = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name="comments")
     comment = models.CharField(max_length=5000, blank=False)
     user_comment = models.ForeignKey(User, on_delete=models.CASCADE, related_name='comments_by_user')
+    # Not auto_now_add: comments are written in batches, and should carry
+    # the time they were posted rather than the time they were flushed
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', '-created_at', '-id'], name='comment_listing_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product} - {self.comment}"
+
+class Notification(models.Model):
+    OUTBID = 'outbid'
+    WON = 'won'
+    KINDS = [
+        (OUTBID, 'Outbid'),
+        (WON, 'Auction won'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    kind = models.CharField(max_length=16, choices=KINDS)
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='notifications')
+    amount = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Set by the delivery worker; null rows are the outbox
+    sent_at = models.DateTimeField(blank=True, null=True)
+    # Set while a delivery worker is sending the row, see auctions/notifications.py
+    claimed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'], condition=models.Q(sent_at__isnull=True), name='notification_outbox_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.product} - {self.comment}"
\ No newline at end of file
+        return f"{self.user} - {self.get_kind_display()} - {self.listing_id}"
@@ -0,0 +1,119 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Notification
+
+
+DIGEST_TEMPLATE = "auctions/notification_digest.txt"
+DIGEST_SUBJECT = "Auction updates"
+# A claimed batch left unsent this long is taken as abandoned by its worker
+CLAIM_SECONDS = 600
+
+
+def notify_outbid(user_id, listing_id, amount):
+    """
+    Queue an outbid notice. Call it inside the transaction that records the
+    new bid, so the notice exists exactly when the bid does.
+    """
+    Notification.objects.create(user_id=user_id, kind=Notification.OUTBID, listing_id=listing_id, amount=amount)
+
+
+def notify_winners(wins):
+    """
+    Queue auction-won notices for (listing_id, winner_id, amount) triples.
+    """
+    Notification.objects.bulk_create([
+        Notification(user_id=winner_id, kind=Notification.WON, listing_id=listing_id, amount=amount)
+        for listing_id, winner_id, amount in wins if winner_id
+    ])
+
+
+def void_wins(listing_ids):
+    """
+    Drop the auction-won notices of reopened listings that haven't gone
+    out yet. Ones a worker is already sending can't be recalled.
+    """
+    Notification.objects.filter(
+        kind=Notification.WON, listing_id__in=listing_ids, sent_at__isnull=True, claimed_at__isnull=True,
+    ).delete()
+
+
+def _digest_items(notifications):
+    # One line per listing and kind: a bidding war that outbid the user a
+    # hundred times is reported once, at the latest amount
+    latest = {}
+    for notification in notifications:
+        latest[(notification.listing_id, notification.kind)] = notification
+    return sorted(latest.values(), key=lambda notification: notification.id)
+
+
+def _claimable(now):
+    # Unsent, and not claimed by a worker, or by one that has stopped
+    # answering for CLAIM_SECONDS
+    return Notification.objects.filter(sent_at__isnull=True).filter(
+        Q(claimed_at__isnull=True) | Q(claimed_at__lt=now - timedelta(seconds=CLAIM_SECONDS))
+    )
+
+
+def _claim(batch_size, now):
+    with transaction.atomic():
+        user_ids = set(
+            _claimable(now).select_for_update(skip_locked=True)
+            .order_by('id').values_list('user_id', flat=True)[:batch_size]
+        )
+        if not user_ids:
+            return []
+        ids = list(
+            _claimable(now).filter(user_id__in=user_ids)
+            .select_for_update(skip_locked=True).values_list('id', flat=True)
+        )
+        Notification.objects.filter(id__in=ids).update(claimed_at=now)
+    return ids
+
+
+def deliver_pending(batch_size=100, now=None):
+    """
+    Email one digest to each of up to `batch_size` users with undelivered
+    notifications, covering everything pending for them, and mark it sent.
+    Returns (notifications, emails) delivered.
+
+    Rows are claimed in a short transaction (with SELECT ... FOR UPDATE SKIP
+    LOCKED where supported, so several workers can share the outbox) and
+    the emails are sent after it commits, so no lock is held while the mail
+    server answers. A failed send releases the claim for the next run; a
+    crash between sending and marking the rows sent can repeat a digest
+    once the claim expires, but never lose one.
+    """
+    now = now or timezone.now()
+    ids = _claim(batch_size, now)
+    if not ids:
+        return 0, 0
+
+    pending = list(Notification.objects.filter(id__in=ids).select_related('user', 'listing').order_by('id'))
+    by_user = defaultdict(list)
+    for notification in pending:
+        by_user[notification.user].append(notification)
+
+    messages = [
+        EmailMessage(
+            DIGEST_SUBJECT,
+            render_to_string(DIGEST_TEMPLATE, {"user": user, "items": _digest_items(notifications)}),
+            to=[user.email],
+        )
+        for user, notifications in by_user.items() if user.email
+    ]
+    try:
+        if messages:
+            get_connection().send_messages(messages)
+    except Exception:
+        Notification.objects.filter(id__in=ids).update(claimed_at=None)
+        raise
+
+    Notification.objects.filter(id__in=ids).update(sent_at=now, claimed_at=None)
+    return len(pending), len(messages)
@@ -0,0 +1,144 @@
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+
+
+FEED_SCOPE = "feed"
+FEED_TIMEOUT = 30
+LISTING_TIMEOUT = 10
+
+
+def listing_scope(listing_id):
+    return f"listing:{listing_id}"
+
+
+def _generation_key(scope):
+    return f"pagecache:generation:{scope}"
+
+
+def invalidate_pages(*scopes):
+    """
+    Drop every cached page in the given scopes once the current transaction
+    commits. Pages are keyed on their scope's generation, so moving the
+    generation on is enough; a nanosecond clock keeps a generation that was
+    evicted from ever coming back with an old value.
+    """
+    def bump():
+        cache.set_many({_generation_key(scope): time.time_ns() for scope in scopes}, None)
+    transaction.on_commit(bump)
+
+
+def _generation(scope):
+    key = _generation_key(scope)
+    generation = cache.get(key)
+    if generation is None:
+        generation = time.time_ns()
+        if not cache.add(key, generation, None):
+            generation = cache.get(key, generation)
+    return generation
+
+
+async def _ageneration(scope):
+    key = _generation_key(scope)
+    generation = await cache.aget(key)
+    if generation is None:
+        generation = time.time_ns()
+        if not await cache.aadd(key, generation, None):
+            generation = await cache.aget(key, generation)
+    return generation
+
+
+def _is_anonymous(request):
+    # Looking for the session cookie instead of request.user keeps a cache
+    # hit from touching the session table at all
+    return settings.SESSION_COOKIE_NAME not in request.COOKIES
+
+
+def _page_key(generation, request):
+    return "pagecache:page:" + hashlib.md5(f"{generation}:{request.get_full_path()}".encode()).hexdigest()
+
+
+def _cacheable(response):
+    return response.status_code == 200 and not response.streaming
+
+
+def _make_entry(response):
+    # The ETag hashes the page itself: an expired page rendered again under
+    # the same generation (say with new watch counts) gets a new one
+    return {
+        "content": response.content,
+        "content_type": response["Content-Type"],
+        "etag": f'"{hashlib.md5(response.content).hexdigest()}"',
+    }
+
+
+def _respond(request, entry):
+    response = HttpResponse(entry["content"], content_type=entry["content_type"])
+    response["ETag"] = entry["etag"]
+    patch_vary_headers(response, ["Cookie"])
+    patch_cache_control(response, max_age=0, must_revalidate=True)
+
+    return get_conditional_response(request, etag=entry["etag"], response=response)
+
+
+def anonymous_page_cache(timeout, scope):
+    """
+    Cache whole GET responses for anonymous visitors and answer conditional
+    requests with 304 Not Modified.
+
+    `scope` is the invalidation scope of the page, or a function mapping the
+    view's kwargs to one.
+    Pages are validated by ETag only. No timestamp covers everything a page
+    shows (comments, closing and reopening, watch counts), so a
+    Last-Modified date would let If-Modified-Since revalidate stale pages.
+    Works on sync and async views alike.
+    """
+    def applies(request):
+        return request.method in ("GET", "HEAD") and _is_anonymous(request)
+
+    def page_scope(kwargs):
+        return scope(**kwargs) if callable(scope) else scope
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if not applies(request):
+                    return await view(request, *args, **kwargs)
+
+                key = _page_key(await _ageneration(page_scope(kwargs)), request)
+                entry = await cache.aget(key)
+                if entry is None:
+                    response = await view(request, *args, **kwargs)
+                    if not _cacheable(response):
+                        return response
+                    entry = _make_entry(response)
+                    await cache.aset(key, entry, timeout)
+
+                return _respond(request, entry)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not applies(request):
+                return view(request, *args, **kwargs)
+
+            key = _page_key(_generation(page_scope(kwargs)), request)
+            entry = cache.get(key)
+            if entry is None:
+                response = view(request, *args, **kwargs)
+                if not _cacheable(response):
+                    return response
+                entry = _make_entry(response)
+                cache.set(key, entry, timeout)
+
+            return _respond(request, entry)
+        return wrapper
+    return decorator
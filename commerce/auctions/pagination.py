@@ -0,0 +1,123 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+PAGE_SIZE = 20
+
+LISTING_KEYS = ('created_at', 'id')
+
+# Bid history orderings, each backed by one of Bid's composite indexes
+BID_VALUE_KEYS = ('bid_value', 'id')
+BID_TIME_KEYS = ('submited_at', 'id')
+
+# Newest comments first, backed by comment_listing_recent_idx
+COMMENT_KEYS = ('created_at', 'id')
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def _encode_value(value):
+    # Full precision on purpose: DjangoJSONEncoder drops microseconds, which
+    # would make a cursor skip rows created in the same millisecond
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_cursor(obj, keys=LISTING_KEYS):
+    # Model instances or values() rows
+    values = [obj[key] for key in keys] if isinstance(obj, dict) else [getattr(obj, key) for key in keys]
+    raw = json.dumps(values, default=_encode_value)
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor, model, keys=LISTING_KEYS):
+    # A cursor that does not decode is treated like no cursor at all,
+    # so a mangled link just falls back to the first page
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        if not isinstance(values, list) or len(values) != len(keys):
+            return None
+        if not all(isinstance(value, (str, int, float)) and not isinstance(value, bool) for value in values):
+            return None
+        position = [model._meta.get_field(key).to_python(value) for key, value in zip(keys, values)]
+    except (ValueError, TypeError, UnicodeError, ValidationError):
+        return None
+    # to_python turns an empty string into None, which no filter accepts
+    if any(value is None for value in position):
+        return None
+    return position
+
+
+def _after(keys, values):
+    # (a, b) < (x, y)  becomes  a < x OR (a = x AND b < y)
+    condition = Q()
+    for i, key in enumerate(keys):
+        condition |= Q(**dict(zip(keys[:i], values[:i])), **{f"{key}__lt": values[i]})
+    return condition
+
+
+def _page_queryset(queryset, cursor, per_page, keys):
+    queryset = queryset.order_by(*[f"-{key}" for key in keys])
+
+    position = decode_cursor(cursor, queryset.model, keys) if cursor else None
+    if position is not None:
+        queryset = queryset.filter(_after(keys, position))
+
+    return queryset[:per_page + 1]
+
+
+def _make_page(items, per_page, keys):
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        next_cursor = encode_cursor(items[-1], keys)
+
+    return KeysetPage(items, next_cursor)
+
+
+def keyset_page(queryset, cursor=None, per_page=PAGE_SIZE, keys=LISTING_KEYS):
+    """
+    Return one page of `queryset` ordered by `keys`, largest first (newest
+    first for listings).
+
+    Pages are seeked with a WHERE on the keys instead of an OFFSET, so page
+    500 costs the same as page 1 when backed by an index. The last key must
+    be unique.
+    """
+    items = list(_page_queryset(queryset, cursor, per_page, keys))
+    return _make_page(items, per_page, keys)
+
+
+def keyset_queryset(queryset, cursor=None, per_page=PAGE_SIZE, keys=LISTING_KEYS):
+    """
+    The seeked queryset behind `keyset_page`: up to `per_page` + 1 rows, the
+    extra one telling whether there is a next page. For callers that stream
+    rows rather than build a KeysetPage.
+    """
+    return _page_queryset(queryset, cursor, per_page, keys)
+
+
+async def akeyset_page(queryset, cursor=None, per_page=PAGE_SIZE, keys=LISTING_KEYS):
+    """
+    Async version of `keyset_page`, for async views.
+    """
+    items = [item async for item in _page_queryset(queryset, cursor, per_page, keys)]
+    return _make_page(items, per_page, keys)
@@ -0,0 +1,111 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+
+# Cache reads and writes of one bucket are made atomic within a process.
+# Processes sharing a cache can race on the same bucket and let the odd
+# extra request through, which is fine for a limit meant to stop floods.
+_lock = threading.Lock()
+
+
+def _bucket_key(limit, key):
+    return f"ratelimit:{limit}:{key}"
+
+
+def take(limit, key, now=None):
+    """
+    Take a token from the `limit` bucket of `key` (a user or listing id)
+    and return 0, or the seconds until one is free if the bucket is empty.
+    Limits not in RATE_LIMITS are not enforced.
+    """
+    return take_all([(limit, key)], now)
+
+
+def take_all(buckets, now=None):
+    """
+    Take a token from every (limit, key) bucket, or from none of them if
+    any is empty, and return the seconds until all have one free (0 once
+    they are taken). A request turned away by one bucket doesn't use up
+    the others.
+
+    Buckets follow the generic cell rate algorithm: each holds only the
+    time it will be full again, so a take is one cache read and one write
+    per bucket.
+    """
+    now = time.time() if now is None else now
+    wait, updates = 0, {}
+    with _lock:
+        for limit, key in buckets:
+            if limit not in settings.RATE_LIMITS:
+                continue
+            rate, burst = settings.RATE_LIMITS[limit]
+            interval = 1 / rate
+            cache_key = _bucket_key(limit, key)
+            full_at = max(cache.get(cache_key, now), now) + interval
+            wait = max(wait, full_at - now - burst * interval)
+            updates[cache_key] = (full_at, math.ceil(burst * interval) + 1)
+        if wait > 0:
+            return wait
+        for cache_key, (full_at, timeout) in updates.items():
+            cache.set(cache_key, full_at, timeout)
+    return 0
+
+
+def too_many_requests(retry_after):
+    seconds = math.ceil(retry_after)
+    response = HttpResponse(
+        f"Too many requests. Try again in {seconds} second{'s' if seconds != 1 else ''}.",
+        status=429,
+        content_type="text/plain; charset=utf-8",
+    )
+    response["Retry-After"] = str(seconds)
+    return response
+
+
+def rate_limited(action):
+    """
+    Answer POSTs over the "<action>:user" or "<action>:listing" limit in
+    RATE_LIMITS with 429 Too Many Requests and a Retry-After header, before
+    the view touches the database. A token is only taken when both buckets
+    have one, so one client flooding a listing runs out of its own tokens
+    while the listing's, which everyone else bidding on it shares, last.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, listing_id, *args, **kwargs):
+            if request.method == "POST":
+                retry_after = take_all([(f"{action}:user", request.user.id), (f"{action}:listing", listing_id)])
+                if retry_after:
+                    return too_many_requests(retry_after)
+            return view(request, listing_id, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def first_submission(*parts):
+    """
+    Yield True the first time these parts are seen within DUPLICATE_WINDOW
+    seconds, and False for a repeat such as a double click or a client
+    retry. If the block raises, the submission is forgotten, so retrying a
+    request that failed isn't taken for a repeat. Decimals are normalised,
+    so 10 and 10.00 are the same amount.
+    """
+    key = "submitted:" + ":".join(
+        str(part.normalize() if isinstance(part, Decimal) else part) for part in parts
+    )
+    first = cache.add(key, True, settings.DUPLICATE_WINDOW)
+    try:
+        yield first
+    except BaseException:
+        if first:
+            cache.delete(key)
+        raise
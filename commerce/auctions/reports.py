@@ -0,0 +1,93 @@
+from itertools import islice
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Case, F, When
+
+from .models import Listing, Bid
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+CHUNK_SIZE = 5000
+
+PERCENTILES = (10, 25, 50, 75, 90)
+
+
+def _batches(queryset, size):
+    rows = queryset.iterator(chunk_size=size)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def _grouped(queryset, size):
+    """
+    Read (group, *values) rows ordered by group a batch at a time and yield
+    each group with its values as one float array, a row per input row.
+    """
+    group, parts = None, []
+    for batch in _batches(queryset, size):
+        keys = np.array([row[0] for row in batch], dtype=object)
+        values = np.array([row[1:] for row in batch], dtype=float)
+        starts = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+        for key_part, value_part in zip(np.split(keys, starts), np.split(values, starts)):
+            if parts and key_part[0] != group:
+                yield group, np.concatenate(parts)
+                parts = []
+            group = key_part[0]
+            parts.append(value_part)
+    if parts:
+        yield group, np.concatenate(parts)
+
+
+def _summary(values):
+    if not len(values):
+        return None
+    summary = {
+        "count": len(values),
+        "min": values.min(),
+        "mean": values.mean(),
+        "max": values.max(),
+    }
+    summary.update(zip([f"p{p}" for p in PERCENTILES], np.percentile(values, PERCENTILES)))
+    return {key: value if key == "count" else round(float(value), 2) for key, value in summary.items()}
+
+
+def price_statistics(chunk_size=CHUNK_SIZE):
+    """
+    Per-category distribution of listing prices (the highest bid, or the
+    minimum price while there are no bids) and of bid increments, the step
+    between consecutive bids on the same listing.
+
+    Rows are streamed from the database as plain tuples and reduced with
+    NumPy, so no model instances are built. Returns {category: {"prices":
+    summary, "increments": summary}}, where a summary is None when there is
+    nothing to summarise.
+    """
+    if np is None:
+        raise ImproperlyConfigured("The price report needs NumPy (pip install numpy).")
+
+    prices = (
+        Listing.objects
+        .annotate(price=Case(When(highest_bid__gt=F('min_price'), then=F('highest_bid')), default=F('min_price')))
+        .order_by('category')
+        .values_list('category', 'price')
+    )
+    report = {
+        category: {"prices": _summary(values[:, 0]), "increments": None}
+        for category, values in _grouped(prices, chunk_size)
+    }
+
+    # Accepted bids only ever go up, so ordering by value is bid order
+    bids = (
+        Bid.objects
+        .order_by('product__category', 'product_id', 'bid_value')
+        .values_list('product__category', 'product_id', 'bid_value')
+    )
+    for category, values in _grouped(bids, chunk_size):
+        same_listing = np.diff(values[:, 0]) == 0
+        report[category]["increments"] = _summary(np.diff(values[:, 1])[same_listing])
+
+    return report
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class FastHashingTestRunner(DiscoverRunner):
+    """
+    The default test runner, hashing passwords with FAST_PASSWORD_HASHERS
+    as the benchmarks' scratch database does; see commerce/settings.py.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._hashers = override_settings(PASSWORD_HASHERS=settings.FAST_PASSWORD_HASHERS)
+        self._hashers.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._hashers.disable()
+        super().teardown_test_environment(**kwargs)
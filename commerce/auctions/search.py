@@ -0,0 +1,173 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models.signals import post_delete, post_save
+from django.utils.module_loading import import_string
+
+from .models import Listing
+
+
+PAGE_SIZE = 20
+
+SQLITE_TABLE = "auctions_listing_fts"
+POSTGRES_INDEX = "auctions_listing_search_gin"
+POSTGRES_DOCUMENT = (
+    "to_tsvector('english', title || ' ' || description || ' ' || category)"
+)
+
+
+# What the index holds; a save that writes none of these leaves it alone
+INDEXED_FIELDS = {"title", "description", "category", "is_available"}
+
+
+class SearchBackend:
+    """
+    Full-text index over active listings.
+
+    Saving or deleting a listing updates the index through the signal
+    receivers below. Bulk writes, such as closing and imports, bypass the
+    signals and index their listings themselves.
+
+    Backends only deal in listing ids; turning ids back into listings is
+    left to `search_listings` so every backend returns the same objects.
+    """
+
+    def create_index(self, schema_editor):
+        raise NotImplementedError
+
+    def drop_index(self, schema_editor):
+        raise NotImplementedError
+
+    def index_listings(self, listings):
+        raise NotImplementedError
+
+    def index_listing(self, listing):
+        self.index_listings([listing])
+
+    def remove_listings(self, listing_ids):
+        raise NotImplementedError
+
+    def remove_listing(self, listing_id):
+        self.remove_listings([listing_id])
+
+    def search(self, query, offset, limit):
+        raise NotImplementedError
+
+
+class SQLiteFTSBackend(SearchBackend):
+    def create_index(self, schema_editor):
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_TABLE} "
+            "USING fts5(title, description, category, tokenize='porter')"
+        )
+        schema_editor.execute(
+            f"INSERT INTO {SQLITE_TABLE} (rowid, title, description, category) "
+            "SELECT id, title, description, category FROM auctions_listing WHERE is_available"
+        )
+
+    def drop_index(self, schema_editor):
+        schema_editor.execute(f"DROP TABLE IF EXISTS {SQLITE_TABLE}")
+
+    def index_listings(self, listings):
+        listings = list(listings)
+        self.remove_listings(listing.id for listing in listings)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {SQLITE_TABLE} (rowid, title, description, category) VALUES (%s, %s, %s, %s)",
+                [(listing.id, listing.title, listing.description, listing.category) for listing in listings],
+            )
+
+    def remove_listings(self, listing_ids):
+        listing_ids = list(listing_ids)
+        if not listing_ids:
+            return
+        placeholders = ", ".join(["%s"] * len(listing_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SQLITE_TABLE} WHERE rowid IN ({placeholders})", listing_ids)
+
+    def search(self, query, offset, limit):
+        # Quote every term so user input can't be read as FTS5 syntax, and
+        # prefix-match so "lam" finds "lamp"
+        terms = ['"{}"*'.format(term.replace('"', '""')) for term in query.split()]
+        if not terms:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s "
+                f"ORDER BY bm25({SQLITE_TABLE}), rowid DESC LIMIT %s OFFSET %s",
+                [" ".join(terms), limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresBackend(SearchBackend):
+    """
+    Ranks with ts_rank over an expression GIN index, so PostgreSQL keeps the
+    index up to date on every write and there is nothing to do per listing.
+    """
+
+    def create_index(self, schema_editor):
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {POSTGRES_INDEX} ON auctions_listing USING GIN ({POSTGRES_DOCUMENT})"
+        )
+
+    def drop_index(self, schema_editor):
+        schema_editor.execute(f"DROP INDEX IF EXISTS {POSTGRES_INDEX}")
+
+    def index_listings(self, listings):
+        pass
+
+    def remove_listings(self, listing_ids):
+        pass
+
+    def search(self, query, offset, limit):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT id FROM auctions_listing, plainto_tsquery('english', %s) query "
+                f"WHERE is_available AND {POSTGRES_DOCUMENT} @@ query "
+                f"ORDER BY ts_rank({POSTGRES_DOCUMENT}, query) DESC, id DESC LIMIT %s OFFSET %s",
+                [query, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+BACKENDS = {
+    "sqlite": SQLiteFTSBackend,
+    "postgresql": PostgresBackend,
+}
+
+
+def get_search_backend(vendor=None):
+    path = getattr(settings, "AUCTIONS_SEARCH_BACKEND", None)
+    if path:
+        return import_string(path)()
+    return BACKENDS[vendor or connection.vendor]()
+
+
+def search_listings(query, page=1, per_page=PAGE_SIZE):
+    """
+    Return (listings, has_next) for one page of ranked results.
+    """
+    offset = (page - 1) * per_page
+    ids = get_search_backend().search(query, offset, per_page + 1)
+    has_next = len(ids) > per_page
+    ids = ids[:per_page]
+
+    found = Listing.objects.filter(is_available=True).in_bulk(ids)
+    return [found[listing_id] for listing_id in ids if listing_id in found], has_next
+
+
+def reindex_listing(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not INDEXED_FIELDS & set(update_fields)):
+        return
+    if instance.is_available:
+        get_search_backend().index_listing(instance)
+    else:
+        get_search_backend().remove_listing(instance.pk)
+
+
+def unindex_listing(sender, instance, **kwargs):
+    get_search_backend().remove_listing(instance.pk)
+
+
+post_save.connect(reindex_listing, sender=Listing)
+post_delete.connect(unindex_listing, sender=Listing)
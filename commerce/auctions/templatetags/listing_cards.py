@@ -0,0 +1,24 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from ..fragments import render_listing_cards
+from ..images import thumbnail_url
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def listing_cards(listings):
+    return mark_safe(render_listing_cards(list(listings)))
+
+
+@register.filter
+def listing_image(listing, size):
+    """
+    The local thumbnail of a listing's image once it has been made, the
+    original URL until then.
+    """
+    if listing.image_hash:
+        return thumbnail_url(listing.image_hash, size)
+    return listing.image_url
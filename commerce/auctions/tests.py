@@ -1,3 +1,1664 @@
-from django.test import TestCase
+import asyncio
+import base64
+import builtins
+import csv
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.models import Count, F, Max
+from django.test.utils import CaptureQueriesContext
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import views
+from .admin import EstimatedCountPaginator
+from .auth import forget_users
+from .bidding import minimum_bid, submit_bid, ACCEPTED, OUTBID, CLOSED
+from .catalog import category_counts
+from .management.commands._datagen import generate_data
+from .closing import close_expired, close_listings, reopen_listings
+from .comments import comment_buffer
+from .fragments import card_stats, render_listing_cards
+from .images import Image, ImageFetchError, MAX_ATTEMPTS, fetch_image, process_pending_images
+from .live import InProcessBroker, get_broker, listing_channel
+from .metrics import REGISTRY, request_duration
+from .models import User, Listing, Bid, Comment, Notification
+from .notifications import CLAIM_SECONDS, deliver_pending
+from .pagination import keyset_page
+from .ratelimit import take, take_all
+from .reports import np, price_statistics
+from .search import search_listings
+from .watching import watch, unwatch, watched_ids
+
+
+def make_listing(user, **kwargs):
+    fields = {
+        "title": "Item",
+        "description": "Description",
+        "min_price": 10,
+        "highest_bid": 0,
+        "listed_by": user,
+    }
+    fields.update(kwargs)
+    return Listing.objects.create(**fields)
+
+
+class ListingFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("seller", "seller@example.com", "password")
+
+    def test_keyset_pages_cover_every_listing_once(self):
+        created = [make_listing(self.user, title=f"Item {i}") for i in range(7)]
+
+        seen = []
+        cursor = None
+        while True:
+            page = keyset_page(Listing.objects.all(), cursor, per_page=3)
+            seen.extend(listing.id for listing in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+
+        self.assertEqual(seen, [listing.id for listing in reversed(created)])
+
+    def test_bad_cursor_falls_back_to_first_page(self):
+        make_listing(self.user)
+        page = keyset_page(Listing.objects.all(), "not-a-cursor")
+        self.assertEqual(len(page), 1)
+
+    def test_well_formed_cursors_with_wrong_values_fall_back_to_first_page(self):
+        listing = make_listing(self.user, title="Only item", category="Lamps")
+        submit_bid(listing.id, self.user, 20)
+        urls = [
+            reverse("auctions:index"),
+            reverse("auctions:listing", args=[listing.id]),
+            reverse("auctions:listing_bids", args=[listing.id]),
+            reverse("auctions:categories_items", args=["Lamps"]),
+            reverse("auctions:api_listings"),
+            reverse("auctions:api_listing_bids", args=[listing.id]),
+        ]
+
+        for values in [[{}, 1], [[1], 1], [None, None], ["", 1], [True, 1], ["2024-01-01T00:00:00", "x"]]:
+            cursor = base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+            self.assertEqual(len(keyset_page(Listing.objects.all(), cursor)), 1)
+            for url in urls:
+                with self.subTest(values=values, url=url):
+                    self.assertEqual(self.client.get(url, {"after": cursor}).status_code, 200)
+
+    def test_index_only_shows_active_listings(self):
+        make_listing(self.user, title="Open item")
+        make_listing(self.user, title="Closed item", is_available=False)
+
+        response = self.client.get(reverse("auctions:index"))
+
+        self.assertContains(response, "Open item")
+        self.assertNotContains(response, "Closed item")
+
+
+class BidEngineTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.bidder = User.objects.create_user("bidder", "bidder@example.com", "password")
+        self.listing = make_listing(self.seller, min_price=10)
+
+    def test_first_bid_may_match_min_price(self):
+        result = submit_bid(self.listing.id, self.bidder, 10)
+
+        self.assertEqual(result.status, ACCEPTED)
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.highest_bid, 10)
+        self.assertEqual(self.listing.highest_bid_user, self.bidder)
+
+    def test_bid_below_min_price_or_current_bid_is_outbid(self):
+        self.assertEqual(submit_bid(self.listing.id, self.bidder, 9).status, OUTBID)
+        submit_bid(self.listing.id, self.bidder, 15)
+        self.assertEqual(submit_bid(self.listing.id, self.seller, 15).status, OUTBID)
+        self.assertEqual(Bid.objects.count(), 1)
+
+    def test_closed_listing_rejects_bids(self):
+        Listing.objects.filter(id=self.listing.id).update(is_available=False)
+        self.assertEqual(submit_bid(self.listing.id, self.bidder, 50).status, CLOSED)
+
+    def test_missing_listing_raises(self):
+        with self.assertRaises(Listing.DoesNotExist):
+            submit_bid(self.listing.id + 1, self.bidder, 50)
+
+
+class BidEngineConcurrencyTests(TransactionTestCase):
+    BIDS = 2000
+    WORKERS = 16
+
+    def test_parallel_bids_never_lose_the_highest(self):
+        seller = User.objects.create_user("seller", "seller@example.com", "password")
+        bidders = [User.objects.create_user(f"bidder{i}") for i in range(self.WORKERS)]
+        listing = make_listing(seller, min_price=1)
+
+        def bid(n):
+            try:
+                return submit_bid(listing.id, bidders[n % self.WORKERS], 1 + (n * 7919) % self.BIDS)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as pool:
+            results = list(pool.map(bid, range(self.BIDS)))
+
+        listing.refresh_from_db()
+        accepted = [result.bid for result in results if result.accepted]
+        best = max(accepted, key=lambda b: b.bid_value)
+
+        self.assertEqual(listing.highest_bid, self.BIDS)
+        self.assertEqual(listing.highest_bid_user, best.user_bid)
+        self.assertEqual(Bid.objects.filter(product=listing).count(), len(accepted))
+        self.assertEqual(
+            Bid.objects.filter(product=listing).order_by("-bid_value").first().bid_value,
+            listing.highest_bid,
+        )
+
+
+class ListingViewQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.listing = make_listing(self.seller, min_price=1)
+
+        users = [User.objects.create_user(f"user{i}") for i in range(10)]
+        for i, user in enumerate(users):
+            submit_bid(self.listing.id, user, 2 + i)
+            Comment.objects.create(product=self.listing, comment=f"Comment {i}", user_comment=user)
+        self.listing.watched_by.add(*users)
+
+    def test_anonymous_query_ceiling(self):
+        # listing with counts, comments with authors
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("auctions:listing", args=[self.listing.id]))
+        self.assertContains(response, "Comment 9")
+
+    def test_authenticated_query_ceiling(self):
+        self.client.force_login(self.seller)
+        watched_ids(self.seller.id)
+        # user, listing with counts, comments with authors; the session and
+        # the watch flag come from the cache
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("auctions:listing", args=[self.listing.id]))
+        self.assertContains(response, "10 bids so far.")
+        self.assertContains(response, "Close Auction")
+
+    def test_missing_listing_is_404(self):
+        response = self.client.get(reverse("auctions:listing", args=[self.listing.id + 1]))
+        self.assertEqual(response.status_code, 404)
+
+
+class CategoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("seller", "seller@example.com", "password")
+        self.client.force_login(self.user)
+
+    def create_listing(self, category):
+        self.client.post(reverse("auctions:new_listing"), {
+            "title": "Item",
+            "description": "Description",
+            "min_price": 10,
+            "category": category,
+        })
+        return Listing.objects.latest("id")
+
+    def test_counts_follow_new_and_closed_listings(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            lamp = self.create_listing("Home")
+            self.create_listing("Home")
+            self.create_listing("Toys")
+        self.assertEqual(category_counts(), [("Home", 2), ("Toys", 1)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("auctions:close_auction", args=[lamp.id]))
+            self.client.post(reverse("auctions:close_auction", args=[lamp.id]))
+        self.assertEqual(category_counts(), [("Home", 1), ("Toys", 1)])
+
+    def test_counts_follow_moved_and_deleted_listings(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            lamps = [make_listing(self.user, category="Lamps") for _ in range(3)]
+            closed = make_listing(self.user, category="Lamps", is_available=False)
+        self.assertEqual(category_counts(), [("Lamps", 3)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for listing in lamps[:2]:
+                listing.category = "Chairs"
+                listing.save()
+            closed.category = "Chairs"
+            closed.save()
+        self.assertEqual(category_counts(), [("Chairs", 2), ("Lamps", 1)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            lamps[0].title = "Armchair"
+            lamps[0].save(update_fields=["title"])
+            lamps[2].delete()
+            closed.delete()
+            self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "password"))
+            self.client.post(reverse("admin:auctions_listing_delete", args=[lamps[1].id]), {"post": "yes"})
+        self.assertFalse(Listing.objects.filter(id=lamps[1].id).exists())
+        self.assertEqual(category_counts(), [("Chairs", 1)])
+
+    def test_categories_page_is_served_from_cache(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_listing("Home")
+        category_counts()
+
+        # the session, the user and the counts all come from the cache
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("auctions:categories"))
+        self.assertContains(response, "Home")
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("seller", "seller@example.com", "password")
+        self.client.force_login(self.user)
+
+    def create_listing(self, title, description="Description", category=""):
+        self.client.post(reverse("auctions:new_listing"), {
+            "title": title,
+            "description": description,
+            "min_price": 10,
+            "category": category,
+        })
+        return Listing.objects.latest("id")
+
+    def test_new_listings_are_searchable_and_ranked(self):
+        lamp = self.create_listing("Brass lamp", "A lamp, the best lamp", "Home")
+        chair = self.create_listing("Chair", "Comes with a small lamp")
+        self.create_listing("Teddy bear", category="Toys")
+
+        listings, has_next = search_listings("lamp")
+
+        self.assertEqual(listings, [lamp, chair])
+        self.assertFalse(has_next)
+        self.assertEqual(search_listings("toy")[0][0].title, "Teddy bear")
+
+    def test_closed_listings_drop_out_of_results(self):
+        lamp = self.create_listing("Brass lamp")
+        self.client.post(reverse("auctions:close_auction", args=[lamp.id]))
+
+        self.assertEqual(search_listings("lamp")[0], [])
+
+    def test_renamed_and_deleted_listings_are_reindexed(self):
+        lamp = self.create_listing("Brass lamp")
+        admin = User.objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.force_login(admin)
+
+        self.client.post(reverse("admin:auctions_listing_change", args=[lamp.id]), {
+            "title": "Teak chair",
+            "description": "Description",
+            "min_price": "10.00",
+            "listed_by": self.user.id,
+        })
+
+        self.assertEqual(search_listings("brass")[0], [])
+        self.assertEqual(search_listings("teak")[0], [lamp])
+
+        lamp.delete()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM auctions_listing_fts")
+            self.assertEqual(cursor.fetchone(), (0,))
+
+    def test_search_pages(self):
+        for i in range(3):
+            self.create_listing(f"Lamp {i}")
+
+        first, has_next = search_listings("lamp", page=1, per_page=2)
+        second, _ = search_listings("lamp", page=2, per_page=2)
+
+        self.assertTrue(has_next)
+        self.assertEqual(len(first + second), 3)
+
+    def test_search_view_escapes_query_syntax(self):
+        self.create_listing("Brass lamp")
+        response = self.client.get(reverse("auctions:search"), {"q": 'lamp" OR *'})
+        self.assertEqual(response.status_code, 200)
+
+
+class LiveEventTests(TestCase):
+    SUBSCRIBERS = 2000
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_every_subscriber_gets_every_event(self):
+        broker = InProcessBroker()
+        subscriptions = [broker.subscribe("listing:1") for _ in range(self.SUBSCRIBERS)]
+        other = broker.subscribe("listing:2")
+
+        # Publish from worker threads, the way sync views do under ASGI
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            await asyncio.gather(*[
+                loop.run_in_executor(pool, broker.publish, "listing:1", {"type": "bid", "amount": amount})
+                for amount in range(5)
+            ])
+
+        for subscription in subscriptions:
+            received = [(await subscription.get())["amount"] for _ in range(5)]
+            self.assertEqual(sorted(received), list(range(5)))
+        self.assertTrue(other.queue.empty())
+
+        for subscription in subscriptions:
+            subscription.close()
+        self.assertEqual(broker.subscriber_count("listing:1"), 0)
+
+    async def test_slow_subscriber_keeps_latest_events(self):
+        broker = InProcessBroker()
+        subscription = broker.subscribe("listing:1")
+        for amount in range(150):
+            broker.publish("listing:1", {"type": "bid", "amount": amount})
+        await asyncio.sleep(0)
+
+        self.assertEqual((await subscription.get())["amount"], 50)
+
+    async def test_event_stream_pushes_committed_bids(self):
+        seller = await User.objects.acreate(username="seller")
+        listing = await Listing.objects.acreate(
+            title="Item", description="Description", min_price=1, highest_bid=0, listed_by=seller
+        )
+
+        response = await self.async_client.get(reverse("auctions:listing_events", args=[listing.id]))
+        stream = response.streaming_content
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertEqual(await anext(stream), b": connected\n\n")
+
+        get_broker().publish(listing_channel(listing.id), {"type": "bid", "amount": 5})
+        chunk = (await anext(stream)).decode()
+        await stream.aclose()
+
+        self.assertTrue(chunk.startswith("event: bid\n"))
+        self.assertEqual(json.loads(chunk.split("data: ")[1]), {"type": "bid", "amount": 5})
+
+    def test_wsgi_pages_do_not_open_an_event_stream(self):
+        seller = User.objects.create_user("seller")
+        listing = make_listing(seller)
+
+        response = self.client.get(reverse("auctions:listing_events", args=[listing.id]))
+        self.assertEqual(response.status_code, 204)
+        self.assertNotContains(self.client.get(reverse("auctions:listing", args=[listing.id])), "EventSource")
+
+    async def test_asgi_pages_open_an_event_stream(self):
+        seller = await User.objects.acreate(username="seller")
+        listing = await Listing.objects.acreate(
+            title="Item", description="Description", min_price=1, highest_bid=0, listed_by=seller
+        )
+
+        response = await self.async_client.get(reverse("auctions:listing", args=[listing.id]))
+        self.assertContains(response, "EventSource")
+
+
+class ListingCardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        card_stats.reset()
+        self.seller = User.objects.create_user("seller")
+        self.bidder = User.objects.create_user("bidder")
+        self.listing = make_listing(self.seller, title="Lamp", min_price=10)
+
+    def render(self):
+        return render_listing_cards(list(Listing.objects.filter(id=self.listing.id)))
+
+    def test_unchanged_listing_is_served_from_cache(self):
+        first = self.render()
+        second = self.render()
+
+        self.assertEqual(first, second)
+        self.assertEqual(card_stats.snapshot(), {"hits": 1, "misses": 1})
+
+    def test_bids_edits_and_closing_bump_the_version(self):
+        self.render()
+
+        submit_bid(self.listing.id, self.bidder, 25)
+        self.assertIn("Price: $ 25", self.render())
+
+        self.listing.refresh_from_db()
+        self.listing.title = "Brass lamp"
+        self.listing.save()
+        self.assertIn("Brass lamp", self.render())
+
+        self.client.force_login(self.seller)
+        self.client.post(reverse("auctions:close_auction", args=[self.listing.id]))
+        self.render()
+
+        self.assertEqual(card_stats.snapshot(), {"hits": 0, "misses": 4})
+
+
+class AnonymousPageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller")
+        self.bidder = User.objects.create_user("bidder", "bidder@example.com", "password")
+        self.listing = make_listing(self.seller, title="Lamp", min_price=10)
+        self.url = reverse("auctions:listing", args=[self.listing.id])
+
+    def test_repeat_anonymous_views_skip_the_database(self):
+        self.client.get(self.url)
+        self.client.get(reverse("auctions:index"))
+
+        with self.assertNumQueries(0):
+            listing_page = self.client.get(self.url)
+            index_page = self.client.get(reverse("auctions:index"))
+
+        self.assertContains(listing_page, "Lamp")
+        self.assertContains(index_page, "Lamp")
+        self.assertIn("ETag", index_page)
+
+    def test_conditional_requests_get_304_by_etag_only(self):
+        response = self.client.get(self.url)
+        self.assertNotIn("Last-Modified", response)
+
+        by_etag = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        # Comments, closing and watch counts don't move any date, so one
+        # can't tell the page is unchanged
+        by_date = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE="Fri, 01 Jan 2100 00:00:00 GMT")
+
+        self.assertEqual(by_etag.status_code, 304)
+        self.assertEqual(by_date.status_code, 200)
+
+    def test_a_page_rendered_again_gets_a_new_etag_when_it_changed(self):
+        etag = self.client.get(reverse("auctions:index"))["ETag"]
+        watch(self.bidder.id, self.listing.id)
+        # As when the page's entry expires while its generation lives on
+        cache.delete_many([key.split(":", 2)[2] for key in list(cache._cache) if ":pagecache:page:" in key])
+
+        response = self.client.get(reverse("auctions:index"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Watched by 1 user")
+
+    @override_settings(COMMENT_BATCH_SIZE=1)
+    def test_bids_and_comments_invalidate_the_page(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        bidder = self.client_class()
+        bidder.force_login(self.bidder)
+        with self.captureOnCommitCallbacks(execute=True):
+            bidder.post(reverse("auctions:place_bid", args=[self.listing.id]), {"bid_value": 30})
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "$ 30")
+        self.assertContains(self.client.get(reverse("auctions:index")), "Price: $ 30")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bidder.post(reverse("auctions:add_comment", args=[self.listing.id]), {"comment": "Nice lamp"})
+        self.assertContains(self.client.get(self.url), "Nice lamp")
+
+    def test_logged_in_users_bypass_the_cache(self):
+        self.client.get(self.url)
+        self.client.force_login(self.bidder)
+
+        response = self.client.get(self.url)
+
+        self.assertNotIn("ETag", response)
+        self.assertContains(response, "Place Bid")
+
+
+class AuctionExpiryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller")
+        self.bidder = User.objects.create_user("bidder")
+
+    def make_expiring(self, minutes, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_login(self.seller)
+            self.client.post(reverse("auctions:new_listing"), {
+                "title": "Item",
+                "description": "Description",
+                "min_price": 10,
+                "category": "Home",
+            })
+        listing = Listing.objects.latest("id")
+        Listing.objects.filter(id=listing.id).update(ends_at=timezone.now() + timedelta(minutes=minutes))
+        return listing
+
+    def test_expired_auctions_close_with_winner(self):
+        expired = self.make_expiring(-5)
+        unsold = self.make_expiring(-1)
+        running = self.make_expiring(60)
+        submit_bid(expired.id, self.bidder, 20)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            closed = close_expired(batch_size=1)
+            closed += close_expired(batch_size=1)
+
+        self.assertEqual(closed, [expired.id, unsold.id])
+        self.assertEqual(close_expired(), [])
+        expired.refresh_from_db()
+        unsold.refresh_from_db()
+        self.assertFalse(expired.is_available)
+        self.assertEqual(expired.winner, self.bidder)
+        self.assertIsNone(unsold.winner)
+        self.assertIsNotNone(unsold.closed_at)
+        self.assertTrue(Listing.objects.get(id=running.id).is_available)
+        self.assertEqual(category_counts(), [("Home", 1)])
+
+    def test_closing_twice_is_a_no_op(self):
+        listing = self.make_expiring(60)
+
+        self.assertEqual(close_listings(Listing.objects.filter(id=listing.id)), [listing.id])
+        self.assertEqual(close_listings(Listing.objects.filter(id=listing.id)), [])
+
+    def test_management_command_drains_every_batch(self):
+        for _ in range(5):
+            self.make_expiring(-1)
+        out = StringIO()
+
+        call_command("close_expired_auctions", batch_size=2, stdout=out)
+
+        self.assertIn("Closed 5 expired auctions.", out.getvalue())
+        self.assertFalse(Listing.objects.filter(is_available=True).exists())
+
+
+class ListingTransferTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write_jsonl(self, rows):
+        path = os.path.join(self.tmp.name, "listings.jsonl")
+        with open(path, "w") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+        return path
+
+    def row(self, i, **kwargs):
+        return {
+            "title": f"Item {i}",
+            "description": "Description",
+            "min_price": 10,
+            "category": "Home",
+            "listed_by": "seller",
+            "created_at": "2024-05-01T12:00:00+00:00",
+            "bids": [{"user": "bidder", "value": 12, "submited_at": "2024-05-02T12:00:00+00:00"}],
+            "highest_bid": 12,
+            "highest_bid_user": "bidder",
+            **kwargs,
+        }
+
+    def test_import_then_export_round_trips(self):
+        source = self.write_jsonl([self.row(i) for i in range(5)] + [self.row(5, is_available=False)])
+
+        call_command("import_listings", source, batch_size=2, stdout=StringIO())
+
+        self.assertEqual(Listing.objects.count(), 6)
+        self.assertEqual(Bid.objects.filter(user_bid__username="bidder").count(), 6)
+        closed = Listing.objects.get(title="Item 5")
+        self.assertEqual(closed.winner.username, "bidder")
+        self.assertEqual(closed.created_at.year, 2024)
+        self.assertEqual(category_counts(), [("Home", 5)])
+
+        exported = os.path.join(self.tmp.name, "export.csv")
+        call_command("export_listings", exported, stderr=StringIO())
+        Listing.objects.all().delete()
+        call_command("import_listings", exported, stdout=StringIO())
+
+        self.assertEqual(
+            sorted(Listing.objects.values_list("title", "bids_on_product__bid_value")),
+            [(f"Item {i}", 12) for i in range(6)],
+        )
+
+    def test_import_resumes_from_checkpoint(self):
+        source = self.write_jsonl([self.row(i) for i in range(4)])
+        with open(source + ".checkpoint", "w") as f:
+            json.dump({"source": os.path.abspath(source), "rows": 3}, f)
+
+        call_command("import_listings", source, stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(list(Listing.objects.values_list("title", flat=True)), ["Item 3"])
+
+
+class BidHistoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller")
+        self.bidder = User.objects.create_user("bidder", "bidder@example.com", "password")
+        self.listing = make_listing(self.seller, min_price=1)
+        for amount in range(2, 27):
+            submit_bid(self.listing.id, self.bidder, amount)
+
+    def test_listing_keeps_a_bid_summary(self):
+        self.listing.refresh_from_db()
+
+        self.assertEqual(self.listing.bid_count, 25)
+        self.assertEqual(self.listing.highest_bid, 26)
+        self.assertIsNotNone(self.listing.last_bid_at)
+
+    def test_listing_view_never_reads_bids(self):
+        self.client.force_login(self.bidder)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("auctions:listing", args=[self.listing.id]))
+
+        self.assertContains(response, "25 bids so far.")
+        self.assertFalse(any("auctions_bid" in query["sql"] for query in queries))
+
+    def test_listing_history_pages_by_value(self):
+        url = reverse("auctions:listing_bids", args=[self.listing.id])
+
+        first = self.client.get(url)
+        second = self.client.get(url, {"after": first.context["bids"].next_cursor})
+
+        values = [bid.bid_value for bid in first.context["bids"]] + [bid.bid_value for bid in second.context["bids"]]
+        self.assertEqual(values, list(range(26, 1, -1)))
+        self.assertFalse(second.context["bids"].has_next)
+
+    def test_my_bids_lists_own_bids_newest_first(self):
+        self.client.force_login(self.bidder)
+
+        response = self.client.get(reverse("auctions:my_bids"))
+
+        self.assertEqual(response.context["bids"].items[0].bid_value, 26)
+        self.assertEqual(len(response.context["bids"]), 20)
+
+
+class MoneyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller")
+        self.bidder = User.objects.create_user("bidder")
+
+    def test_amounts_are_exact(self):
+        listing = make_listing(self.seller, min_price=Decimal("0.10"))
+        submit_bid(listing.id, self.bidder, Decimal("0.30"))
+
+        listing.refresh_from_db()
+        self.assertEqual(listing.highest_bid, Decimal("0.1") + Decimal("0.2"))
+
+    def test_minimum_bid(self):
+        listing = make_listing(self.seller, min_price=Decimal("10.00"))
+        self.assertEqual(minimum_bid(listing), Decimal("10.00"))
+
+        submit_bid(listing.id, self.bidder, Decimal("12.50"))
+        listing.refresh_from_db()
+        self.assertEqual(minimum_bid(listing), Decimal("12.51"))
+        self.assertEqual(submit_bid(listing.id, self.bidder, Decimal("12.50")).status, OUTBID)
+        self.assertEqual(submit_bid(listing.id, self.bidder, minimum_bid(listing)).status, ACCEPTED)
+
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class PriceReportTests(TestCase):
+    def setUp(self):
+        seller = User.objects.create_user("seller")
+        bidder = User.objects.create_user("bidder")
+        for price in [10, 20, 30]:
+            make_listing(seller, category="Books", min_price=price)
+        toy = make_listing(seller, category="Toys", min_price=5)
+        other = make_listing(seller, category="Toys", min_price=5)
+        for amount in ["6", "8", "11"]:
+            submit_bid(toy.id, bidder, Decimal(amount))
+        submit_bid(other.id, bidder, Decimal("50"))
+
+    def test_prices_and_increments_per_category(self):
+        # A chunk size of 2 makes both categories span several batches
+        report = price_statistics(chunk_size=2)
+
+        self.assertEqual(list(report), ["Books", "Toys"])
+        self.assertEqual(report["Books"]["prices"]["p50"], 20)
+        self.assertEqual(report["Books"]["prices"]["count"], 3)
+        self.assertIsNone(report["Books"]["increments"])
+        self.assertEqual(report["Toys"]["prices"]["max"], 50)
+        # 6 -> 8 -> 11 on one listing; the lone bid on the other adds nothing
+        self.assertEqual(report["Toys"]["increments"]["count"], 2)
+        self.assertEqual(report["Toys"]["increments"]["mean"], 2.5)
+
+    def test_command(self):
+        output = StringIO()
+        call_command("price_report", "--json", stdout=output)
+
+        self.assertEqual(json.loads(output.getvalue())["Toys"]["prices"]["min"], 11)
+
+
+class WatchlistTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller")
+        self.watcher = User.objects.create_user("watcher", "watcher@example.com", "password")
+        self.listings = [make_listing(self.seller, title=f"Item {i}") for i in range(25)]
+
+    def test_watch_and_unwatch_keep_the_count(self):
+        listing = self.listings[0]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(watch(self.watcher.id, listing.id))
+            self.assertFalse(watch(self.watcher.id, listing.id))
+        listing.refresh_from_db()
+        self.assertEqual(listing.watch_count, 1)
+        self.assertEqual(watched_ids(self.watcher.id), {listing.id})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(unwatch(self.watcher.id, listing.id))
+            self.assertFalse(unwatch(self.watcher.id, listing.id))
+        listing.refresh_from_db()
+        self.assertEqual(listing.watch_count, 0)
+        self.assertEqual(watched_ids(self.watcher.id), set())
+
+    def test_a_set_read_before_a_watch_committed_is_not_served(self):
+        first, second = self.listings[:2]
+        watch(self.watcher.id, first.id)
+
+        def watched_meanwhile(rows):
+            stale = builtins.frozenset(rows)
+            with self.captureOnCommitCallbacks(execute=True):
+                watch(self.watcher.id, second.id)
+            return stale
+
+        with mock.patch("auctions.watching.frozenset", watched_meanwhile, create=True):
+            self.assertEqual(watched_ids(self.watcher.id), {first.id})
+        self.assertEqual(watched_ids(self.watcher.id), {first.id, second.id})
+
+    def test_views_update_the_cached_watch_set(self):
+        self.client.force_login(self.watcher)
+        listing = self.listings[0]
+        url = reverse("auctions:listing", args=[listing.id])
+
+        self.assertContains(self.client.get(url), "Add to Watchlist")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("auctions:add_to_watchlist", args=[listing.id]))
+        self.assertContains(self.client.get(url), "Remove from Watchlist")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("auctions:remove_from_watchlist", args=[listing.id]))
+        self.assertContains(self.client.get(url), "Add to Watchlist")
+
+    def test_watchlist_pages_through_one_bulk_fetch(self):
+        for listing in self.listings:
+            watch(self.watcher.id, listing.id)
+        self.client.force_login(self.watcher)
+        url = reverse("auctions:watchlist")
+        watched_ids(self.watcher.id)
+
+        # user, the page of listings; the session comes from the cache
+        with self.assertNumQueries(2):
+            first = self.client.get(url)
+        second = self.client.get(url, {"after": first.context["listings"].next_cursor})
+
+        titles = [listing.title for listing in first.context["listings"]] + \
+                 [listing.title for listing in second.context["listings"]]
+        self.assertEqual(titles, [f"Item {i}" for i in range(24, -1, -1)])
+        self.assertFalse(second.context["listings"].has_next)
+        self.assertContains(first, "Watched by 1 user")
+
+
+class FlakyEmailBackend(BaseEmailBackend):
+    fail = False
+    during_send = None
+
+    def send_messages(self, messages):
+        if self.during_send:
+            self.during_send()
+        if self.fail:
+            raise ConnectionError("Mail server went away")
+        return len(messages)
+
+
+class NotificationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller")
+        self.alice = User.objects.create_user("alice", "alice@example.com")
+        self.bob = User.objects.create_user("bob", "bob@example.com")
+        self.listing = make_listing(self.seller, title="Lamp", min_price=1)
+
+    def test_outbid_is_queued_with_the_bid(self):
+        submit_bid(self.listing.id, self.alice, 2)
+        submit_bid(self.listing.id, self.alice, 3)
+        self.assertFalse(Notification.objects.exists())
+
+        submit_bid(self.listing.id, self.bob, 4)
+        submit_bid(self.listing.id, self.alice, 4)
+
+        notification = Notification.objects.get()
+        self.assertEqual((notification.user, notification.kind, notification.amount), (self.alice, Notification.OUTBID, 4))
+
+    def test_closing_queues_the_win(self):
+        submit_bid(self.listing.id, self.bob, 5)
+        close_listings(Listing.objects.filter(id=self.listing.id))
+
+        self.assertTrue(Notification.objects.filter(user=self.bob, kind=Notification.WON).exists())
+
+    def test_bidding_war_becomes_one_digest_per_user(self):
+        for amount in range(2, 102):
+            submit_bid(self.listing.id, self.alice if amount % 2 else self.bob, amount)
+        close_listings(Listing.objects.filter(id=self.listing.id))
+
+        self.assertEqual(deliver_pending(), (100, 2))
+        self.assertEqual(deliver_pending(), (0, 0))
+
+        digests = {message.to[0]: message.body for message in mail.outbox}
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(digests["alice@example.com"].count("outbid"), 1)
+        self.assertIn("current bid is $ 101", digests["bob@example.com"])
+        self.assertIn('You won "Lamp"', digests["alice@example.com"])
+        self.assertFalse(Notification.objects.filter(sent_at__isnull=True).exists())
+
+    @override_settings(EMAIL_BACKEND="auctions.tests.FlakyEmailBackend")
+    def test_sending_happens_after_the_claim_and_failures_release_it(self):
+        submit_bid(self.listing.id, self.alice, 2)
+        submit_bid(self.listing.id, self.bob, 3)
+        # A second worker finds nothing to claim while the first is sending
+        during_send = mock.patch.object(FlakyEmailBackend, "during_send",
+                                        staticmethod(lambda: self.assertEqual(deliver_pending(), (0, 0))))
+        during_send.start()
+        self.addCleanup(during_send.stop)
+        self.addCleanup(setattr, FlakyEmailBackend, "fail", False)
+
+        FlakyEmailBackend.fail = True
+        with self.assertRaises(ConnectionError):
+            deliver_pending()
+        self.assertEqual(Notification.objects.filter(sent_at=None, claimed_at=None).count(), 1)
+
+        FlakyEmailBackend.fail = False
+        self.assertEqual(deliver_pending(), (1, 1))
+        self.assertFalse(Notification.objects.filter(sent_at__isnull=True).exists())
+
+    def test_abandoned_claims_expire(self):
+        submit_bid(self.listing.id, self.alice, 2)
+        submit_bid(self.listing.id, self.bob, 3)
+        Notification.objects.update(claimed_at=timezone.now())
+
+        self.assertEqual(deliver_pending(), (0, 0))
+        self.assertEqual(deliver_pending(now=timezone.now() + timedelta(seconds=CLAIM_SECONDS + 1)), (1, 1))
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        for histogram in REGISTRY:
+            histogram.reset()
+        self.listing = make_listing(User.objects.create_user("seller"), title="Lamp")
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse("auctions:listing", args=[self.listing.id]))
+
+        timing = response["Server-Timing"]
+        self.assertIn("app;dur=", timing)
+        self.assertIn('desc="2 queries"', timing)
+        self.assertIn("tpl;dur=", timing)
+
+    def test_metrics_endpoint_exposes_histograms_per_view(self):
+        self.client.get(reverse("auctions:listing", args=[self.listing.id]))
+        self.client.get(reverse("auctions:index"))
+
+        with override_settings(METRICS_TOKEN="scraper-token"):
+            response = self.client.get(reverse("auctions:metrics"), headers={"Authorization": "Bearer scraper-token"})
+
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        body = response.content.decode()
+        self.assertIn("# TYPE auctions_request_duration_seconds histogram", body)
+        self.assertIn('auctions_request_duration_seconds_count{view="auctions:listing",method="GET"} 1', body)
+        self.assertIn('auctions_request_db_queries_bucket{view="auctions:listing",le="2"} 1', body)
+        self.assertIn('auctions_request_db_queries_bucket{view="auctions:listing",le="1"} 0', body)
+        self.assertIn('auctions_request_template_duration_seconds_count{view="auctions:index"} 1', body)
+
+    def test_metrics_need_staff_or_the_token(self):
+        url = reverse("auctions:metrics")
+        self.assertEqual(self.client.get(url).status_code, 403)
+        with override_settings(METRICS_TOKEN="scraper-token"):
+            self.assertEqual(self.client.get(url, headers={"Authorization": "Bearer wrong"}).status_code, 403)
+        with override_settings(METRICS_TOKEN=""):
+            self.assertEqual(self.client.get(url, headers={"Authorization": "Bearer "}).status_code, 403)
+
+        self.client.force_login(User.objects.create_user("staff", is_staff=True))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_unknown_methods_share_one_label(self):
+        for method in ("BREW", "PROPFIND"):
+            self.client.generic(method, reverse("auctions:index"))
+
+        self.assertIn('_count{view="auctions:index",method="other"} 2', request_duration.expose())
+
+    def test_histogram_buckets_are_cumulative(self):
+        for value in [0.001, 0.02, 0.02, 20]:
+            request_duration.observe(value, "v", "GET")
+
+        body = request_duration.expose()
+        self.assertIn('_bucket{view="v",method="GET",le="0.005"} 1', body)
+        self.assertIn('_bucket{view="v",method="GET",le="0.025"} 3', body)
+        self.assertIn('_bucket{view="v",method="GET",le="10"} 3', body)
+        self.assertIn('_bucket{view="v",method="GET",le="+Inf"} 4', body)
+        self.assertIn('_count{view="v",method="GET"} 4', body)
+
+
+class DataGeneratorTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_generated_data_is_consistent_and_skewed(self):
+        ctx = generate_data(users=50, listings=200, bids=3000, comments=300, seed=1)
+
+        self.assertEqual(Bid.objects.count(), 3000)
+        self.assertEqual(Comment.objects.count(), 300)
+        summaries = Listing.objects.annotate(bids=Count("bids_on_product"), top=Max("bids_on_product__bid_value"))
+        self.assertFalse(summaries.exclude(bid_count=F("bids")).exists())
+        self.assertFalse(summaries.filter(bids__gt=0).exclude(highest_bid=F("top")).exists())
+        self.assertEqual(sum(count for _, count in category_counts()), len(ctx["active_listings"]))
+
+        # The busiest tenth of the listings draws well over a tenth of the bids
+        busiest = Listing.objects.order_by("-bid_count")[:20]
+        self.assertGreater(sum(listing.bid_count for listing in busiest), 3000 / 2)
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller")
+        self.watcher = User.objects.create_user("watcher")
+        self.listing = make_listing(self.seller, title="Lamp", category="Home")
+        Comment.objects.create(product=self.listing, comment="Nice lamp", user_comment=self.seller)
+        watch(self.watcher.id, self.listing.id)
+
+    async def test_read_views_under_asgi(self):
+        client = AsyncClient()
+        await client.aforce_login(self.watcher)
+
+        response = await client.get(reverse("auctions:categories"))
+        self.assertContains(response, "Signed in as <strong>watcher</strong>")
+
+        for url in [
+            reverse("auctions:index"),
+            reverse("auctions:categories_items", args=["Home"]),
+            reverse("auctions:watchlist"),
+        ]:
+            response = await client.get(url)
+            self.assertContains(response, "Signed in as <strong>watcher</strong>")
+            self.assertContains(response, "Lamp")
+
+        response = await client.get(reverse("auctions:listing", args=[self.listing.id]))
+        self.assertContains(response, "Nice lamp")
+        self.assertContains(response, "Remove from Watchlist")
+
+    async def test_missing_listing_is_404_under_asgi(self):
+        response = await AsyncClient().get(reverse("auctions:listing", args=[self.listing.id + 1]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_watchlist_requires_login_under_asgi(self):
+        response = await AsyncClient().get(reverse("auctions:watchlist"))
+        self.assertEqual(response.status_code, 302)
+
+
+class StandInOrigin(BaseHTTPRequestHandler):
+    """
+    Serves /photo.png as a generated image and /page.html as HTML, standing
+    in for the third-party hosts listing images live on. /moved redirects
+    to /photo.png and /metadata to a cloud metadata address.
+    """
+    hits = 0
+    REDIRECTS = {"/moved": "/photo.png", "/metadata": "http://169.254.169.254/latest/meta-data/"}
+
+    def do_GET(self):
+        type(self).hits += 1
+        if self.path in self.REDIRECTS:
+            self.send_response(302)
+            self.send_header("Location", self.REDIRECTS[self.path])
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path == "/photo.png":
+            buffer = BytesIO()
+            Image.new("RGB", (2000, 1000), "red").save(buffer, "PNG")
+            body, content_type = buffer.getvalue(), "image/png"
+        else:
+            body, content_type = b"<html></html>", "text/html"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@unittest.skipIf(Image is None, "Pillow is not installed")
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.origin = ThreadingHTTPServer(("127.0.0.1", 0), StandInOrigin)
+        threading.Thread(target=cls.origin.serve_forever, daemon=True).start()
+        cls.base = f"http://127.0.0.1:{cls.origin.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.origin.shutdown()
+        cls.origin.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        StandInOrigin.hits = 0
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        overrides = override_settings(THUMBNAIL_ROOT=root.name, THUMBNAIL_ALLOW_PRIVATE_HOSTS=True)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.root = root.name
+        self.seller = User.objects.create_user("seller")
+
+    def test_thumbnails_are_made_once_and_served_with_long_cache_headers(self):
+        listing = make_listing(self.seller, image_url=f"{self.base}/photo.png")
+        twin = make_listing(self.seller, image_url=f"{self.base}/photo.png")
+
+        self.assertEqual(process_pending_images(), (2, 2))
+        self.assertEqual(process_pending_images(), (0, 0))
+        listing.refresh_from_db()
+        twin.refresh_from_db()
+        self.assertEqual(listing.image_hash, twin.image_hash)
+        self.assertEqual(sorted(os.listdir(self.root)),
+                         [f"{listing.image_hash}-card.jpg", f"{listing.image_hash}-page.jpg"])
+        with Image.open(os.path.join(self.root, f"{listing.image_hash}-card.jpg")) as card:
+            self.assertEqual(card.size, (600, 300))
+
+        url = reverse("auctions:thumbnail", args=[f"{listing.image_hash}-card.jpg"])
+        response = self.client.get(reverse("auctions:index"))
+        self.assertContains(response, url)
+        self.assertNotContains(response, self.base)
+
+        response = self.client.get(url)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertIn("immutable", response["Cache-Control"])
+        revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_failures_give_up_and_keep_the_original(self):
+        listing = make_listing(self.seller, image_url=f"{self.base}/page.html")
+
+        for _ in range(MAX_ATTEMPTS + 1):
+            process_pending_images()
+
+        listing.refresh_from_db()
+        self.assertEqual((listing.image_hash, listing.image_attempts), ("", MAX_ATTEMPTS))
+        self.assertEqual(StandInOrigin.hits, MAX_ATTEMPTS)
+        self.assertContains(self.client.get(reverse("auctions:index")), f"{self.base}/page.html")
+
+    def test_private_hosts_are_refused(self):
+        listing = make_listing(self.seller, image_url=f"{self.base}/photo.png")
+
+        with override_settings(THUMBNAIL_ALLOW_PRIVATE_HOSTS=False):
+            process_pending_images()
+
+        listing.refresh_from_db()
+        self.assertEqual(listing.image_hash, "")
+        self.assertEqual(StandInOrigin.hits, 0)
+
+    def test_redirects_are_followed_and_checked_on_every_hop(self):
+        moved = make_listing(self.seller, image_url=f"{self.base}/moved")
+        self.assertEqual(process_pending_images(), (1, 1))
+        moved.refresh_from_db()
+        self.assertNotEqual(moved.image_hash, "")
+
+        # The stand-in origin passes for a public host, the metadata
+        # address it redirects to doesn't
+        listing = make_listing(self.seller, image_url=f"{self.base}/metadata")
+        with override_settings(THUMBNAIL_ALLOW_PRIVATE_HOSTS=False), \
+                mock.patch("auctions.images._is_public", lambda address: address == "127.0.0.1"):
+            with self.assertRaisesMessage(ImageFetchError, "169.254.169.254 is not a public address"):
+                fetch_image(listing.image_url)
+
+    def test_unknown_thumbnail_is_404(self):
+        self.assertEqual(self.client.get(reverse("auctions:thumbnail", args=["settings.py"])).status_code, 404)
+        self.assertEqual(self.client.get(reverse("auctions:thumbnail", args=["0" * 64 + "-card.jpg"])).status_code, 404)
+
+
+# Long enough that the background flusher never writes during a test
+@override_settings(COMMENT_BATCH_SIZE=3, COMMENT_BATCH_SECONDS=3600)
+class CommentBufferTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller")
+        self.author = User.objects.create_user("author")
+        self.listing = make_listing(self.seller)
+        self.url = reverse("auctions:listing", args=[self.listing.id])
+        self.client.force_login(self.author)
+
+    def post(self, text):
+        return self.client.post(reverse("auctions:add_comment", args=[self.listing.id]), {"comment": text})
+
+    def test_comments_are_written_in_batches_and_shown_to_their_author(self):
+        self.post("First")
+        self.post("Second")
+
+        self.assertEqual(Comment.objects.count(), 0)
+        response = self.client.get(self.url)
+        self.assertContains(response, "First")
+        self.assertContains(response, "Second")
+        self.assertNotContains(self.client_class().get(self.url), "First")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post("Third")
+
+        self.assertEqual(Comment.objects.count(), 3)
+        anonymous = self.client_class().get(self.url).content.decode()
+        self.assertLess(anonymous.index("Third"), anonymous.index("First"))
+        self.assertEqual(self.client.get(self.url).content.decode().count("Second"), 1)
+
+    def test_a_flush_while_the_page_is_read_shows_the_comment_once(self):
+        read_page = views._listing_comments
+
+        async def read_then_flush(*args):
+            page = await read_page(*args)
+            await sync_to_async(comment_buffer().flush)()
+            return page
+
+        async def flush_then_read(*args):
+            await sync_to_async(comment_buffer().flush)()
+            return await read_page(*args)
+
+        for text, race in [("Flushed after the read", read_then_flush), ("Flushed before the read", flush_then_read)]:
+            self.post(text)
+            with mock.patch("auctions.views._listing_comments", race):
+                response = self.client.get(self.url)
+            self.assertEqual(response.content.decode().count(text), 1)
+
+    def test_flush_keeps_the_posting_time(self):
+        self.post("Early")
+        posted = timezone.now()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(comment_buffer().flush(), 1)
+
+        self.assertLessEqual(Comment.objects.get().created_at, posted)
+        self.assertContains(self.client_class().get(self.url), "Early")
+
+    def test_comments_are_paginated_newest_first(self):
+        start = timezone.now()
+        Comment.objects.bulk_create([
+            Comment(product=self.listing, user_comment=self.author, comment=f"Comment number {i}.",
+                    created_at=start + timedelta(seconds=i))
+            for i in range(25)
+        ])
+
+        first = self.client_class().get(self.url)
+        self.assertContains(first, "Comment number 24.")
+        self.assertNotContains(first, "Comment number 4.")
+        second = self.client_class().get(self.url, {"after": first.context["comments"].next_cursor})
+        self.assertContains(second, "Comment number 4.")
+        self.assertNotContains(second, "Comment number 5.")
+        self.assertFalse(second.context["comments"].has_next)
+
+
+@override_settings(COMMENT_BATCH_SIZE=3, COMMENT_BATCH_SECONDS=3600)
+class CommentBufferFailureTests(TransactionTestCase):
+    def test_comments_on_a_deleted_listing_do_not_sink_the_batch(self):
+        seller = User.objects.create_user("seller")
+        kept, deleted = make_listing(seller), make_listing(seller)
+        comment_buffer().add(kept.id, seller, "Kept")
+        comment_buffer().add(deleted.id, seller, "Lost")
+        deleted.delete()
+
+        self.assertEqual(comment_buffer().flush(), 1)
+        self.assertEqual(list(Comment.objects.values_list("comment", flat=True)), ["Kept"])
+
+    def test_a_locked_database_keeps_the_batch_for_the_next_flush(self):
+        seller = User.objects.create_user("seller")
+        listing = make_listing(seller)
+        locked = OperationalError("database is locked")
+        comment_buffer().add(listing.id, seller, "First")
+        comment_buffer().add(listing.id, seller, "Second")
+
+        with mock.patch("auctions.comments.LOCK_RETRIES", 2), \
+                mock.patch.object(Comment.objects, "bulk_create", side_effect=locked):
+            with self.assertRaises(OperationalError):
+                comment_buffer().flush()
+            # A full batch that fails is left to the background flusher
+            with self.assertLogs("auctions.comments", "WARNING"):
+                comment_buffer().add(listing.id, seller, "Third")
+
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual([comment.comment for comment in comment_buffer().pending(listing.id, seller.id)],
+                         ["Third", "Second", "First"])
+        self.assertEqual(comment_buffer().flush(), 3)
+        self.assertEqual(Comment.objects.count(), 3)
+        self.assertEqual(comment_buffer().pending(listing.id, seller.id), [])
+
+    def test_a_brief_lock_is_retried(self):
+        seller = User.objects.create_user("seller")
+        listing = make_listing(seller)
+        bulk_create = Comment.objects.bulk_create
+        attempts = []
+
+        def locked_once(comments):
+            attempts.append(len(comments))
+            if len(attempts) == 1:
+                raise OperationalError("database is locked")
+            return bulk_create(comments)
+
+        comment_buffer().add(listing.id, seller, "Retried")
+        with mock.patch.object(Comment.objects, "bulk_create", side_effect=locked_once):
+            self.assertEqual(comment_buffer().flush(), 1)
+
+        self.assertEqual(attempts, [1, 1])
+        self.assertEqual(Comment.objects.get().comment, "Retried")
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller")
+        self.bidder = User.objects.create_user("bidder")
+        start = timezone.now()
+        self.listings = [make_listing(self.seller, title=f"Item {i}", category="Lamps") for i in range(5)]
+        for i, listing in enumerate(self.listings):
+            Listing.objects.filter(id=listing.id).update(created_at=start - timedelta(minutes=i))
+
+    def get(self, route, *args, **params):
+        response = self.client.get(reverse(f"auctions:{route}", args=args), params)
+        body = b"".join(response.streaming_content) if response.streaming else response.content
+        return response, json.loads(body)
+
+    def test_listings_are_paged_with_only_the_fields_asked_for(self):
+        response, page = self.get("api_listings", fields="id,title", limit=3)
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(page["results"], [{"id": listing.id, "title": listing.title} for listing in self.listings[:3]])
+
+        with self.assertNumQueries(1):
+            _, rest = self.get("api_listings", fields="title", limit=3, after=page["next"])
+        self.assertEqual([row["title"] for row in rest["results"]], ["Item 3", "Item 4"])
+        self.assertIsNone(rest["next"])
+
+    def test_ids_are_looked_up_together_in_the_order_asked_for(self):
+        submit_bid(self.listings[1].id, self.bidder, 20)
+        close_listings(Listing.objects.filter(id=self.listings[1].id))
+        ids = [self.listings[3].id, 9999, self.listings[1].id]
+
+        with self.assertNumQueries(1):
+            _, found = self.get("api_listings", ids=",".join(map(str, ids)), fields="id,highest_bid,winner")
+
+        self.assertEqual(found["results"], [
+            {"id": self.listings[3].id, "highest_bid": "0.00", "winner": None},
+            {"id": self.listings[1].id, "highest_bid": "20.00", "winner": "bidder"},
+        ])
+
+    def test_bids_categories_and_watchlist(self):
+        for amount in (11, 12, 13):
+            submit_bid(self.listings[0].id, self.bidder, amount)
+        _, bids = self.get("api_listing_bids", self.listings[0].id, fields="user,amount", limit=2)
+        self.assertEqual(bids["results"], [{"user": "bidder", "amount": "13.00"}, {"user": "bidder", "amount": "12.00"}])
+        self.assertEqual(self.get("api_listing_bids", 9999)[0].status_code, 404)
+
+        _, categories = self.get("api_categories")
+        self.assertEqual(categories["results"], [{"name": "Lamps", "active_listings": 5}])
+
+        self.assertEqual(self.get("api_watchlist")[0].status_code, 401)
+        self.client.force_login(self.bidder)
+        watch(self.bidder.id, self.listings[2].id)
+        _, watchlist = self.get("api_watchlist", fields="title")
+        self.assertEqual(watchlist, {"results": [{"title": "Item 2"}], "next": None})
+
+    def test_bad_requests(self):
+        for params in ({"fields": "id,password"}, {"limit": "0"}, {"limit": "many"}, {"ids": "1,two"}):
+            response, body = self.get("api_listings", **params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn("error", body)
+        self.assertEqual(self.client.post(reverse("auctions:api_listings")).status_code, 405)
+
+
+class ResultExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller")
+        self.other = User.objects.create_user("other")
+        self.bidder = User.objects.create_user("bidder")
+        self.sold = make_listing(self.seller, title="Lamp, brass")
+        submit_bid(self.sold.id, self.bidder, 15)
+        submit_bid(self.sold.id, self.bidder, 25)
+        self.unsold = make_listing(self.seller, title="Chair")
+        self.theirs = make_listing(self.other, title="Vase")
+        make_listing(self.seller, title="Still open")
+        close_listings(Listing.objects.filter(id__in=[self.sold.id, self.unsold.id, self.theirs.id]))
+        self.url = reverse("auctions:export_results")
+
+    def export(self, **params):
+        response = self.client.get(self.url, params)
+        return response, b"".join(response.streaming_content).decode()
+
+    def test_sellers_export_their_own_closed_auctions(self):
+        self.client.force_login(self.seller)
+
+        with self.assertNumQueries(2):  # user, the streamed rows
+            response, body = self.export()
+
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        rows = list(csv.DictReader(StringIO(body)))
+        self.assertEqual([row["title"] for row in rows], ["Lamp, brass", "Chair"])
+        self.assertEqual(
+            {key: rows[0][key] for key in ("seller", "winner", "final_price", "bid_count")},
+            {"seller": "seller", "winner": "bidder", "final_price": "25.00", "bid_count": "2"},
+        )
+        self.assertEqual((rows[1]["winner"], rows[1]["final_price"]), ("", ""))
+
+    def test_staff_export_everyone_as_json_lines(self):
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(self.url, {"seller": "all"}).status_code, 403)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other.is_staff = True
+            self.other.save()
+        _, body = self.export(seller="all", format="jsonl")
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row["title"] for row in rows], ["Lamp, brass", "Chair", "Vase"])
+        self.assertIsNone(rows[1]["final_price"])
+
+        _, body = self.export(seller="seller", format="jsonl")
+        self.assertEqual(len(body.splitlines()), 2)
+
+    async def test_asgi_gets_an_async_stream(self):
+        await self.async_client.aforce_login(self.seller)
+
+        response = await self.async_client.get(self.url)
+
+        self.assertTrue(response.is_async)
+        body = b"".join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual([row["title"] for row in csv.DictReader(StringIO(body))], ["Lamp, brass", "Chair"])
+
+
+class AdminTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.force_login(self.admin)
+        # Loads the signed-in user into the cache before anything is counted
+        self.client.get(reverse("admin:index"))
+        self.seller = User.objects.create_user("seller")
+        self.bidder = User.objects.create_user("bidder")
+
+    def add_bids(self, count):
+        for i in range(count):
+            submit_bid(make_listing(User.objects.create_user(f"seller-{Listing.objects.count()}"), min_price=1).id,
+                       self.bidder, 5)
+
+    def changelist_queries(self, model):
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.client.get(reverse(f"admin:auctions_{model}_changelist")).status_code, 200)
+        return len(captured)
+
+    def test_change_lists_make_the_same_queries_however_many_rows(self):
+        self.add_bids(2)
+        for i in range(2):
+            Comment.objects.create(product=Listing.objects.first(), user_comment=self.bidder, comment=f"Comment {i}")
+        few = {model: self.changelist_queries(model) for model in ("listing", "bid", "comment")}
+
+        self.add_bids(10)
+        for i in range(10):
+            Comment.objects.create(product=Listing.objects.last(), user_comment=self.bidder, comment=f"More {i}")
+        self.assertEqual({model: self.changelist_queries(model) for model in few}, few)
+
+    def test_large_tables_are_estimated_and_filtered_lists_counted_up_to_a_limit(self):
+        self.add_bids(5)
+        Bid.objects.filter(id__in=Bid.objects.order_by('id').values('id')[:2]).delete()
+
+        class Paginator(EstimatedCountPaginator):
+            estimate_above = 2
+            count_limit = 2
+
+        estimated = Paginator(Bid.objects.order_by('-id'), 100)
+        self.assertEqual((estimated.count, estimated.count_qualifier), (Bid.objects.aggregate(Max('id'))['id__max'], "about"))
+        capped = Paginator(Bid.objects.filter(bid_value__gt=0).order_by("-id"), 100)
+        self.assertEqual((capped.count, capped.count_qualifier), (2, "at least"))
+        exact = EstimatedCountPaginator(Bid.objects.order_by("-id"), 100)
+        self.assertEqual((exact.count, exact.count_qualifier), (3, None))
+
+        with mock.patch.object(EstimatedCountPaginator, "estimate_above", 2):
+            self.assertContains(self.client.get(reverse("admin:auctions_bid_changelist")), "about 5 bids")
+
+    def test_close_and_reopen_actions(self):
+        listings = [make_listing(self.seller, category="Lamps") for _ in range(3)]
+        submit_bid(listings[0].id, self.bidder, 20)
+        Listing.objects.filter(id=listings[1].id).update(ends_at=timezone.now() - timedelta(hours=1))
+        url = reverse("admin:auctions_listing_changelist")
+        selected = [listing.id for listing in listings[:2]]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, {"action": "close_selected", "_selected_action": selected})
+        self.assertEqual(
+            list(Listing.objects.filter(id__in=selected).order_by('id').values_list('is_available', 'winner__username')),
+            [(False, "bidder"), (False, None)],
+        )
+        self.assertEqual(category_counts(), [("Lamps", 1)])
+
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as captured:
+            self.client.post(url, {"action": "reopen_selected", "_selected_action": selected})
+        self.assertEqual(sum(query["sql"].startswith('UPDATE "auctions_listing"') for query in captured), 1)
+        self.assertEqual(
+            list(Listing.objects.filter(id__in=selected).order_by('id').values_list('is_available', 'winner', 'ends_at')),
+            [(True, None, None), (True, None, None)],
+        )
+        self.assertEqual(category_counts(), [("Lamps", 3)])
+
+    def test_the_change_form_cannot_close_or_move_an_auction(self):
+        listing = make_listing(self.seller, title="Lamp", category="Lamps")
+        submit_bid(listing.id, self.bidder, 20)
+
+        response = self.client.post(reverse("admin:auctions_listing_change", args=[listing.id]), {
+            "title": "Brass lamp",
+            "description": "Description",
+            "min_price": "10.00",
+            "listed_by": self.seller.id,
+            "category": "Chairs",
+            "highest_bid": "99.00",
+            "highest_bid_user": self.seller.id,
+            "winner": self.seller.id,
+        })
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            Listing.objects.filter(id=listing.id).values_list('title', 'category', 'is_available', 'highest_bid', 'highest_bid_user', 'winner').get(),
+            ("Brass lamp", "Lamps", True, 20, self.bidder.id, None),
+        )
+
+    def test_listings_added_in_the_admin_start_open_without_bids(self):
+        self.client.post(reverse("admin:auctions_listing_add"), {
+            "title": "Lamp",
+            "description": "Description",
+            "min_price": "10.00",
+            "listed_by": self.seller.id,
+            "category": "Lamps",
+        })
+
+        self.assertEqual(Listing.objects.values_list('category', 'is_available', 'highest_bid').get(), ("Lamps", True, 0))
+
+    def test_reopening_voids_unsent_wins_and_tells_open_pages(self):
+        listing = make_listing(self.seller)
+        submit_bid(listing.id, self.bidder, 20)
+        close_listings(Listing.objects.filter(id=listing.id))
+        self.assertTrue(Notification.objects.filter(kind=Notification.WON).exists())
+
+        with mock.patch("auctions.closing.publish_listing_event") as publish:
+            reopen_listings(Listing.objects.filter(id=listing.id))
+
+        self.assertFalse(Notification.objects.filter(kind=Notification.WON).exists())
+        publish.assert_called_once_with(listing.id, "reopened")
+
+
+class SessionCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("alice", "alice@example.com", "password")
+        self.client.login(username="alice", password="password")
+
+    def test_signed_in_requests_read_neither_sessions_nor_users(self):
+        # A sync view and an async one, which loads the user with auser()
+        for url in (reverse("auctions:my_bids"), reverse("auctions:index")):
+            self.client.get(url)
+
+            with CaptureQueriesContext(connection) as captured:
+                self.assertContains(self.client.get(url), "alice")
+            self.assertFalse([
+                query["sql"] for query in captured
+                if query["sql"].startswith(('SELECT "django_session"', 'SELECT "auctions_user"'))
+            ], url)
+
+    def test_registering_signs_in_through_the_cached_backend(self):
+        client = self.client_class()
+        client.post(reverse("auctions:register"), {
+            "username": "bob", "email": "bob@example.com", "password": "secret", "confirmation": "secret",
+        })
+        self.assertEqual(client.session[BACKEND_SESSION_KEY], "auctions.auth.CachedModelBackend")
+        self.assertContains(client.get(reverse("auctions:my_bids")), "bob")
+
+    def test_saving_a_user_drops_the_cached_copy(self):
+        self.client.get(reverse("auctions:my_bids"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        self.assertEqual(self.client.get(reverse("auctions:my_bids")).status_code, 302)
+
+    def test_bulk_updates_drop_the_cached_copies_they_name(self):
+        self.client.get(reverse("auctions:my_bids"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(id=self.user.id).update(is_active=False)
+            forget_users([self.user.id])
+
+        self.assertEqual(self.client.get(reverse("auctions:my_bids")).status_code, 302)
+
+    def test_the_test_runner_hashes_passwords_quickly(self):
+        self.assertEqual(settings.PASSWORD_HASHERS, settings.FAST_PASSWORD_HASHERS)
+
+
+@override_settings(RATE_LIMITS={"bid:user": (1, 3), "bid:listing": (100, 20)})
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller")
+        self.listing = make_listing(self.seller, min_price=1)
+        self.url = reverse("auctions:place_bid", args=[self.listing.id])
+
+    def bidder(self, name):
+        client = self.client_class()
+        client.force_login(User.objects.create_user(name))
+        return client
+
+    def test_buckets_refill_at_their_rate(self):
+        now = 1000.0
+        self.assertEqual([take("bid:user", 1, now) for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(take("bid:user", 1, now), 1)
+        self.assertAlmostEqual(take("bid:user", 1, now + 0.5), 0.5)
+        self.assertEqual(take("bid:user", 1, now + 1), 0)
+        self.assertEqual(take("bid:user", 2, now), 0)
+        self.assertEqual(take("comment:user", 1, now), 0)
+
+    def test_a_flooding_user_gets_429_and_others_still_bid(self):
+        flooder = self.bidder("flooder")
+        statuses = [flooder.post(self.url, {"bid_value": 10 + i}).status_code for i in range(5)]
+
+        self.assertEqual(statuses, [302, 302, 302, 429, 429])
+        response = flooder.post(self.url, {"bid_value": 20})
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(Bid.objects.count(), 3)
+
+        self.assertEqual(self.bidder("someone").post(self.url, {"bid_value": 30}).status_code, 302)
+        self.assertEqual(Listing.objects.get(id=self.listing.id).highest_bid, 30)
+
+    def test_the_listing_has_its_own_limit(self):
+        with override_settings(RATE_LIMITS={"bid:listing": (1, 2)}):
+            statuses = [self.bidder(f"user{i}").post(self.url, {"bid_value": 10 + i}).status_code for i in range(3)]
+        self.assertEqual(statuses, [302, 302, 429])
+
+    def test_a_request_turned_away_takes_no_tokens(self):
+        now = 1000.0
+        with override_settings(RATE_LIMITS={"bid:user": (1, 2), "bid:listing": (1, 1)}):
+            self.assertEqual(take_all([("bid:user", 1), ("bid:listing", 1)], now), 0)
+            self.assertAlmostEqual(take_all([("bid:user", 1), ("bid:listing", 1)], now), 1)
+            # The user still has the token the listing turned them away with
+            self.assertEqual(take("bid:user", 1, now), 0)
+            self.assertAlmostEqual(take("bid:user", 1, now), 1)
+
+    def test_repeated_bids_are_placed_once(self):
+        client = self.bidder("clicker")
+        with CaptureQueriesContext(connection) as captured:
+            for _ in range(2):
+                self.assertEqual(client.post(self.url, {"bid_value": 10}).status_code, 302)
+        self.assertEqual(sum(query["sql"].startswith('INSERT INTO "auctions_bid"') for query in captured), 1)
+        self.assertEqual(Bid.objects.count(), 1)
+
+        client.post(self.url, {"bid_value": 11})
+        self.assertEqual(Bid.objects.count(), 2)
+
+        client.post(self.url, {"bid_value": "11.00"})
+        self.assertEqual(Bid.objects.count(), 2)
+
+    def test_a_bid_that_failed_can_be_retried(self):
+        client = self.bidder("retrier")
+        with mock.patch("auctions.views.submit_bid", side_effect=OperationalError("database is locked")):
+            with self.assertRaises(OperationalError):
+                client.post(self.url, {"bid_value": 10})
+
+        client.post(self.url, {"bid_value": 10})
+        self.assertEqual(Bid.objects.count(), 1)
+
+
+# The listing's bucket has room for everyone's fair share, but not for the
+# flood: it only stays available if the flooder's own bucket runs dry first
+@override_settings(RATE_LIMITS={"bid:user": (2, 5), "bid:listing": (10, 30)})
+class RateLimitFairnessTests(TransactionTestCase):
+    FLOOD_THREADS = 8
+    FLOOD_BIDS = 40
+    POLITE_USERS = 6
+
+    def test_a_flood_does_not_starve_other_bidders(self):
+        cache.clear()
+        seller = User.objects.create_user("seller")
+        listing = make_listing(seller, min_price=1)
+        url = reverse("auctions:place_bid", args=[listing.id])
+        flooder = User.objects.create_user("flooder")
+        polite = [User.objects.create_user(f"polite{i}") for i in range(self.POLITE_USERS)]
+        amounts = iter(range(1, 1_000_000))
+        lock = threading.Lock()
+
+        # Signed in up front: concurrent session writes would lock SQLite's
+        # shared in-memory database
+        clients = {}
+        for user in [flooder, *polite]:
+            clients[user.username] = self.client_class()
+            clients[user.username].force_login(user)
+
+        def post(user):
+            try:
+                with lock:
+                    amount = next(amounts)
+                return user.username, clients[user.username].post(url, {"bid_value": amount}).status_code
+            finally:
+                connection.close()
+
+        # Three bids from each polite user, spread through the flood and
+        # competing with it for the same threads and the same listing
+        requests = [flooder] * (self.FLOOD_THREADS * self.FLOOD_BIDS)
+        for i, user in enumerate(polite * 3):
+            requests.insert((i + 1) * len(requests) // (len(polite) * 3 + 1), user)
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.FLOOD_THREADS) as pool:
+            results = list(pool.map(post, requests))
+        elapsed = time.monotonic() - start
+
+        flooder_accepted = sum(1 for name, status in results if name == "flooder" and status == 302)
+        polite_statuses = [status for name, status in results if name != "flooder"]
+        self.assertLessEqual(flooder_accepted, 5 + 2 * elapsed + 1)
+        self.assertEqual(polite_statuses, [302] * (self.POLITE_USERS * 3))
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 app_name = 'auctions'
 
@@ -10,6 +10,9 @@ urlpatterns = [
     path("logout", views.logout_view, name="logout"),
     path("register", views.register, name="register"),
     path("listings/<int:listing_id>", views.listing_view, name="listing"),
+    path("listings/<int:listing_id>/bids", views.listing_bids, name="listing_bids"),
+    path("listings/my_bids", views.my_bids, name="my_bids"),
+    path("listings/<int:listing_id>/events", views.listing_events, name="listing_events"),
     path("listings/new", views.listing_new, name='new_listing'),
     path("listings/add_watchlist/<int:listing_id>", views.add_to_watchlist, name="add_to_watchlist"),
     path("listings/remove_watchlist/<int:listing_id>", views.remove_from_watchlist, name="remove_from_watchlist"),
@@ -17,6 +20,14 @@ urlpatterns = [
     path("listings/close_auction/<int:listing_id>", views.close_auction, name="close_auction"),
     path("listings/add_comment/<int:listing_id>", views.add_comment, name="add_comment"),
     path("listings/watchlist", views.watchlist, name="watchlist"),
+    path("listings/results", views.export_results, name="export_results"),
+    path("listings/search", views.search, name="search"),
     path("listings/categories", views.categories, name="categories"),
-    path("listings/categories/<str:category_name>", views.categories_items, name="categories_items")
+    path("listings/categories/<str:category_name>", views.categories_items, name="categories_items"),
+    path("metrics", views.metrics, name="metrics"),
+    path("thumbnails/<str:name>", views.thumbnail, name="thumbnail"),
+    path("api/listings", api.listings, name="api_listings"),
+    path("api/listings/<int:listing_id>/bids", api.listing_bids, name="api_listing_bids"),
+    path("api/categories", api.categories, name="api_categories"),
+    path("api/watchlist", api.watchlist, name="api_watchlist"),
 ]
@@ -1,17 +1,52 @@
+import asyncio
+import logging
+import os
+import re
+
+from django.conf import settings
 from django.contrib.auth import authenticate, login, logout
-from django.db import IntegrityError
-from django.http import HttpResponse, HttpResponseRedirect
-from django.shortcuts import render, redirect
+from django.core.exceptions import PermissionDenied
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, HttpResponseRedirect, StreamingHttpResponse
+from django.shortcuts import render, redirect, aget_object_or_404, get_object_or_404
 from django.urls import reverse
 
-from django.forms import ModelForm, ValidationError, Textarea
+from django.forms import ModelForm, ValidationError, Textarea, DateTimeInput
 from .models import User, Listing, Bid, Comment
+from .bidding import minimum_bid, submit_bid
+from .catalog import acategory_counts
+from .closing import close_listings
+from .exports import EXPORT_FORMATS, aclosed_auction_rows, aexport_chunks, closed_auction_rows, export_chunks
+from .comments import comment_buffer
+from .images import CACHE_SECONDS, THUMBNAIL_SIZES, thumbnail_root
+from .live import get_broker, listing_channel, publish_listing_event, format_sse
+from .metrics import expose_metrics, may_read_metrics
+from .pagecache import (
+    FEED_SCOPE, FEED_TIMEOUT, LISTING_TIMEOUT,
+    anonymous_page_cache, invalidate_pages, listing_scope,
+)
+from .pagination import BID_TIME_KEYS, BID_VALUE_KEYS, COMMENT_KEYS, akeyset_page, keyset_page
+from .ratelimit import first_submission, rate_limited
+from .search import search_listings
+from .watching import ais_watching, awatchlist_page, unwatch, watch
 from django.contrib.auth.decorators import login_required
 
+logger = logging.getLogger(__name__)
+
+# Seconds between keep-alive comments on an idle event stream
+LIVE_HEARTBEAT = 15
+
+THUMBNAIL_NAME = re.compile(r"^[0-9a-f]{64}-(%s)\.jpg$" % "|".join(THUMBNAIL_SIZES))
+
+
 class ListingForm(ModelForm):
     class Meta:
         model = Listing
-        fields = ['title', 'description', 'min_price', 'image_url', 'category']
+        fields = ['title', 'description', 'min_price', 'image_url', 'category', 'ends_at']
+        widgets = {
+            'ends_at': DateTimeInput(attrs={'type': 'datetime-local'}),
+        }
 
     def __init__(self, *args, **kwargs):
         self.user = kwargs.pop('user', None)
@@ -31,7 +66,7 @@ class BidForm(ModelForm):
 
         super().__init__(*args, **kwargs)        
     
-        self.fields['bid_value'].widget.attrs['min'] = round(self.min_price, 2)
+        self.fields['bid_value'].widget.attrs['min'] = self.min_price
 
     def clean_price(self):
         bid = self.cleaned_data['bid_value']
@@ -56,9 +91,22 @@ class CommentForm(ModelForm):
 
 
 
-def index(request):
+async def resolve_user(request):
+    """
+    Load the user without blocking the event loop and pin it on the request,
+    so templates reading `user` don't trigger a synchronous query.
+    """
+    request.user = await request.auser()
+    return request.user
+
+
+@anonymous_page_cache(FEED_TIMEOUT, FEED_SCOPE)
+async def index(request):
+    await resolve_user(request)
+    listings = await akeyset_page(Listing.objects.filter(is_available=True), request.GET.get("after"))
+
     return render(request, "auctions/index.html", {
-        "listings": Listing.objects.all()
+        "listings": listings
     })
 
 
@@ -108,49 +156,76 @@ def register(request):
             return render(request, "auctions/register.html", {
                 "message": "Username already taken."
             })
-        login(request, user)
+        # Named, since ModelBackend is also configured for older sessions
+        login(request, user, backend=settings.AUTHENTICATION_BACKENDS[0])
         return HttpResponseRedirect(reverse("auctions:index"))
     else:
         return render(request, "auctions/register.html")
 
-def listing_view(request, listing_id):
-    
-    listing = Listing.objects.get(id=listing_id)
+async def _listing_comments(listing_id, cursor):
+    return await akeyset_page(
+        Comment.objects.filter(product_id=listing_id).select_related('user_comment'),
+        cursor,
+        keys=COMMENT_KEYS
+    )
 
-    bid_text_info = False
-    user_owner_listing = False
 
-    if listing.listed_by == request.user:
-        user_owner_listing = True
+def _with_pending_comments(comments, pending):
+    # The author's comments that were still buffered go on top of the first
+    # page, so they see them straight away. `pending` is taken before the
+    # page is read: a comment written in between is on the page, and has
+    # been given its id by the write, so it is only shown once.
+    shown = {comment.id for comment in comments}
+    comments.items = [comment for comment in pending if comment.id not in shown] + comments.items
+
+
+def serves_live_events(request):
+    # An endless event stream needs ASGI. Under WSGI, Django reads an async
+    # stream to the end before sending it, which would hold a worker for good.
+    return isinstance(request, ASGIRequest)
+
+
+async def _watch_flag(user, listing_id):
+    return user.is_authenticated and await ais_watching(user.id, listing_id)
+
+
+@anonymous_page_cache(LISTING_TIMEOUT, listing_scope)
+async def listing_view(request, listing_id):
     
-    print(user_owner_listing)
+    user = await resolve_user(request)
+    cursor = request.GET.get("after")
+    # Before the page is read, see _with_pending_comments
+    pending = comment_buffer().pending(listing_id, user.id) if user.is_authenticated and not cursor else []
+
+    # The listing with its users and bid totals, its comments and the watch
+    # flag (from the user's cached watch set) don't depend on each other,
+    # so they are fetched side by side
+    listing, comments, watched_by_user = await asyncio.gather(
+        aget_object_or_404(Listing.objects.select_related('listed_by', 'highest_bid_user'), id=listing_id),
+        _listing_comments(listing_id, cursor),
+        _watch_flag(user, listing_id),
+    )
+
+    if pending:
+        _with_pending_comments(comments, pending)
+
+    bid_text_info = False
+    user_owner_listing = user.is_authenticated and listing.listed_by_id == user.id
+    user_highest_bidder = user.is_authenticated and listing.highest_bid_user_id == user.id
 
-    total_bids = len(listing.bids_on_product.all())
+    total_bids = listing.bid_count
 
-    if (listing.is_available == False) and (request.user == listing.highest_bid_user):
+    if (listing.is_available == False) and user_highest_bidder:
         bid_text_info = f"You won the auction with your bid of $ {listing.highest_bid}."
 
-    elif (total_bids > 0) and (request.user == listing.highest_bid_user):
+    elif (total_bids > 0) and user_highest_bidder:
         bid_text_info = f"{total_bids} bids so far. Your bid is the current bid."
-        #print(bid_text_info) 
     elif total_bids > 0:
         bid_text_info = f"{total_bids} bids so far."
-        #print(bid_text_info) 
 
 
-    if float(listing.highest_bid) > float(listing.min_price):
-        min_value_bid = float(listing.highest_bid) + 0.01
-    else:
-        min_value_bid = float(listing.min_price) - 0.000001
-
-    form_bid = BidForm(user=request.user, min_price=min_value_bid)
-    comment_form = CommentForm(user=request.user)
-
-    user = request.user
-    watched_by_user = False
-
-    if user in listing.watched_by.all():
-        watched_by_user = True
+    form_bid = BidForm(user=user, min_price=minimum_bid(listing))
+    comment_form = CommentForm(user=user)
 
     return render(request, "auctions/listings.html", {
         "listing": listing,
@@ -159,41 +234,67 @@ def listing_view(request, listing_id):
         'bid_text_info': bid_text_info,
         'user_owner_listing': user_owner_listing,
         'comment_form': comment_form,
-        "comments": listing.comments.all()
+        "comments": comments,
+        "live_events": serves_live_events(request)
     })
 
+@login_required
+@rate_limited("bid")
 def place_bid(request, listing_id):
-    listing = Listing.objects.get(id=listing_id)
-
-    if float(listing.highest_bid) > float(listing.min_price):
-        min_value_bid = float(listing.highest_bid) + 0.01
-    else:
-        min_value_bid = float(listing.min_price) - 0.000001
-
-    form_bid = BidForm(user=request.user, min_price=min_value_bid)
 
     if request.method == 'POST':
-        print('request.method == POST - Make BID')
 
         form_bid = BidForm(request.POST, user=request.user)
 
         if form_bid.is_valid():
-            new_bid = Bid(product = listing,
-                          bid_value = form_bid.cleaned_data['bid_value'],
-                          user_bid = form_bid.user)
-            print(new_bid)
-            print(form_bid.cleaned_data['bid_value'])
-
-            print("Saving Bid")
-            new_bid.save()
-
-            listing.highest_bid = new_bid.bid_value
-            listing.highest_bid_user = new_bid.user_bid
-            listing.save()
-
-            print(listing)
-    
-    return HttpResponseRedirect(reverse("auctions:listing", kwargs={"listing_id": listing.id}))
+            amount = form_bid.cleaned_data['bid_value']
+            # The same amount again from the same user is a double click or
+            # a retry; the first one has already been placed
+            with first_submission("bid", request.user.id, listing_id, amount) as first:
+                if first:
+                    try:
+                        result = submit_bid(listing_id, form_bid.user, amount)
+                    except Listing.DoesNotExist:
+                        raise Http404("Listing not found.")
+
+                    if result.accepted:
+                        invalidate_pages(listing_scope(listing_id), FEED_SCOPE)
+                        publish_listing_event(listing_id, "bid",
+                                              amount=result.bid.bid_value,
+                                              user=form_bid.user.username)
+
+    return HttpResponseRedirect(reverse("auctions:listing", kwargs={"listing_id": listing_id}))
+
+
+async def listing_events(request, listing_id):
+    """
+    Server-sent event stream of bids, comments and the auction closing for
+    one listing, so the listing page doesn't have to be polled. Only
+    served under ASGI; elsewhere the 204 tells EventSource not to reconnect.
+    """
+    if not serves_live_events(request):
+        return HttpResponse(status=204)
+    if not await Listing.objects.filter(id=listing_id).aexists():
+        raise Http404("Listing not found.")
+
+    async def stream():
+        subscription = get_broker().subscribe(listing_channel(listing_id))
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), timeout=LIVE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
 
 
 @login_required
@@ -203,20 +304,24 @@ def listing_new(request):
 
         form = ListingForm(request.POST, user=request.user)
 
-        if form.is_valid():
-
-            new_listing = Listing(title=form.cleaned_data['title'], 
-                    description=form.cleaned_data['description'],
-                    min_price = form.cleaned_data['min_price'],
-                    image_url = form.cleaned_data['image_url'],
-                    category = form.cleaned_data['category'],
-                    listed_by = form.user,
-                    highest_bid = 0
-                    )
+        if not form.is_valid():
+            return render(request, "auctions/add_listing.html", {
+                "form": form
+            })
 
+        new_listing = Listing(title=form.cleaned_data['title'], 
+                description=form.cleaned_data['description'],
+                min_price = form.cleaned_data['min_price'],
+                image_url = form.cleaned_data['image_url'],
+                category = form.cleaned_data['category'],
+                ends_at = form.cleaned_data['ends_at'],
+                listed_by = form.user,
+                highest_bid = 0
+                )
+
+        with transaction.atomic():
             new_listing.save()
-
-            form_bid = BidForm(user=request.user)
+            invalidate_pages(FEED_SCOPE)
 
         return HttpResponseRedirect(reverse("auctions:listing", kwargs={"listing_id": new_listing.id}))
 
@@ -231,21 +336,16 @@ def add_to_watchlist(request, listing_id):
 
     if request.method == 'POST':
 
-        listing = Listing.objects.get(id=listing_id)
-
-        user = request.user
+        listing = get_object_or_404(Listing.objects.only('id'), id=listing_id)
 
-        listing.watched_by.add(user)
+        watch(request.user.id, listing.id)
 
         return HttpResponseRedirect(reverse("auctions:listing", kwargs={"listing_id": listing.id}))
 
 @login_required
-def watchlist(request):
-    user = request.user
-
-    #listings = Listing.objects.all()
-
-    listing_watch = Listing.objects.filter(watched_by = user).all()
+async def watchlist(request):
+    user = await resolve_user(request)
+    listing_watch = await awatchlist_page(user.id, request.GET.get("after"))
 
     return render(request, "auctions/watchlist.html", {
         "listings": listing_watch
@@ -256,11 +356,9 @@ def remove_from_watchlist(request, listing_id):
 
     if request.method == 'POST':
 
-        listing = Listing.objects.get(id=listing_id)
+        listing = get_object_or_404(Listing.objects.only('id'), id=listing_id)
 
-        user = request.user
-
-        listing.watched_by.remove(user)
+        unwatch(request.user.id, listing.id)
 
         return HttpResponseRedirect(reverse("auctions:listing", kwargs={"listing_id": listing.id}))
     
@@ -269,47 +367,160 @@ def close_auction(request, listing_id):
 
     if request.method == 'POST':
 
-        listing = Listing.objects.get(id=listing_id)
-        listing.is_available = False
+        listing = get_object_or_404(Listing.objects.only('id'), id=listing_id, listed_by=request.user)
 
-        listing.save()
+        close_listings(Listing.objects.filter(id=listing.id))
 
         return HttpResponseRedirect(reverse("auctions:listing", kwargs={"listing_id": listing.id}))
  
 @login_required
+@rate_limited("comment")
 def add_comment(request, listing_id):
 
     if request.method == 'POST':
 
-        listing = Listing.objects.get(id=listing_id)
+        listing = get_object_or_404(Listing.objects.only('id'), id=listing_id)
         
         comment_form = CommentForm(request.POST, user=request.user)
 
+        # Queued and written in a batch with other comments; the page is
+        # invalidated and the event published once the batch is written
         if comment_form.is_valid():
-            new_comment = Comment(product = listing,
-                          comment = comment_form.cleaned_data['comment'],
-                          user_comment = comment_form.user)
-            new_comment.save()
+            comment_buffer().add(listing.id, comment_form.user, comment_form.cleaned_data['comment'])
 
-        return HttpResponseRedirect(reverse("auctions:listing", kwargs={"listing_id": listing.id}))
+        return HttpResponseRedirect(reverse("auctions:listing", kwargs={"listing_id": listing.id}) + "#comments")
  
-def categories(request):
-    listings = Listing.objects.all()
-    categories_list = set([listing.category for listing in listings if listing.category])
-
-
+@anonymous_page_cache(FEED_TIMEOUT, FEED_SCOPE)
+async def categories(request):
+    await resolve_user(request)
     return render(request, "auctions/categories.html", {
-        "categories": categories_list
+        "categories": await acategory_counts()
     })
 
 
-def categories_items(request, category_name):
+@anonymous_page_cache(FEED_TIMEOUT, FEED_SCOPE)
+async def categories_items(request, category_name):
 
-    listings_in_category = Listing.objects.filter(category = category_name).all()
+    await resolve_user(request)
+    listings_in_category = await akeyset_page(
+        Listing.objects.filter(category = category_name, is_available=True),
+        request.GET.get("after")
+    )
 
-    print(listings_in_category)
+    logger.debug("category page", extra={
+        "category": category_name,
+        "listings": len(listings_in_category),
+        "has_next": listings_in_category.has_next,
+    })
 
     return render(request, "auctions/category_items.html", {
         "listings": listings_in_category,
         "category": category_name
     })
+
+
+def search(request):
+    query = request.GET.get("q", "").strip()
+    try:
+        page = max(int(request.GET.get("page", 1)), 1)
+    except ValueError:
+        page = 1
+
+    listings, has_next = search_listings(query, page) if query else ([], False)
+
+    return render(request, "auctions/search.html", {
+        "listings": listings,
+        "query": query,
+        "page": page,
+        "has_next": has_next
+    })
+
+
+def listing_bids(request, listing_id):
+    listing = get_object_or_404(Listing.objects.only('id', 'title'), id=listing_id)
+    bids = keyset_page(
+        Bid.objects.filter(product=listing).select_related('user_bid'),
+        request.GET.get("after"),
+        keys=BID_VALUE_KEYS
+    )
+
+    return render(request, "auctions/bid_history.html", {
+        "listing": listing,
+        "bids": bids
+    })
+
+
+@login_required
+def my_bids(request):
+    bids = keyset_page(
+        Bid.objects.filter(user_bid=request.user).select_related('product'),
+        request.GET.get("after"),
+        keys=BID_TIME_KEYS
+    )
+
+    return render(request, "auctions/bid_history.html", {
+        "bids": bids
+    })
+
+
+@login_required
+def export_results(request):
+    """
+    Stream the results of closed auctions as CSV or JSON lines (?format=):
+    the user's own, or for staff any seller's (?seller=<username>) or
+    everyone's (?seller=all).
+    """
+    seller = request.GET.get("seller", request.user.username)
+    if seller != request.user.username and not request.user.is_staff:
+        raise PermissionDenied
+
+    fmt = request.GET.get("format", "csv")
+    if fmt not in EXPORT_FORMATS:
+        raise Http404("Unknown export format.")
+    if seller == request.user.username:
+        seller_id = request.user.id
+    elif seller == "all":
+        seller_id = None
+    else:
+        seller_id = get_object_or_404(User.objects.only('id'), username=seller).id
+
+    # Each server only streams its own kind of iterator; given the other
+    # kind, it reads the whole export into memory first
+    if isinstance(request, ASGIRequest):
+        chunks = aexport_chunks(fmt, aclosed_auction_rows(seller_id))
+    else:
+        chunks = export_chunks(fmt, closed_auction_rows(seller_id))
+    response = StreamingHttpResponse(chunks, content_type=EXPORT_FORMATS[fmt][1])
+    response["Content-Disposition"] = f'attachment; filename="auction-results-{seller}.{fmt}"'
+    return response
+
+
+def metrics(request):
+    """
+    Prometheus metrics, for staff or a scraper holding METRICS_TOKEN.
+    """
+    if not may_read_metrics(request):
+        raise PermissionDenied
+    return HttpResponse(expose_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def thumbnail(request, name):
+    """
+    Serve a listing thumbnail. Names are content hashes, so the response
+    can be cached for a year and revalidation is a plain ETag match.
+    """
+    if not THUMBNAIL_NAME.match(name):
+        raise Http404("No such thumbnail.")
+
+    etag = f'"{name[:-len(".jpg")]}"'
+    if request.headers.get("If-None-Match") == etag:
+        response = HttpResponseNotModified()
+    else:
+        try:
+            response = FileResponse(open(os.path.join(thumbnail_root(), name), "rb"), content_type="image/jpeg")
+        except FileNotFoundError:
+            raise Http404("No such thumbnail.")
+
+    response["ETag"] = etag
+    response["Cache-Control"] = f"public, max-age={CACHE_SECONDS}, immutable"
+    return response
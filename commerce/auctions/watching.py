@@ -0,0 +1,155 @@
+import time
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from .models import Listing
+from .pagination import KeysetPage, PAGE_SIZE, decode_cursor, encode_cursor
+
+
+WATCHLIST_TIMEOUT = 60 * 60 * 24
+
+WATCHLIST_KEYS = ('id',)
+
+Watch = Listing.watched_by.through
+
+
+def _version_key(user_id):
+    return f"watchlist:version:{user_id}"
+
+
+def _watchlist_key(user_id, version):
+    return f"watchlist:{user_id}:{version}"
+
+
+def _version(user_id):
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+async def _aversion(user_id):
+    key = _version_key(user_id)
+    version = await cache.aget(key)
+    if version is None:
+        version = time.time_ns()
+        if not await cache.aadd(key, version, None):
+            version = await cache.aget(key, version)
+    return version
+
+
+def watched_ids(user_id):
+    """
+    The ids of every listing the user watches, as a frozenset that is
+    loaded with one query and then served from the cache.
+
+    Sets are stored under the version the user's watchlist had before the
+    query, so a set read just before a watch or unwatch committed is
+    written under a version that is already out of date and never served.
+    """
+    key = _watchlist_key(user_id, _version(user_id))
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(Watch.objects.filter(user_id=user_id).values_list('listing_id', flat=True))
+        cache.set(key, ids, WATCHLIST_TIMEOUT)
+    return ids
+
+
+async def awatched_ids(user_id):
+    key = _watchlist_key(user_id, await _aversion(user_id))
+    ids = await cache.aget(key)
+    if ids is None:
+        ids = frozenset([
+            listing_id async for listing_id in
+            Watch.objects.filter(user_id=user_id).values_list('listing_id', flat=True)
+        ])
+        await cache.aset(key, ids, WATCHLIST_TIMEOUT)
+    return ids
+
+
+def is_watching(user_id, listing_id):
+    return listing_id in watched_ids(user_id)
+
+
+async def ais_watching(user_id, listing_id):
+    return listing_id in await awatched_ids(user_id)
+
+
+def _forget(user_id):
+    # Replaced rather than edited in place, so two tabs changing the same
+    # watchlist at once can't leave a set missing one of the changes; a
+    # nanosecond clock keeps an evicted version from coming back
+    transaction.on_commit(lambda: cache.set(_version_key(user_id), time.time_ns(), None))
+
+
+def watch(user_id, listing_id):
+    """
+    Add a listing to the user's watchlist. Returns False if it was there
+    already.
+    """
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                Watch.objects.create(user_id=user_id, listing_id=listing_id)
+        except IntegrityError:
+            return False
+        Listing.objects.filter(id=listing_id).update(
+            watch_count=F('watch_count') + 1, version=F('version') + 1,
+        )
+        _forget(user_id)
+    return True
+
+
+def unwatch(user_id, listing_id):
+    """
+    Take a listing off the user's watchlist. Returns False if it wasn't on it.
+    """
+    with transaction.atomic():
+        removed, _ = Watch.objects.filter(user_id=user_id, listing_id=listing_id).delete()
+        if not removed:
+            return False
+        Listing.objects.filter(id=listing_id).update(
+            watch_count=Greatest(F('watch_count') - 1, 0), version=F('version') + 1,
+        )
+        _forget(user_id)
+    return True
+
+
+def _cut_page(ids, cursor, per_page):
+    ids = sorted(ids, reverse=True)
+
+    position = decode_cursor(cursor, Listing, WATCHLIST_KEYS) if cursor else None
+    if position is not None:
+        ids = [listing_id for listing_id in ids if listing_id < position[0]]
+
+    # Cut on the ids rather than the listings found, so a listing deleted
+    # since the set was cached doesn't end the watchlist early
+    page_ids = ids[:per_page]
+    next_cursor = None
+    if len(ids) > per_page:
+        next_cursor = encode_cursor(Listing(id=page_ids[-1]), WATCHLIST_KEYS)
+    return page_ids, next_cursor
+
+
+def watchlist_page_ids(user_id, cursor=None, per_page=PAGE_SIZE):
+    """
+    The listing ids on one page of the user's watchlist and the cursor to
+    the next page, for callers that fetch the listings their own way.
+    """
+    return _cut_page(watched_ids(user_id), cursor, per_page)
+
+
+async def awatchlist_page(user_id, cursor=None, per_page=PAGE_SIZE):
+    """
+    One page of the user's watchlist, newest listing first. The page is
+    cut from the cached id set and fetched with a single in_bulk.
+    """
+    page_ids, next_cursor = _cut_page(await awatched_ids(user_id), cursor, per_page)
+    found = await Listing.objects.ain_bulk(page_ids)
+    return KeysetPage([found[listing_id] for listing_id in page_ids if listing_id in found], next_cursor)
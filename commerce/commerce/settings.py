@@ -42,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover everything below it
+    'auctions.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,7 +57,8 @@ ROOT_URLCONF = 'commerce.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates with render timing for auctions.middleware
+        'BACKEND': 'auctions.metrics.InstrumentedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -69,20 +72,133 @@ TEMPLATES = [
     },
 ]
 
+# Serve the app with an ASGI server, e.g. `uvicorn commerce.asgi:application`.
+# Live listing events (auctions.views.listing_events) are only streamed under
+# ASGI; `runserver` and other WSGI servers render pages without them.
+ASGI_APPLICATION = 'commerce.asgi.application'
 WSGI_APPLICATION = 'commerce.wsgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/3.0/ref/settings/#databases
 
-DATABASES = {
+# Configured from the environment. SQLite is the default; set
+# DATABASE_ENGINE=postgresql for production.
+
+DATABASE_ENGINE = os.environ.get('DATABASE_ENGINE', 'sqlite')
+
+if DATABASE_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DATABASE_NAME', 'commerce'),
+            'USER': os.environ.get('DATABASE_USER', ''),
+            'PASSWORD': os.environ.get('DATABASE_PASSWORD', ''),
+            'HOST': os.environ.get('DATABASE_HOST', ''),
+            'PORT': os.environ.get('DATABASE_PORT', ''),
+            # Keep connections open between requests instead of paying for a
+            # new one on every request
+            'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    if os.environ.get('DATABASE_POOL') == '1':
+        # psycopg's connection pool; Django requires CONN_MAX_AGE = 0 with it
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DATABASE_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DATABASE_POOL_MAX_SIZE', 20)),
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DATABASE_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
+            'OPTIONS': {
+                # Wait for the write lock instead of failing straight away
+                'timeout': float(os.environ.get('SQLITE_BUSY_TIMEOUT', 20)),
+                # Take the write lock when a transaction starts, so two
+                # transactions never deadlock upgrading from read to write
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+    if os.environ.get('SQLITE_WAL', '1') == '1':
+        # WAL lets readers carry on while a bid or comment is being written
+        DATABASES['default']['OPTIONS']['init_command'] = (
+            'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;'
+        )
+
+AUTH_USER_MODEL = 'auctions.User'
+
+# Users are served from the cache, see auctions/auth.py. ModelBackend stays
+# listed so sessions it created keep working until their owners sign in again.
+AUTHENTICATION_BACKENDS = [
+    'auctions.auth.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+# Cache
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            # Room for a rendered card per listing, see auctions/fragments.py
+            'MAX_ENTRIES': 50000,
+        },
     }
 }
 
-AUTH_USER_MODEL = 'auctions.User'
+# Email
+# https://docs.djangoproject.com/en/3.0/topics/email/
+
+# Notification digests go out through this backend, see
+# auctions/notifications.py. Printed to the console unless configured.
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'auctions@localhost')
+
+# Logging
+# https://docs.djangoproject.com/en/3.0/topics/logging/
+
+# JSON lines on stderr. LOG_LEVEL=DEBUG adds a line per request with its
+# timings, see auctions/middleware.py.
+
+# /metrics is served to staff, and to scrapers sending
+# "Authorization: Bearer <METRICS_TOKEN>" when the token is set
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {
+            '()': 'auctions.logformat.JSONFormatter',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'json',
+        },
+    },
+    'loggers': {
+        'auctions': {
+            'handlers': ['console'],
+            'level': os.environ.get('LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+# Sessions
+# https://docs.djangoproject.com/en/3.0/topics/http/sessions/
+
+# Read from the cache and written through to the database, so a signed-in
+# request doesn't query the session table
+SESSION_ENGINE = os.environ.get('SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
 
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
@@ -102,6 +218,14 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# PBKDF2 is slow on purpose. The test suite and the benchmarks only ever see
+# throwaway passwords, so they hash with these instead and register/login
+# measure this app rather than the hash; see auctions/runner.py and
+# auctions/management/commands/_bench.py.
+FAST_PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+TEST_RUNNER = 'auctions.runner.FastHashingTestRunner'
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/3.0/topics/i18n/
@@ -121,3 +245,32 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.0/howto/static-files/
 
 STATIC_URL = '/static/'
+
+# Listing image thumbnails, written by the process_images worker and
+# served by auctions.views.thumbnail; see auctions/images.py
+
+THUMBNAIL_ROOT = os.environ.get('THUMBNAIL_ROOT', os.path.join(BASE_DIR, 'media', 'thumbnails'))
+
+# Only for development: lets image URLs point at localhost and private networks
+THUMBNAIL_ALLOW_PRIVATE_HOSTS = os.environ.get('THUMBNAIL_ALLOW_PRIVATE_HOSTS') == '1'
+
+# Comments are written in batches of up to COMMENT_BATCH_SIZE, at least
+# every COMMENT_BATCH_SECONDS; see auctions/comments.py. A batch size of 1
+# writes each comment in the request that posted it.
+
+COMMENT_BATCH_SIZE = int(os.environ.get('COMMENT_BATCH_SIZE', 50))
+COMMENT_BATCH_SECONDS = float(os.environ.get('COMMENT_BATCH_SECONDS', 0.2))
+
+# Token buckets for the write endpoints, as (requests per second, burst),
+# per user and per listing; see auctions/ratelimit.py. A limit left out
+# is not enforced.
+
+RATE_LIMITS = {
+    'bid:user': (2, 10),
+    'bid:listing': (20, 40),
+    'comment:user': (0.5, 5),
+    'comment:listing': (10, 20),
+}
+
+# Seconds within which the same bid from the same user is only placed once
+DUPLICATE_WINDOW = 5